@@ -0,0 +1,312 @@
+"""轮转排期性能基准测试
+
+生成指定规模的合成学生和科室数据，测量排期生成、显示数据构建和Excel导出的耗时、
+峰值内存和排期均衡程度，每个用例输出一行JSON，便于不同提交之间对比。
+
+用法（在项目根目录下运行）：
+    python -m benchmarks.bench_scheduler --preset quick > before.jsonl
+    python -m benchmarks.bench_scheduler --preset quick --compare before.jsonl
+    python -m benchmarks.bench_scheduler --preset quick --balance-siblings both
+
+--balance-siblings both 时每个用例分别在整体分配同专业科室和不分配时运行，并输出两者的耗时和均衡指标对比。
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from models.department import Department, DepartmentManager
+from models.rotation import RotationScheduler
+from models.student import Student, StudentManager
+
+# 合成数据的年级和开始日期
+GRADE = "基准测试"
+START_DATE = datetime(2024, 9, 1)
+# 每个学生基础轮转的目标月数，与实际科室配置相近
+TARGET_BASE_MONTHS = 33
+# 结果格式版本，字段变化时递增
+SCHEMA_VERSION = 1
+
+PRESETS = {
+    "quick": {"students": [50, 500], "departments": [10, 50]},
+    "full": {"students": [50, 500, 2000, 5000], "departments": [10, 50, 200]},
+}
+
+
+def _round_half(months: float) -> float:
+    """取整到半个月，最少半个月"""
+    return max(0.5, round(months * 2) / 2)
+
+
+def make_departments(count: int, rng: np.random.Generator) -> List[Department]:
+    """生成合成科室
+
+    专业数随科室数缓慢增长，多出的科室随机分到各专业作为同专业科室，
+    同专业科室的轮转结构大多相同，部分专业为后期轮转。
+    """
+    specialties = min(count, 8 + count // 10)
+    budget = max(0.5, TARGET_BASE_MONTHS / specialties)
+    siblings = np.ones(specialties, dtype=int) + np.bincount(rng.integers(specialties, size=count - specialties),
+                                                             minlength=specialties)
+    departments = []
+    for specialty_no, sibling_count in enumerate(siblings.tolist()):
+        specialty = f"专业{specialty_no:03d}"
+        rotation_times = 2 if budget >= 2 and rng.random() < 0.4 else 1
+        months = [_round_half(budget / rotation_times + rng.choice([-0.5, 0.0, 0.5])) for _ in range(rotation_times)]
+        is_later = bool(rng.random() < 0.15)
+        for k in range(sibling_count):
+            dept_months = list(months)
+            if k > 0 and rng.random() < 0.4:
+                dept_months = [_round_half(m + 0.5) for m in months]
+            departments.append(Department(f"{specialty}-{k + 1}科", specialty, rotation_times, dept_months, is_later))
+    return departments
+
+
+def make_students(count: int, specialties: List[str], rng: np.random.Generator,
+                  social_ratio: float) -> List[Student]:
+    """生成合成学生：社会培训学生按比例随机选择2个自选专业"""
+    students = []
+    for i in range(count):
+        specialty = str(rng.choice(specialties))
+        social = rng.random() < social_ratio
+        self_selected = []
+        if social and len(specialties) > 1:
+            self_selected = [str(s) for s in rng.choice(specialties, size=min(2, len(specialties)), replace=False)]
+        students.append(Student(
+            name=f"学生{i:05d}",
+            specialty=specialty,
+            grade=GRADE,
+            position=str(rng.choice(["研究生", "住院医师"])),
+            training_type="社会培训" if social else "专科培训",
+            self_selected_specialties=self_selected,
+        ))
+    return students
+
+
+def build_managers(students: int, departments: int, social_ratio: float, seed: int,
+                   work_dir: str) -> Tuple[StudentManager, DepartmentManager]:
+    """生成合成数据文件并创建管理器，不读写项目的data目录"""
+    rng = np.random.default_rng(seed)
+    dept_list = make_departments(departments, rng)
+    specialties = list(dict.fromkeys(dept.specialty for dept in dept_list))
+    student_list = make_students(students, specialties, rng, social_ratio)
+
+    dept_file = os.path.join(work_dir, "departments.json")
+    student_file = os.path.join(work_dir, "students.json")
+    with open(dept_file, "w", encoding="utf-8") as f:
+        json.dump([dept.to_dict() for dept in dept_list], f, ensure_ascii=False)
+    with open(student_file, "w", encoding="utf-8") as f:
+        json.dump([student.to_dict() for student in student_list], f, ensure_ascii=False)
+    return StudentManager(student_file), DepartmentManager(dept_file)
+
+
+def _timed(func, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def run_case(students: int, departments: int, social_ratio: float, seed: int, repeat: int,
+             generate_kwargs: Dict[str, Any], measure_memory: bool = True) -> Dict[str, Any]:
+    """运行一个用例，返回耗时、峰值内存和均衡指标"""
+    with tempfile.TemporaryDirectory() as work_dir:
+        student_manager, department_manager = build_managers(students, departments, social_ratio, seed, work_dir)
+        export_file = os.path.join(work_dir, "schedule.xlsx")
+
+        timings = {"generate": [], "display": [], "export": []}
+        scheduler = None
+        for _ in range(repeat):
+            scheduler = RotationScheduler(student_manager, department_manager)
+            timings["generate"].append(_timed(scheduler.generate_schedule, START_DATE, GRADE, **generate_kwargs))
+            timings["display"].append(_timed(scheduler.get_schedule_for_display, GRADE))
+            timings["export"].append(_timed(scheduler.export_to_excel, export_file, GRADE))
+
+        # 单独运行一次统计峰值内存，避免tracemalloc影响耗时
+        peak_memory = None
+        if measure_memory:
+            tracemalloc.start()
+            memory_scheduler = RotationScheduler(student_manager, department_manager)
+            memory_scheduler.generate_schedule(START_DATE, GRADE, **generate_kwargs)
+            generate_peak = tracemalloc.get_traced_memory()[1]
+            memory_scheduler.get_schedule_for_display(GRADE)
+            memory_scheduler.export_to_excel(export_file, GRADE)
+            total_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            peak_memory = {"generate": generate_peak / 2 ** 20, "total": total_peak / 2 ** 20}
+
+    counts = scheduler.department_counts
+    return {
+        "case": {
+            "students": students,
+            "departments": departments,
+            "social_ratio": social_ratio,
+            "seed": seed,
+            "generate_kwargs": generate_kwargs,
+        },
+        "seconds": {
+            name: {"min": min(values), "median": statistics.median(values), "runs": values}
+            for name, values in timings.items()
+        },
+        "peak_memory_mb": peak_memory,
+        "quality": {
+            "balance_score": scheduler.balance_score(),
+            "spread_total": int(scheduler.department_spread().sum()),
+            "unfinished_rotations": sum(len(r) for r in scheduler.unfinished_rotations.values()),
+            "max_month_count": int(counts.max()) if counts is not None and counts.size else 0,
+            "months": scheduler.store.months if scheduler.store is not None else 0,
+        },
+    }
+
+
+def environment_info() -> Dict[str, Any]:
+    """记录运行环境和当前提交，用于对比不同提交的结果"""
+    commit, dirty = None, None
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout
+        dirty = bool(status.strip())
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return {
+        "schema": SCHEMA_VERSION,
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def _case_key(result: Dict[str, Any]) -> str:
+    return json.dumps(result["case"], sort_keys=True)
+
+
+def compare_results(previous_file: str, results: List[Dict[str, Any]], threshold: float) -> List[str]:
+    """与之前的结果对比生成耗时中位数，返回超过阈值倍数的用例说明"""
+    previous = {}
+    with open(previous_file, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                result = json.loads(line)
+                previous[_case_key(result)] = result
+
+    regressions = []
+    for result in results:
+        old = previous.get(_case_key(result))
+        if old is None:
+            continue
+        case = result["case"]
+        label = f"{case['students']}名学生/{case['departments']}个科室"
+        for name, seconds in result["seconds"].items():
+            old_median = old["seconds"][name]["median"]
+            ratio = seconds["median"] / old_median if old_median > 0 else float("inf")
+            print(f"{label} {name}: {old_median:.3f}s -> {seconds['median']:.3f}s ({ratio:.2f}x)", file=sys.stderr)
+            if ratio > threshold:
+                regressions.append(f"{label} {name} 变慢 {ratio:.2f} 倍")
+        old_score = old["quality"]["balance_score"]
+        if result["quality"]["balance_score"] > old_score:
+            print(f"{label} 均衡评分: {old_score} -> {result['quality']['balance_score']}", file=sys.stderr)
+    return regressions
+
+
+def compare_siblings(results: List[Dict[str, Any]]):
+    """对比同一用例整体分配同专业科室与不分配时的生成耗时和均衡指标"""
+    pairs = {}
+    for result in results:
+        case = dict(result["case"], generate_kwargs=dict(result["case"]["generate_kwargs"]))
+        balance = case["generate_kwargs"].pop("balance_siblings", True)
+        pairs.setdefault(json.dumps(case, sort_keys=True), {})[balance] = result
+    for pair in pairs.values():
+        if len(pair) < 2:
+            continue
+        off, on = pair[False], pair[True]
+        case = on["case"]
+        off_seconds, on_seconds = off["seconds"]["generate"]["median"], on["seconds"]["generate"]["median"]
+        ratio = on_seconds / off_seconds if off_seconds > 0 else float("inf")
+        print(f"{case['students']}名学生/{case['departments']}个科室 同专业科室分配: "
+              f"生成 {off_seconds:.3f}s -> {on_seconds:.3f}s ({ratio:.2f}x)，"
+              f"人数差之和 {off['quality']['spread_total']} -> {on['quality']['spread_total']}，"
+              f"未完成轮转 {off['quality']['unfinished_rotations']} -> {on['quality']['unfinished_rotations']}",
+              file=sys.stderr)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="轮转排期性能基准测试")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="quick", help="预设的用例规模")
+    parser.add_argument("--students", type=int, nargs="+", help="学生人数，覆盖预设")
+    parser.add_argument("--departments", type=int, nargs="+", help="科室数，覆盖预设")
+    parser.add_argument("--social-ratio", type=float, default=0.3, help="社会培训学生比例")
+    parser.add_argument("--seed", type=int, default=0, help="合成数据的随机种子")
+    parser.add_argument("--repeat", type=int, default=3, help="每个用例重复次数")
+    parser.add_argument("--restarts", type=int, default=1, help="排期随机重启次数")
+    parser.add_argument("--optimize-iterations", type=int, default=None, help="局部搜索尝试次数")
+    parser.add_argument("--balance-siblings", choices=("on", "off", "both"), default="on",
+                        help="是否整体分配同专业科室，both时分别运行并对比")
+    parser.add_argument("--no-memory", action="store_true", help="不统计峰值内存（tracemalloc会显著拖慢运行）")
+    parser.add_argument("--output", help="结果文件（JSON Lines），默认输出到标准输出")
+    parser.add_argument("--compare", help="与之前的结果文件对比")
+    parser.add_argument("--threshold", type=float, default=1.2, help="耗时超过之前结果多少倍视为变慢")
+    args = parser.parse_args(argv)
+
+    students_list = args.students or PRESETS[args.preset]["students"]
+    departments_list = args.departments or PRESETS[args.preset]["departments"]
+    generate_kwargs = {"restarts": args.restarts}
+    if args.restarts > 1:
+        generate_kwargs["seed"] = args.seed
+    if args.optimize_iterations:
+        generate_kwargs["optimize_iterations"] = args.optimize_iterations
+    # 默认整体分配，不写入参数，与之前的结果文件中的用例对应
+    sibling_kwargs = {"on": [{}], "off": [{"balance_siblings": False}],
+                      "both": [{"balance_siblings": False}, {}]}[args.balance_siblings]
+
+    environment = environment_info()
+    results = []
+    output = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for departments in departments_list:
+            for students in students_list:
+                for extra_kwargs in sibling_kwargs:
+                    print(f"运行用例：{students}名学生，{departments}个科室", file=sys.stderr)
+                    result = run_case(students, departments, args.social_ratio, args.seed, args.repeat,
+                                      dict(generate_kwargs, **extra_kwargs), not args.no_memory)
+                    result["environment"] = environment
+                    results.append(result)
+                    output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    output.flush()
+    finally:
+        if args.output:
+            output.close()
+
+    if args.balance_siblings == "both":
+        compare_siblings(results)
+
+    if args.compare:
+        regressions = compare_results(args.compare, results, args.threshold)
+        for message in regressions:
+            print(message, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+"""轮转排期命令行入口，不依赖图形界面，可在服务器或定时任务中批量排期
+
+用法（在项目根目录下运行）：
+    python -m lunzhan schedule --grade 2024级 --start 2024-09 --out 排期.xlsx
+    python -m lunzhan schedule --grade 2023级 2024级 --start 2024-09 --out out/{grade}.json
+    python -m lunzhan schedule --joint --grade 2023级=2023-09 2024级=2024-09 --out out/{grade}.xlsx
+
+输出格式由 --format 或输出文件扩展名决定（json/csv/xlsx）。排期多个年级时，输出文件名中的
+{grade} 替换为年级，没有 {grade} 时在扩展名前加上年级。年级可写为 年级=开始月份 单独指定开始月份；
+--joint 时各年级联合排期，均衡所有年级相加后的科室人数，--background 指定的年级从数据库载入作为固定人数。
+--validate 时按科室配置检查排期的所有规则（轮转月数、后期轮转、同专业连续、半月拼接、科室人数均衡），
+代替只报告未安排完成的轮转。科室人数不均衡只作为警告输出，不影响退出码，加 --fail-on-spread 时视为违规。
+退出码：0 所有年级排期完整（--validate 时为符合除警告外的所有规则）；1 有年级没有学生或存在违规；2 参数或数据错误。
+
+只导入排期模型，不导入PyQt6和pandas，启动开销主要是numpy。
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from models.department import DepartmentManager
+from models.joint_schedule import JointScheduler
+from models.rotation import RotationScheduler, SCHEDULE_INFO_HEADERS
+from models.schedule_validator import RULE_SPREAD
+from models.student import StudentManager
+from utils.database import Database, default_database_file
+from utils.result_cache import ResultCache
+
+OUTPUT_FORMATS = ("json", "csv", "xlsx")
+# 退出码
+EXIT_OK = 0
+EXIT_VIOLATIONS = 1
+EXIT_ERROR = 2
+# 只作为警告输出、不影响退出码的规则：科室人数均衡取决于科室配置，实际年级几乎都达不到
+WARNING_RULES = (RULE_SPREAD,)
+
+
+def parse_start_date(text: str) -> datetime:
+    """解析开始日期，支持 YYYY-MM 和 YYYY-MM-DD"""
+    for date_format in ("%Y-%m-%d", "%Y-%m"):
+        try:
+            return datetime.strptime(text, date_format)
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"无法识别的开始日期: {text}，应为 YYYY-MM 或 YYYY-MM-DD")
+
+
+def parse_cohorts(grades: List[str], start: Optional[datetime]) -> List[Tuple[str, datetime]]:
+    """解析 年级 或 年级=开始月份 形式的年级参数"""
+    cohorts = []
+    for text in grades:
+        grade, _, start_text = text.partition("=")
+        if start_text:
+            try:
+                cohorts.append((grade, parse_start_date(start_text)))
+            except argparse.ArgumentTypeError as e:
+                raise ValueError(str(e))
+        elif start is not None:
+            cohorts.append((grade, start))
+        else:
+            raise ValueError(f"{grade}没有指定开始月份，请使用 --start 或 {grade}=YYYY-MM")
+    return cohorts
+
+
+def output_path(template: str, grade: str, several: bool) -> str:
+    """按年级生成输出文件名"""
+    if "{grade}" in template:
+        return template.replace("{grade}", grade)
+    if not several:
+        return template
+    base, ext = os.path.splitext(template)
+    return f"{base}_{grade}{ext}"
+
+
+def output_format(path: str, requested: Optional[str]) -> str:
+    """确定输出格式，未指定时按扩展名判断"""
+    if requested:
+        return requested
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    if ext not in OUTPUT_FORMATS:
+        raise ValueError(f"无法由扩展名判断输出格式: {path}，请使用 --format 指定")
+    return ext
+
+
+def collect_violations(scheduler: RotationScheduler, grade: str, validate: bool = False) -> List[Dict[str, Any]]:
+    """收集排期后违反规则的情况：年级没有学生，以及学生未安排完成的轮转
+
+    validate为True时改为使用排期检查的完整报告，每条记录另有月份。
+    """
+    if scheduler.store is None:
+        return [{"student": None, "rule": "没有学生", "detail": f"{grade}没有学生或没有科室"}]
+    if validate:
+        return scheduler.validate(grade).to_dicts()
+    violations = []
+    for student, rotations in scheduler.unfinished_rotations.items():
+        for department, remaining in rotations:
+            violations.append({"student": student, "rule": "轮转未完成",
+                               "detail": f"{department}剩余{remaining:g}个月未安排"})
+    return violations
+
+
+def write_json(scheduler: RotationScheduler, grade: str, path: str, violations: List[Dict[str, Any]]):
+    """写出 {年级, 开始月份, 排期: {学生: {月份: 科室}}, 违规情况} 形式的JSON"""
+    data = {
+        "grade": grade,
+        "start": scheduler.calendar.key(0) if scheduler.calendar is not None else None,
+        "schedule": scheduler.schedule,
+        "violations": violations,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def write_csv(scheduler: RotationScheduler, grade: str, path: str):
+    """写出与Excel排期表相同列的CSV，使用带BOM的UTF-8以便Excel直接打开"""
+    students, months, labels, _, _ = scheduler.get_schedule_grid(grade)
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(SCHEDULE_INFO_HEADERS + months)
+        for student, row in zip(students, labels.tolist()):
+            writer.writerow([student.name, student.specialty, student.grade, student.position] + row)
+
+
+def write_output(scheduler: RotationScheduler, grade: str, path: str, file_format: str,
+                 violations: List[Dict[str, Any]]):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if file_format == "json":
+        write_json(scheduler, grade, path, violations)
+    elif file_format == "csv":
+        write_csv(scheduler, grade, path)
+    else:
+        scheduler.export_to_excel(path, grade)
+
+
+def run_schedule(args) -> int:
+    cohorts = parse_cohorts(args.grade, args.start)
+    several = len(cohorts) > 1
+    paths = {grade: output_path(args.out, grade, several) for grade, _ in cohorts}
+    formats = {grade: output_format(path, args.format) for grade, path in paths.items()}
+    student_manager = StudentManager(args.students, database_file=args.database)
+    department_manager = DepartmentManager(args.departments, database_file=args.database)
+    generate_kwargs = {"restarts": args.restarts, "seed": args.seed, "workers": args.workers,
+                       "optimize_seconds": args.optimize_seconds,
+                       "optimize_iterations": args.optimize_iterations}
+    result_cache = ResultCache(args.cache) if args.cache else None
+
+    if args.joint or args.background:
+        joint = JointScheduler(student_manager, department_manager)
+        joint.result_cache = result_cache
+        if args.background:
+            database_file = args.database or default_database_file()
+            if not database_file:
+                raise ValueError("--background 需要使用 --database 或环境变量LUNZHAN_DATABASE指定数据库")
+            database = Database(database_file)
+            missing = set(args.background) - set(joint.load_background(database, args.background))
+            if missing:
+                raise ValueError(f"数据库中没有可用的排期: {', '.join(sorted(missing))}")
+        schedulers = joint.generate(cohorts, **generate_kwargs)
+    else:
+        schedulers = {}
+        for grade, start_date in cohorts:
+            schedulers[grade] = RotationScheduler(student_manager, department_manager)
+            schedulers[grade].result_cache = result_cache
+            schedulers[grade].generate_schedule(start_date, grade, **generate_kwargs)
+
+    exit_code = EXIT_OK
+    for grade, _ in cohorts:
+        scheduler, path, file_format = schedulers[grade], paths[grade], formats[grade]
+        violations = collect_violations(scheduler, grade, args.validate)
+        if scheduler.store is not None or file_format == "json":
+            write_output(scheduler, grade, path, file_format, violations)
+
+        warning_rules = () if args.fail_on_spread else WARNING_RULES
+        failures = [violation for violation in violations if violation["rule"] not in warning_rules]
+        students = len(scheduler.store.student_names) if scheduler.store is not None else 0
+        print(f"{grade}: {students}名学生，违规{len(failures)}项，警告{len(violations) - len(failures)}项 -> {path}",
+              file=sys.stderr)
+        for violation in violations[:args.max_report]:
+            level = "警告" if violation["rule"] in warning_rules else "违规"
+            print(f"  [{level}] {violation['student'] or grade}: {violation['rule']}，{violation['detail']}",
+                  file=sys.stderr)
+        if failures:
+            exit_code = EXIT_VIOLATIONS
+    return exit_code
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m lunzhan", description="医学生轮转排期命令行工具")
+    commands = parser.add_subparsers(dest="command", required=True)
+    schedule = commands.add_parser("schedule", help="生成轮转排期并导出")
+    schedule.add_argument("--grade", nargs="+", required=True, help="排期的年级，可指定多个，可写为 年级=开始月份")
+    schedule.add_argument("--start", type=parse_start_date, help="轮转开始月份，YYYY-MM 或 YYYY-MM-DD")
+    schedule.add_argument("--joint", action="store_true", help="各年级联合排期，均衡相加后的科室人数")
+    schedule.add_argument("--background", nargs="+", help="从数据库载入作为固定人数的已有年级排期，隐含 --joint")
+    schedule.add_argument("--out", required=True, help="输出文件，可包含{grade}")
+    schedule.add_argument("--format", choices=OUTPUT_FORMATS, help="输出格式，默认按扩展名判断")
+    schedule.add_argument("--students", help="学生数据文件，默认data/students.json")
+    schedule.add_argument("--departments", help="科室数据文件，默认data/departments.json")
+    schedule.add_argument("--database", help="SQLite数据库文件，未指定数据文件时默认使用环境变量LUNZHAN_DATABASE")
+    schedule.add_argument("--restarts", type=int, default=1, help="随机重启次数，大于1时多进程排期")
+    schedule.add_argument("--seed", type=int, default=None, help="随机重启的随机种子")
+    schedule.add_argument("--workers", type=int, default=None, help="随机重启的进程数，默认CPU核数")
+    schedule.add_argument("--optimize-seconds", type=float, default=0.0, help="局部搜索优化的时间预算（秒）")
+    schedule.add_argument("--optimize-iterations", type=int, default=None, help="局部搜索尝试次数")
+    schedule.add_argument("--cache", help="排期结果缓存目录，输入相同时直接使用缓存的排期")
+    schedule.add_argument("--validate", action="store_true", help="按科室配置检查排期的所有规则")
+    schedule.add_argument("--fail-on-spread", action="store_true",
+                          help="--validate 时科室人数不均衡也视为违规，默认只作为警告")
+    schedule.add_argument("--max-report", type=int, default=20, help="每个年级最多输出的违规条数")
+    args = parser.parse_args(argv)
+
+    try:
+        return run_schedule(args)
+    except (OSError, ValueError) as e:
+        print(f"排期失败: {e}", file=sys.stderr)
+        return EXIT_ERROR
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,18 @@
+import time
+# 启动计时模式下从这里开始计时，尽量早于其他导入
+_START_TIME = time.perf_counter()
+
 import sys
 import os
-from PyQt6.QtWidgets import QApplication, QMainWindow, QTabWidget
+import multiprocessing
+from PyQt6.QtWidgets import QApplication, QMainWindow, QTabWidget, QWidget
 from PyQt6.QtGui import QIcon, QFont
-from PyQt6.QtCore import Qt, QSize
+from PyQt6.QtCore import Qt, QSize, QTimer
+
+# 使用 --startup-timing 参数或设置该环境变量为1时，显示窗口后输出启动各阶段耗时并退出
+STARTUP_TIMING_ENV = "LUNZHAN_STARTUP_TIMING"
+# 打包后的窗口程序没有控制台输出，启动计时结果写入该文件
+STARTUP_TIMING_FILE = os.path.join("data", "startup_timing.log")
 
 # 创建必要的目录
 def ensure_directories():
@@ -12,10 +22,35 @@ def ensure_directories():
         if not os.path.exists(directory):
             os.makedirs(directory)
 
-# 导入各个页面
+# 导入各个页面，轮转排期页面依赖numpy等较大的模块，第一次切换到该页面时才导入
 from pages.student_page import StudentPage
 from pages.department_page import DepartmentPage
-from pages.rotation_page import RotationPage
+from utils.persistence import flush_all
+
+_IMPORT_TIME = time.perf_counter()
+
+
+def startup_timing_enabled() -> bool:
+    """是否启用启动计时模式"""
+    return "--startup-timing" in sys.argv[1:] or os.environ.get(STARTUP_TIMING_ENV) == "1"
+
+
+def report_startup_timing(stages):
+    """输出启动各阶段距程序开始的耗时（毫秒），以及已导入的较大模块
+
+    Args:
+        stages: [(阶段名称, time.perf_counter()时间)]
+    """
+    lines = [f"{name}: {(moment - _START_TIME) * 1000:.0f} ms" for name, moment in stages]
+    heavy = [name for name in ("numpy", "pandas", "openpyxl") if name in sys.modules]
+    lines.append(f"已导入: {', '.join(heavy) if heavy else '无'}")
+    report = "\n".join(lines)
+    if sys.stdout is not None:
+        print(report)
+    else:
+        with open(STARTUP_TIMING_FILE, "a", encoding="utf-8") as f:
+            f.write(report + "\n\n")
+
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -34,28 +69,63 @@ class MainWindow(QMainWindow):
         self.tabs = QTabWidget()
         self.tabs.setFont(QFont("Microsoft YaHei", 10))
         
-        # 添加三个主要页面
+        # 添加三个主要页面，轮转排期页面先用空白页占位，第一次切换到该页面时创建
         self.student_page = StudentPage()
         self.department_page = DepartmentPage()
-        self.rotation_page = RotationPage(self.student_page, self.department_page)
+        self.rotation_page = None
         
         self.tabs.addTab(self.student_page, "学生录入")
         self.tabs.addTab(self.department_page, "科室配置")
-        self.tabs.addTab(self.rotation_page, "轮转排期")
+        self.rotation_tab_index = self.tabs.addTab(QWidget(), "轮转排期")
+        self.tabs.currentChanged.connect(self._on_tab_changed)
         
         self.setCentralWidget(self.tabs)
+    
+    def _on_tab_changed(self, index):
+        if index == self.rotation_tab_index:
+            self.ensure_rotation_page()
+    
+    def ensure_rotation_page(self):
+        """创建轮转排期页面并替换占位页"""
+        if self.rotation_page is not None:
+            return self.rotation_page
+        from pages.rotation_page import RotationPage
+        self.rotation_page = RotationPage(self.student_page, self.department_page)
+        placeholder = self.tabs.widget(self.rotation_tab_index)
+        # 替换期间不再触发切换页面的处理
+        self.tabs.blockSignals(True)
+        self.tabs.removeTab(self.rotation_tab_index)
+        self.tabs.insertTab(self.rotation_tab_index, self.rotation_page, "轮转排期")
+        self.tabs.setCurrentIndex(self.rotation_tab_index)
+        self.tabs.blockSignals(False)
+        placeholder.deleteLater()
+        return self.rotation_page
 
 if __name__ == "__main__":
+    # 打包后的程序使用多进程排期时需要
+    multiprocessing.freeze_support()
+    
     # 确保目录存在
     ensure_directories()
     
     app = QApplication(sys.argv)
+    # 退出前写入延迟保存的学生和科室数据
+    app.aboutToQuit.connect(flush_all)
     
     # 设置应用样式
     app.setStyle("Fusion")
     
     # 创建并显示主窗口
     window = MainWindow()
+    window_time = time.perf_counter()
     window.show()
     
+    if startup_timing_enabled():
+        # 显示窗口后事件循环处理完第一次绘制才会执行定时器
+        def finish_timing():
+            report_startup_timing([("导入模块", _IMPORT_TIME), ("创建窗口", window_time),
+                                   ("首次绘制", time.perf_counter())])
+            app.quit()
+        QTimer.singleShot(0, finish_timing)
+    
     sys.exit(app.exec()) 
\ No newline at end of file
@@ -0,0 +1,199 @@
+import math
+import numpy as np
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from models.department import Department
+from utils.month_calendar import MonthCalendar
+
+# 没有人数上限的科室使用的上限值
+UNLIMITED = np.iinfo(np.int32).max
+
+
+class CapacityLimits(NamedTuple):
+    """各科室每月的人数限制，与月度人数矩阵形状相同，包括其他年级的固定人数"""
+    minimum: np.ndarray  # 月份 × 科室 的最少人数，0表示不限
+    maximum: np.ndarray  # 月份 × 科室 的最多人数，UNLIMITED表示不限
+
+
+# 容量不足的人数限制类型
+LIMIT_MAXIMUM = "最多人数"
+LIMIT_MINIMUM = "最少人数"
+
+
+class Bottleneck(NamedTuple):
+    """人数限制无法满足的专业或科室"""
+    specialty: str  # 专业
+    departments: List[str]  # 涉及的科室
+    period: str  # 检查的时间范围："整个排期"、"一年后"或"一年内"
+    demand: int  # 最多人数：所有学生至少需要的人月数；最少人数：各月最少人数合计需要的人月数
+    capacity: int  # 最多人数：各科室人数上限之和；最少人数：学生最多能提供的人月数
+    kind: str = LIMIT_MAXIMUM  # 无法满足的人数限制，LIMIT_MAXIMUM或LIMIT_MINIMUM
+
+    def describe(self) -> str:
+        departments = "、".join(self.departments)
+        if self.kind == LIMIT_MINIMUM:
+            return (f"{self.specialty}（{departments}）{self.period}按每月最少人数需要{self.demand}人月，"
+                    f"学生最多只能提供{self.capacity}人月")
+        return (f"{self.specialty}（{departments}）{self.period}至少需要{self.demand}人月，"
+                f"人数上限合计{self.capacity}人月")
+
+
+class CapacityError(ValueError):
+    """科室人数限制无法满足，无法安排所有学生"""
+    def __init__(self, bottlenecks: Sequence[Bottleneck]):
+        self.bottlenecks = list(bottlenecks)
+        details = "；".join(bottleneck.describe() for bottleneck in self.bottlenecks)
+        super().__init__(f"科室人数限制无法满足：{details}")
+
+
+def capacity_limits(departments: Sequence[Department], calendar: MonthCalendar,
+                    months: int) -> Optional[CapacityLimits]:
+    """由科室的人数设置生成 月份 × 科室 的人数限制矩阵
+
+    默认人数适用于所有月份，按月份设置的人数覆盖默认值。所有科室都没有人数限制时返回None，
+    排期过程不做任何检查。
+    """
+    if not any(dept.has_capacity_limits() for dept in departments):
+        return None
+    minimum = np.zeros((months, len(departments)), dtype=np.int64)
+    maximum = np.full((months, len(departments)), UNLIMITED, dtype=np.int64)
+    for col, dept in enumerate(departments):
+        if dept.min_capacity is not None:
+            minimum[:, col] = dept.min_capacity
+        if dept.max_capacity is not None:
+            maximum[:, col] = dept.max_capacity
+        for key, (low, high) in dept.monthly_capacity.items():
+            month = calendar.offset(key)
+            if not 0 <= month < months:
+                continue
+            if low is not None:
+                minimum[month, col] = low
+            if high is not None:
+                maximum[month, col] = high
+    return CapacityLimits(minimum, maximum)
+
+
+def _specialty_segments(departments: Sequence[Department]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """科室按专业分段：(专业名称, 按专业排序的科室下标, 每个专业在排序后的起始位置)
+
+    专业编号按首次出现的顺序，与分段顺序一致，用于np.ufunc.reduceat按专业汇总。
+    """
+    specialty_codes = {}
+    codes = np.array([specialty_codes.setdefault(dept.specialty, len(specialty_codes))
+                      for dept in departments], dtype=np.intp)
+    order = np.argsort(codes, kind="stable")
+    starts = np.flatnonzero(np.diff(codes[order], prepend=-1))
+    return list(specialty_codes), order, starts
+
+
+def _template_months(departments: Sequence[Department],
+                     templates: Sequence[Tuple[Sequence[dict], int]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """学生模板 × 科室 占用的人月数 (全部轮转, 后期轮转) 及每个模板的学生数，半月轮转在该月也占1人"""
+    department_index = {dept.name: col for col, dept in enumerate(departments)}
+    total = np.zeros((len(templates), len(departments)), dtype=np.int64)
+    later = np.zeros((len(templates), len(departments)), dtype=np.int64)
+    for row, (rotations, _) in enumerate(templates):
+        for rotation in rotations:
+            col = department_index[rotation["科室名"]]
+            months_needed = math.ceil(rotation["月数"])
+            total[row, col] += months_needed
+            if rotation["后期轮转"]:
+                later[row, col] += months_needed
+    counts = np.array([count for _, count in templates], dtype=np.int64)
+    return total, later, counts
+
+
+def find_bottlenecks(departments: Sequence[Department], templates: Sequence[Tuple[Sequence[dict], int]],
+                     limits: CapacityLimits, months: int, later_start_month: int,
+                     background: Optional[np.ndarray] = None) -> List[Bottleneck]:
+    """排期前检查各专业的人数上限是否足以安排所有学生
+
+    每个学生在每个专业选择一个科室，轮转需要的人月数至少为该专业各科室中最少的一个；
+    专业的容量为排期期间各科室人数上限减去其他年级固定人数后的总和。后期轮转另外只与一年后的容量比较。
+    两者都是必要条件：不满足时一定无法排完，满足时仍可能因月份冲突排不完。
+
+    Args:
+        templates: [(学生的轮转需求模板, 使用该模板的学生数)]
+        limits: capacity_limits的结果
+        months: 排期月数
+        later_start_month: 后期轮转最早开始的月份序号
+        background: 其他年级的 月份 × 科室 固定人数
+    Returns:
+        List[Bottleneck] - 容量不足的专业，按科室顺序
+    """
+    if not departments or not templates:
+        return []
+    names, order, starts = _specialty_segments(departments)
+    total, later, counts = _template_months(departments, templates)
+    # 每个专业取人月数最少的科室，再按学生数加总
+    demand_total = counts @ np.minimum.reduceat(total[:, order], starts, axis=1)
+    demand_later = counts @ np.minimum.reduceat(later[:, order], starts, axis=1)
+
+    # 各科室剩余的人数上限，没有上限的科室容量为无穷大
+    maximum = limits.maximum[:months]
+    room = maximum.astype(float)
+    if background is not None:
+        room -= background[:months]
+    room = np.where(maximum >= UNLIMITED, np.inf, np.maximum(room, 0))
+    capacity_total = np.add.reduceat(room.sum(axis=0)[order], starts)
+    capacity_later = np.add.reduceat(room[later_start_month:].sum(axis=0)[order], starts)
+
+    members = [[dept.name for dept in departments if dept.specialty == name] for name in names]
+    bottlenecks = []
+    for period, demand, capacity in (("整个排期", demand_total, capacity_total),
+                                     ("一年后", demand_later, capacity_later)):
+        for code in np.flatnonzero(demand > capacity).tolist():
+            if period == "一年后" and any(b.specialty == names[code] for b in bottlenecks):
+                continue
+            bottlenecks.append(Bottleneck(names[code], members[code], period, int(demand[code]),
+                                          int(capacity[code])))
+    return bottlenecks
+
+
+def find_unmet_minimums(departments: Sequence[Department], templates: Sequence[Tuple[Sequence[dict], int]],
+                        limits: CapacityLimits, months: int, later_start_month: int,
+                        background: Optional[np.ndarray] = None) -> List[Bottleneck]:
+    """排期前检查各科室的每月最少人数是否可能满足
+
+    科室需要的人月数为各月最少人数减去其他年级固定人数后的总和。学生能提供的人月数最多为
+    所有学生都选择该科室时的轮转月数，同一专业各科室合计最多为每个学生选择该专业中月数最多的科室；
+    后期轮转科室在一年内没有本年级学生，需要的人数只能由其他年级提供。这些都是必要条件，
+    满足时仍可能因月份冲突达不到最少人数。
+
+    Args:
+        与find_bottlenecks相同
+    Returns:
+        List[Bottleneck] - 最少人数无法满足的科室或专业，按科室顺序
+    """
+    if not departments or not templates:
+        return []
+    names, order, starts = _specialty_segments(departments)
+    total, _, counts = _template_months(departments, templates)
+    # 各科室每月还需要本年级提供的人数
+    need = limits.minimum[:months].astype(np.int64)
+    if background is not None:
+        need = need - background[:months]
+    need = np.maximum(need, 0)
+    later = np.array([bool(dept.is_later_rotation) for dept in departments], dtype=bool)
+    early_need = np.where(later, need[:later_start_month].sum(axis=0), 0)
+    demand = need.sum(axis=0)
+    supply = counts @ total
+    demand_specialty = np.add.reduceat(demand[order], starts)
+    supply_specialty = counts @ np.maximum.reduceat(total[:, order], starts, axis=1)
+
+    bottlenecks = []
+    for col, dept in enumerate(departments):
+        if early_need[col] > 0:
+            bottlenecks.append(Bottleneck(dept.specialty, [dept.name], "一年内", int(early_need[col]), 0,
+                                          LIMIT_MINIMUM))
+        elif demand[col] > supply[col]:
+            bottlenecks.append(Bottleneck(dept.specialty, [dept.name], "整个排期", int(demand[col]),
+                                          int(supply[col]), LIMIT_MINIMUM))
+    # 各科室分别可以满足时，检查同一专业的科室合计
+    reported = {b.specialty for b in bottlenecks}
+    for code in np.flatnonzero(demand_specialty > supply_specialty).tolist():
+        if names[code] not in reported:
+            members = [dept.name for dept in departments if dept.specialty == names[code]]
+            bottlenecks.append(Bottleneck(names[code], members, "整个排期", int(demand_specialty[code]),
+                                          int(supply_specialty[code]), LIMIT_MINIMUM))
+    return bottlenecks
@@ -1,6 +1,10 @@
 import json
 import os
-from typing import List, Dict, Any, Optional, Union
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from utils.database import Database, default_database_file
+from utils.persistence import JsonFileWriter
 
 class Department:
     def __init__(
@@ -9,7 +13,10 @@ class Department:
         specialty: str,         # 科室专业
         rotation_times: int,    # 需要轮转次数
         months_per_rotation: Union[float, List[float]],  # 每次轮转月数(可以是单一值或列表)
-        is_later_rotation: bool = False  # 是否在第一年后轮转
+        is_later_rotation: bool = False,  # 是否在第一年后轮转
+        min_capacity: Optional[int] = None,  # 每月最少人数，None表示不限
+        max_capacity: Optional[int] = None,  # 每月最多人数，None表示不限
+        monthly_capacity: Optional[Dict[str, List[Optional[int]]]] = None  # 按月份指定的人数 {"YYYY-MM": [最少, 最多]}
     ):
         self.name = name
         self.specialty = specialty
@@ -29,6 +36,10 @@ class Department:
             self.months_per_rotation = months_per_rotation[:rotation_times]
             
         self.is_later_rotation = is_later_rotation
+        # 人数限制：默认值适用于所有月份，monthly_capacity中的月份覆盖默认值，其中的None表示使用默认值
+        self.min_capacity = min_capacity
+        self.max_capacity = max_capacity
+        self.monthly_capacity = {month: list(limits) for month, limits in (monthly_capacity or {}).items()}
         
     def to_dict(self) -> Dict[str, Any]:
         """将科室信息转换为字典"""
@@ -37,7 +48,10 @@ class Department:
             "specialty": self.specialty,
             "rotation_times": self.rotation_times,
             "months_per_rotation": self.months_per_rotation,
-            "is_later_rotation": self.is_later_rotation
+            "is_later_rotation": self.is_later_rotation,
+            "min_capacity": self.min_capacity,
+            "max_capacity": self.max_capacity,
+            "monthly_capacity": self.monthly_capacity
         }
         
     @classmethod
@@ -48,9 +62,23 @@ class Department:
             specialty=data["specialty"],
             rotation_times=data["rotation_times"],
             months_per_rotation=data["months_per_rotation"],
-            is_later_rotation=data.get("is_later_rotation", False)
+            is_later_rotation=data.get("is_later_rotation", False),
+            min_capacity=data.get("min_capacity"),
+            max_capacity=data.get("max_capacity"),
+            monthly_capacity=data.get("monthly_capacity")
         )
     
+    def has_capacity_limits(self) -> bool:
+        """是否设置了人数限制"""
+        return (self.min_capacity is not None or self.max_capacity is not None
+                or any(limit is not None for limits in self.monthly_capacity.values() for limit in limits))
+    
+    def get_capacity(self, month: str) -> Tuple[Optional[int], Optional[int]]:
+        """获取某月（"YYYY-MM"）的 (最少人数, 最多人数)，None表示不限"""
+        minimum, maximum = self.monthly_capacity.get(month) or (None, None)
+        return (self.min_capacity if minimum is None else minimum,
+                self.max_capacity if maximum is None else maximum)
+    
     def get_total_months(self) -> float:
         """获取该科室总轮转月数"""
         return sum(self.months_per_rotation)
@@ -64,14 +92,50 @@ class Department:
 
 
 class DepartmentManager:
-    def __init__(self):
+    def __init__(self, data_file: Optional[str] = None, save_delay: float = 0.0,
+                 database_file: Optional[str] = None):
+        """
+        Args:
+            data_file: 科室数据文件，默认data/departments.json
+            save_delay: 延迟保存的秒数，0表示每次修改后立即保存
+            database_file: SQLite数据库文件，数据文件和数据库都未指定时使用环境变量LUNZHAN_DATABASE，
+                环境变量也未设置时使用JSON文件
+        """
         self.departments = []
-        self.data_file = "data/departments.json"
+        if data_file is None and database_file is None:
+            # 调用方指定了数据文件时不使用环境变量，避免写入用户的数据库
+            database_file = default_database_file()
+        self.data_file = data_file or "data/departments.json"
+        self.save_delay = save_delay
+        self.database_file = database_file
+        self._database = Database(self.database_file) if self.database_file else None
+        self.version = 0  # 科室数据每次变化后递增，调用方可据此判断缓存是否过期
+        self._name_index = {}  # 科室名 -> 科室
+        self._specialty_index = {}  # 专业 -> 该专业的科室列表，按科室顺序
+        self._writer = JsonFileWriter("科室数据", save_delay)
+        self._batch_depth = 0  # 嵌套的批量修改层数
+        self._batch_dirty = False  # 批量修改期间是否有需要保存的修改
         self._load_departments()
         self._initialize_default_departments()
+    
+    def __getstate__(self):
+        # 写入器包含线程锁、数据库连接不能序列化（多进程排期时传递管理器）
+        state = self.__dict__.copy()
+        del state["_writer"]
+        del state["_database"]
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._writer = JsonFileWriter("科室数据", self.save_delay)
+        self._database = Database(self.database_file) if self.database_file else None
         
     def _load_departments(self):
-        """从文件加载科室数据"""
+        """从数据库或文件加载科室数据，数据库为空时导入已有的JSON文件"""
+        if self._database is not None and self._database.count("departments"):
+            self.departments = [Department.from_dict(item) for item in self._database.load("departments")]
+            self._rebuild_indexes()
+            return
         if os.path.exists(self.data_file):
             try:
                 with open(self.data_file, 'r', encoding='utf-8') as f:
@@ -80,77 +144,139 @@ class DepartmentManager:
             except Exception as e:
                 print(f"加载科室数据失败: {e}")
                 self.departments = []
+        self._rebuild_indexes()
+        if self._database is not None and self.departments:
+            self.save_departments()
+    
+    def _rebuild_indexes(self):
+        """根据科室列表重建名称和专业索引"""
+        self._name_index = {}
+        self._specialty_index = {}
+        for dept in self.departments:
+            self._index_department(dept)
+        self.version += 1
+    
+    def _index_department(self, department: Department):
+        """将科室加入名称和专业索引"""
+        self._name_index[department.name] = department
+        self._specialty_index.setdefault(department.specialty, []).append(department)
     
     def _initialize_default_departments(self):
         """如果没有科室数据，初始化默认科室"""
         if not self.departments:
-            # 心内科 (两次轮转)
-            self.add_department(Department("心内一科", "心内科", 2, [2.0, 1.5]))  # 第一次轮转2个月，第二次1.5个月
-            self.add_department(Department("心内二科", "心内科", 2, [2.0, 2.0]))  # 两次轮转均为2个月
-            self.add_department(Department("心电图室", "心电图室", 1, 0.5))  # 轮转0.5个月
-            
-            # 呼吸内科 (两次轮转)
-            self.add_department(Department("呼吸一科", "呼吸内科", 2, 1.0))  # 两次轮转均为1个月
-            self.add_department(Department("呼吸二科", "呼吸内科", 2, 1.0))  # 两次轮转均为1个月
-            
-            # 消化科和中西医肝病科
-            self.add_department(Department("消化科", "消化科", 1, 1.0))
-            self.add_department(Department("中西医肝病科", "中西医肝病科", 1, 2.0))
-            
-            # 急诊科 (3个月轮转)
-            self.add_department(Department("急诊科", "急诊科", 1, 3.0))
-            
-            # 2个月轮转的科室
-            self.add_department(Department("感染科", "感染科", 1, 2.0))
-            self.add_department(Department("风湿科", "风湿科", 1, 2.0))
-            self.add_department(Department("肾内科", "肾内科", 1, 2.0))
-            self.add_department(Department("血液科", "血液科", 1, 2.0))
-            self.add_department(Department("内分泌科", "内分泌科", 1, 2.0))
-            self.add_department(Department("神经内科", "神经内科", 1, 2.0))
-            self.add_department(Department("重症医学科", "重症医学科", 1, 2.0))
-            self.add_department(Department("肿瘤科", "肿瘤科", 1, 2.0))
-            self.add_department(Department("老年病科", "老年病科", 1, 2.0))
+            with self.batch():
+                # 心内科 (两次轮转)
+                self.add_department(Department("心内一科", "心内科", 2, [2.0, 1.5]))  # 第一次轮转2个月，第二次1.5个月
+                self.add_department(Department("心内二科", "心内科", 2, [2.0, 2.0]))  # 两次轮转均为2个月
+                self.add_department(Department("心电图室", "心电图室", 1, 0.5))  # 轮转0.5个月
+                
+                # 呼吸内科 (两次轮转)
+                self.add_department(Department("呼吸一科", "呼吸内科", 2, 1.0))  # 两次轮转均为1个月
+                self.add_department(Department("呼吸二科", "呼吸内科", 2, 1.0))  # 两次轮转均为1个月
+                
+                # 消化科和中西医肝病科
+                self.add_department(Department("消化科", "消化科", 1, 1.0))
+                self.add_department(Department("中西医肝病科", "中西医肝病科", 1, 2.0))
+                
+                # 急诊科 (3个月轮转)
+                self.add_department(Department("急诊科", "急诊科", 1, 3.0))
+                
+                # 2个月轮转的科室
+                self.add_department(Department("感染科", "感染科", 1, 2.0))
+                self.add_department(Department("风湿科", "风湿科", 1, 2.0))
+                self.add_department(Department("肾内科", "肾内科", 1, 2.0))
+                self.add_department(Department("血液科", "血液科", 1, 2.0))
+                self.add_department(Department("内分泌科", "内分泌科", 1, 2.0))
+                self.add_department(Department("神经内科", "神经内科", 1, 2.0))
+                self.add_department(Department("重症医学科", "重症医学科", 1, 2.0))
+                self.add_department(Department("肿瘤科", "肿瘤科", 1, 2.0))
+                self.add_department(Department("老年病科", "老年病科", 1, 2.0))
                 
     def save_departments(self):
-        """保存科室数据到文件"""
-        # 确保目录存在
-        os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
+        """保存科室数据到文件
         
+        批量修改期间只做标记，结束时保存一次；设置了延迟保存时在后台合并写入。
+        """
+        if self._batch_depth:
+            self._batch_dirty = True
+            return
+        data = [dept.to_dict() for dept in self.departments]
+        if self._database is not None:
+            self._database.replace_all("departments", data)
+        else:
+            self._writer.submit(self.data_file, data)
+    
+    def _save_change(self, write_row: Callable[[Database], None]):
+        """保存单个科室的修改：使用数据库且不在批量修改中时只写入变化的行，否则保存所有数据"""
+        if self._database is not None and not self._batch_depth:
+            write_row(self._database)
+        else:
+            self.save_departments()
+    
+    def flush(self) -> bool:
+        """立即写入延迟保存的数据，返回是否写入成功"""
+        return self._writer.flush()
+    
+    @contextmanager
+    def batch(self):
+        """批量修改科室数据，期间的增删改只在结束时保存一次
+        
+        可以嵌套，最外层结束时保存。出现异常时恢复为修改前的数据并重建索引，不保存。
+        """
+        backup = list(self.departments) if self._batch_depth == 0 else None
+        self._batch_depth += 1
         try:
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                data = [dept.to_dict() for dept in self.departments]
-                json.dump(data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"保存科室数据失败: {e}")
+            yield self
+        except BaseException:
+            if backup is not None:
+                self.departments = backup
+                self._rebuild_indexes()
+                self._batch_dirty = False
+            raise
+        finally:
+            self._batch_depth -= 1
+        if self._batch_depth == 0 and self._batch_dirty:
+            self._batch_dirty = False
+            self.save_departments()
             
     def add_department(self, department: Department):
         """添加科室"""
         self.departments.append(department)
-        self.save_departments()
+        self._index_department(department)
+        self.version += 1
+        self._save_change(lambda database: database.insert("departments", len(self.departments) - 1,
+                                                           department.to_dict()))
         
     def remove_department(self, index: int):
         """删除科室"""
         if 0 <= index < len(self.departments):
             del self.departments[index]
-            self.save_departments()
+            self._rebuild_indexes()
+            self._save_change(lambda database: database.delete("departments", index))
             
     def update_department(self, index: int, department: Department):
         """更新科室信息"""
         if 0 <= index < len(self.departments):
             self.departments[index] = department
-            self.save_departments()
+            self._rebuild_indexes()
+            self._save_change(lambda database: database.update("departments", index, department.to_dict()))
             
     def get_departments(self) -> List[Department]:
         """获取所有科室"""
         return self.departments
     
+    def get_department(self, name: str) -> Optional[Department]:
+        """根据科室名获取科室"""
+        return self._name_index.get(name)
+    
     def get_specialties(self) -> List[str]:
-        """获取所有科室专业"""
-        specialties = set()
-        for dept in self.departments:
-            specialties.add(dept.specialty)
-        return list(specialties)
+        """获取所有科室专业，按科室顺序"""
+        return list(self._specialty_index)
     
     def get_departments_by_specialty(self, specialty: str) -> List[Department]:
         """根据专业获取科室列表"""
-        return [dept for dept in self.departments if dept.specialty == specialty] 
\ No newline at end of file
+        return list(self._specialty_index.get(specialty, []))
+    
+    def get_specialty_index(self) -> Dict[str, List[Department]]:
+        """获取 专业 -> 科室列表 的索引，返回的索引随科室数据更新，调用方不能修改"""
+        return self._specialty_index 
\ No newline at end of file
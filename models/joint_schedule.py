@@ -0,0 +1,100 @@
+import numpy as np
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from models.department import DepartmentManager
+from models.rotation import RotationScheduler, aligned_occupancy
+from models.schedule_store import ScheduleStore
+from models.student import StudentManager
+from utils.database import Database
+from utils.month_calendar import MonthCalendar
+from utils.result_cache import ResultCache
+
+
+class JointScheduler:
+    """多个年级联合排期
+
+    各年级的轮转时间相互重叠，分别排期时每个年级都假设科室从0人开始，叠加后部分科室人数过多。
+    联合排期按开始日期依次排期，每个年级把已排好的年级和固定的已有排期作为科室的固定人数，
+    均衡的是所有年级相加后的科室月度人数；之后再轮流以其他所有年级为固定人数，
+    对每个年级重新分配同专业科室并局部搜索，使后排的年级也影响先排的年级。
+    """
+    def __init__(self, student_manager: StudentManager, department_manager: DepartmentManager):
+        self.student_manager = student_manager
+        self.department_manager = department_manager
+        self.schedulers: Dict[str, RotationScheduler] = {}  # 年级 -> 联合排期的调度器，按开始日期排序
+        self.background: Dict[str, ScheduleStore] = {}  # 年级 -> 固定不变的已有排期
+        self.result_cache: Optional[ResultCache] = None  # 各年级初次排期使用的结果缓存
+
+    def add_background(self, grade: str, store: ScheduleStore):
+        """添加固定不变的已有排期，例如之前生成的年级"""
+        self.background[grade] = store
+
+    def load_background(self, database: Database, grades: Sequence[str]) -> List[str]:
+        """从数据库载入之前保存的年级排期作为固定人数
+
+        Returns:
+            List[str] - 成功载入的年级，没有保存或科室配置已变化的年级不载入
+        """
+        loaded = []
+        for grade in grades:
+            scheduler = RotationScheduler(self.student_manager, self.department_manager)
+            if scheduler.load_from_database(database, grade):
+                self.add_background(grade, scheduler.store)
+                loaded.append(grade)
+        return loaded
+
+    def _stores_except(self, grade: Optional[str]) -> List[ScheduleStore]:
+        """除指定年级外所有年级的排期"""
+        stores = [store for name, store in self.background.items() if name != grade]
+        stores += [scheduler.store for name, scheduler in self.schedulers.items()
+                   if name != grade and scheduler.store is not None]
+        return stores
+
+    def generate(self, cohorts: Sequence[Tuple[str, datetime]], restarts: int = 1, seed: Optional[int] = None,
+                 workers: Optional[int] = None, optimize_seconds: float = 0.0,
+                 optimize_iterations: Optional[int] = None, refine_rounds: int = 1,
+                 balance_siblings: bool = True) -> Dict[str, RotationScheduler]:
+        """联合生成多个年级的排期
+
+        Args:
+            cohorts: [(年级, 开始日期)]，按开始日期依次排期
+            refine_rounds: 全部排完后，以其他所有年级为固定人数轮流调整每个年级的轮数
+            其余参数与RotationScheduler.generate_schedule相同，对每个年级分别使用
+        Returns:
+            Dict[str, RotationScheduler] - 年级 -> 调度器，没有学生的年级排期为空
+        """
+        self.schedulers = {}
+        for grade, start_date in sorted(cohorts, key=lambda cohort: cohort[1]):
+            scheduler = RotationScheduler(self.student_manager, self.department_manager)
+            scheduler.set_background(self._stores_except(grade))
+            scheduler.result_cache = self.result_cache
+            scheduler.generate_schedule(start_date, grade, restarts, seed, workers, optimize_seconds,
+                                        optimize_iterations, balance_siblings)
+            self.schedulers[grade] = scheduler
+
+        for _ in range(refine_rounds if len(self.schedulers) + len(self.background) > 1 else 0):
+            for grade, scheduler in self.schedulers.items():
+                if scheduler.store is None:
+                    continue
+                scheduler.set_background(self._stores_except(grade))
+                if balance_siblings:
+                    scheduler.assign_sibling_departments()
+                if optimize_seconds > 0 or optimize_iterations:
+                    scheduler.optimize_schedule(optimize_seconds, optimize_iterations, seed)
+        return self.schedulers
+
+    def combined_occupancy(self) -> Tuple[Optional[MonthCalendar], np.ndarray]:
+        """所有年级（包括固定的已有排期）相加后的科室月度人数
+
+        Returns:
+            (覆盖所有排期的日历, 月份 × 科室 的人数矩阵，列与科室配置顺序一致)，没有排期时日历为None
+        """
+        stores = self._stores_except(None)
+        names = [dept.name for dept in self.department_manager.get_departments()]
+        if not stores:
+            return None, np.zeros((0, len(names)), dtype=np.int64)
+        start = min(stores, key=lambda store: store.calendar.start_ordinal).calendar
+        end = max(store.calendar.start_ordinal + store.months for store in stores)
+        calendar = MonthCalendar(start.start_date, end - start.start_ordinal)
+        return calendar, aligned_occupancy(stores, calendar, calendar.months, names)
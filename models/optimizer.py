@@ -0,0 +1,392 @@
+import time
+import numpy as np
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from models.schedule_store import ScheduleStore, EMPTY, FLAG_OUTPATIENT
+
+# 每隔多少次尝试检查一次是否超时或需要停止
+_DEADLINE_CHECK_INTERVAL = 256
+
+
+class LocalSearchOptimizer:
+    """排期局部搜索优化
+
+    在贪心排期结果的基础上，随机交换同一学生两个等长的轮转段（调整轮转顺序），
+    使各科室每个半月时段的人数更均衡。目标函数为 半月时段 × 科室 人数的平方和，
+    每个学生的轮转内容不变，因此各科室总人数不变，平方和越小人数越均衡。
+    交换只改变两个轮转段所在的时段，目标函数变化量可以只根据这些时段的人数计算。
+
+    交换需满足以下规则：
+    - 后期轮转（含门诊）必须仍在该学生开始轮转一年后
+    - 交换后同一专业不能前后相连
+    - 两个轮转段长度相同且起点同为整月或半月，半月轮转的拼接方式不变
+    - 设置了科室人数上限时，交换后新进入某科室某月的学生不能使该月人数超过上限
+    - 设置了科室最少人数时，交换后离开某科室某月的学生不能使该月人数低于最少人数
+    """
+    def __init__(self, store: ScheduleStore, department_specialties: Sequence[int],
+                 department_later: Sequence[bool], later_start_month: int = 12,
+                 seed: Optional[int] = None, first_month: int = 0,
+                 background: Optional[np.ndarray] = None, capacity_room: Optional[np.ndarray] = None,
+                 start_months: Optional[Sequence[int]] = None, capacity_surplus: Optional[np.ndarray] = None):
+        """
+        Args:
+            store: 需要优化的排期矩阵，直接在其上修改
+            department_specialties: 每个科室编号对应的专业编号
+            department_later: 每个科室编号是否为后期轮转
+            later_start_month: 后期轮转最早开始的月份，相对每个学生开始轮转的月份
+            seed: 随机种子
+            first_month: 只调整从该月开始的轮转段，之前的排期保持不变
+            background: 其他年级在各 半月时段 × 科室 的固定人数，计入目标函数但不调整
+            capacity_room: 各 月份 × 科室 距人数上限还可增加的人数，为None时不限制，交换后随之更新
+            start_months: 每个学生开始轮转的月份序号，默认都从第0个月开始；
+                交换不改变有安排的时段，因此在优化过程中不变
+            capacity_surplus: 各 月份 × 科室 高于最少人数的人数，为None时不限制，交换后随之更新
+        """
+        self.store = store
+        self.specialties = np.asarray(department_specialties, dtype=np.int64)
+        self.later = np.asarray(department_later, dtype=bool)
+        # 每个学生后期轮转最早可安排的半月时段
+        if start_months is None:
+            start_months = np.zeros(store.codes.shape[0], dtype=np.int64)
+        self.later_start_slots = 2 * (np.asarray(start_months, dtype=np.int64) + later_start_month)
+        self.rng = np.random.default_rng(0 if seed is None else seed)
+        self.first_slot = 2 * first_month
+
+        # 半月时段 × 科室 的人数矩阵，包括其他年级的固定人数
+        self.load = store.slot_occupancy()
+        if background is not None:
+            self.load += background
+        self.capacity_room = None if capacity_room is None else np.array(capacity_room, dtype=np.int64)
+        self.capacity_surplus = None if capacity_surplus is None else np.array(capacity_surplus, dtype=np.int64)
+
+        # 每个学生可交换的轮转段分组缓存 {行号: {(长度, 起点奇偶): [起点, ...]}}
+        self._groups = {}
+
+    def objective(self) -> int:
+        """目标函数：各科室每个半月时段人数的平方和"""
+        return int((self.load ** 2).sum())
+
+    def _row_blocks(self, row: int) -> List[Tuple[int, int]]:
+        """将学生的排期按连续相同科室和标识切分为轮转段 [(起点, 长度)]，不含空闲时段"""
+        codes = self.store.codes[row]
+        flags = self.store.flags[row]
+        # 科室或标识变化的位置即为轮转段边界
+        changes = np.flatnonzero((codes[1:] != codes[:-1]) | (flags[1:] != flags[:-1])) + 1
+        starts = np.concatenate(([0], changes))
+        ends = np.concatenate((changes, [len(codes)]))
+        return [(start, end - start) for start, end in zip(starts.tolist(), ends.tolist())
+                if codes[start] != EMPTY]
+
+    def _row_groups(self, row: int) -> Dict[Tuple[int, int], List[int]]:
+        """学生可交换的轮转段，按(长度, 起点奇偶)分组"""
+        if row not in self._groups:
+            groups = {}
+            for start, length in self._row_blocks(row):
+                if start >= self.first_slot:
+                    groups.setdefault((length, start % 2), []).append(start)
+            self._groups[row] = {key: value for key, value in groups.items() if len(value) > 1}
+        return self._groups[row]
+
+    def _is_later_block(self, row: int, start: int) -> bool:
+        """轮转段是否为后期轮转：后期轮转科室或门诊轮转，且当前已安排在一年后"""
+        code = self.store.codes[row, start]
+        is_later = self.later[code] or bool(self.store.flags[row, start] & FLAG_OUTPATIENT)
+        return bool(is_later) and start >= self.later_start_slots[row]
+
+    def _swap_allowed(self, row: int, first: int, second: int, length: int) -> bool:
+        """检查交换两个轮转段后是否仍满足排期规则"""
+        later_start_slot = self.later_start_slots[row]
+        if self._is_later_block(row, first) and second < later_start_slot:
+            return False
+        if self._is_later_block(row, second) and first < later_start_slot:
+            return False
+
+        # 在当前行的副本上试交换，检查两个轮转段的四个边界
+        codes = self.store.codes[row].astype(np.intp)
+        first_slots = slice(first, first + length)
+        second_slots = slice(second, second + length)
+        codes[first_slots], codes[second_slots] = codes[second_slots].copy(), codes[first_slots].copy()
+        specialties = np.where(codes >= 0, self.specialties[np.maximum(codes, 0)], -1)
+        for boundary in (first, first + length, second, second + length):
+            if 0 < boundary < len(codes):
+                left, right = specialties[boundary - 1], specialties[boundary]
+                if left >= 0 and left == right:
+                    return False
+        return self._capacity_allowed(row, codes, self._touched_months(first, second, length))
+
+    def _capacity_allowed(self, row: int, codes: np.ndarray, months: Sequence[int]) -> bool:
+        """学生排期改为codes后，这些月份新进入或离开的科室是否仍满足人数上限和最少人数"""
+        if self.capacity_room is None and self.capacity_surplus is None:
+            return True
+        after = self._month_presence(codes, months)
+        before = self._month_presence(self.store.codes[row], months)
+        if self.capacity_room is not None and any(self.capacity_room[month, code] <= 0
+                                                  for month, code in after - before):
+            return False
+        if self.capacity_surplus is not None and any(self.capacity_surplus[month, code] <= 0
+                                                     for month, code in before - after):
+            return False
+        return True
+
+    @staticmethod
+    def _touched_months(first: int, second: int, length: int) -> List[int]:
+        """交换两个轮转段涉及的月份"""
+        return sorted(set(range(first // 2, (first + length - 1) // 2 + 1)) |
+                      set(range(second // 2, (second + length - 1) // 2 + 1)))
+
+    @staticmethod
+    def _month_presence(codes: np.ndarray, months: Sequence[int]) -> Set[Tuple[int, int]]:
+        """学生在这些月份轮转的 (月份, 科室)，与月度人数的统计方式一致，半月轮转也计入该月"""
+        return {(month, code) for month in months
+                for code in codes[2 * month:2 * month + 2].tolist() if code != EMPTY}
+
+    def _swap_delta(self, row: int, first: int, second: int, length: int) -> int:
+        """计算交换两个轮转段后目标函数的变化量"""
+        a = int(self.store.codes[row, first])
+        b = int(self.store.codes[row, second])
+        if a == b:
+            return 0
+        first_slots = slice(first, first + length)
+        second_slots = slice(second, second + length)
+        # 科室a从first移到second，科室b从second移到first，(x+1)^2 - x^2 = 2x + 1
+        delta = 2 * (self.load[second_slots, a] - self.load[first_slots, a] + 1).sum()
+        delta += 2 * (self.load[first_slots, b] - self.load[second_slots, b] + 1).sum()
+        return int(delta)
+
+    def _apply_swap(self, row: int, first: int, second: int, length: int):
+        """执行交换并更新人数矩阵"""
+        a = int(self.store.codes[row, first])
+        b = int(self.store.codes[row, second])
+        first_slots = slice(first, first + length)
+        second_slots = slice(second, second + length)
+        self.load[first_slots, a] -= 1
+        self.load[second_slots, a] += 1
+        self.load[second_slots, b] -= 1
+        self.load[first_slots, b] += 1
+        months, before = None, None
+        if self.capacity_room is not None or self.capacity_surplus is not None:
+            months = self._touched_months(first, second, length)
+            before = self._month_presence(self.store.codes[row], months)
+        self.store.swap_blocks(row, first, second, length)
+        self._update_capacity(row, months, before)
+
+    def _update_capacity(self, row: int, months: Optional[Sequence[int]],
+                         before: Optional[Set[Tuple[int, int]]]):
+        """学生排期修改后更新人数上限的剩余名额与最少人数的富余人数
+
+        Args:
+            months: 排期有变化的月份
+            before: 修改前这些月份学生轮转的 (月份, 科室)，没有人数限制时为None
+        """
+        if before is not None:
+            after = self._month_presence(self.store.codes[row], months)
+            for matrix, sign in ((self.capacity_room, -1), (self.capacity_surplus, 1)):
+                if matrix is None:
+                    continue
+                for month, code in after - before:
+                    matrix[month, code] += sign
+                for month, code in before - after:
+                    matrix[month, code] -= sign
+        self._groups.pop(row, None)
+
+    def _adjacent_boundaries(self, row: int) -> List[int]:
+        """学生排期中前后两个轮转段属于同一专业的位置（后一段的起点）"""
+        return self._adjacent(self.store.codes[row], self.store.flags[row]).tolist()
+
+    def _adjacent(self, codes: np.ndarray, flags: np.ndarray) -> np.ndarray:
+        """一行排期中前后两个轮转段属于同一专业的位置"""
+        codes = codes.astype(np.intp)
+        specialties = np.where(codes >= 0, self.specialties[np.maximum(codes, 0)], -1)
+        change = (codes[1:] != codes[:-1]) | (flags[1:] != flags[:-1])
+        same = change & (specialties[1:] >= 0) & (specialties[1:] == specialties[:-1])
+        return np.flatnonzero(same) + 1
+
+    def _early_later_slots(self, row: int, codes: np.ndarray, flags: np.ndarray) -> np.ndarray:
+        """一行排期中后期轮转（含门诊）安排在开始轮转一年内的半月时段"""
+        later = (codes >= 0) & (self.later[np.maximum(codes, 0)] | (flags & FLAG_OUTPATIENT).astype(bool))
+        later[self.later_start_slots[row]:] = False
+        return later
+
+    def _moved_row(self, row: int, block: int, length: int,
+                   target: int) -> Tuple[np.ndarray, np.ndarray, Tuple[int, int, int]]:
+        """将轮转段移到target处，两者之间的轮转段整体顺移
+
+        Returns:
+            (移动后该行的科室, 标识, 移动后新出现的三个边界：轮转段两端和原位置前后两段的衔接处)
+        """
+        codes = self.store.codes[row].copy()
+        flags = self.store.flags[row].copy()
+        if target < block:
+            segment, shift = slice(target, block + length), length
+            boundaries = (target, target + length, block + length)
+        else:
+            segment, shift = slice(block, target), -length
+            boundaries = (block, target - length, target)
+        codes[segment] = np.roll(codes[segment], shift)
+        flags[segment] = np.roll(flags[segment], shift)
+        return codes, flags, boundaries
+
+    def _row_delta(self, row: int, codes: np.ndarray) -> int:
+        """学生排期改为codes后目标函数的变化量"""
+        before = self.store.codes[row]
+        slots = np.flatnonzero(before != codes)
+        old, new = before[slots].astype(np.intp), codes[slots].astype(np.intp)
+        # 每个时段只有该学生变化，(x+1)^2 - x^2 = 2x + 1，(x-1)^2 - x^2 = 1 - 2x
+        delta = (2 * self.load[slots[new >= 0], new[new >= 0]] + 1).sum()
+        delta += (1 - 2 * self.load[slots[old >= 0], old[old >= 0]]).sum()
+        return int(delta)
+
+    def _apply_row(self, row: int, codes: np.ndarray, flags: np.ndarray, months: Sequence[int]):
+        """将学生排期改为codes、flags并更新人数矩阵，months为有变化的月份"""
+        before_codes = self.store.codes[row]
+        slots = np.flatnonzero(before_codes != codes)
+        old, new = before_codes[slots].astype(np.intp), codes[slots].astype(np.intp)
+        self.load[slots[old >= 0], old[old >= 0]] -= 1
+        self.load[slots[new >= 0], new[new >= 0]] += 1
+        before = None
+        if self.capacity_room is not None or self.capacity_surplus is not None:
+            before = self._month_presence(before_codes, months)
+        self.store.set_row(row, codes, flags)
+        self._update_capacity(row, months, before)
+
+    def _best_move(self, row: int) -> Optional[Tuple[int, np.ndarray, np.ndarray, List[int]]]:
+        """将相连处一侧的轮转段移到另一个轮转段之前，两者之间的轮转段整体顺移
+
+        只移动起点和长度都为整月的轮转段，目标位置也为整月，移动后各月份仍为原来的两个半月，
+        半月轮转的拼接不变。移动后同专业相连处必须减少，后期轮转不能提前到开始轮转一年内，
+        并满足科室人数上限和最少人数；选择剩余相连处最少、目标函数增加最少的移动。
+
+        Returns:
+            (目标函数变化量, 移动后的科室, 移动后的标识, 变化的月份)，没有可行的移动时为None
+        """
+        boundaries = self._adjacent_boundaries(row)
+        blocks = self._row_blocks(row)
+        if not boundaries or not blocks:
+            return None
+        codes, flags = self.store.codes[row], self.store.flags[row]
+        early = self._early_later_slots(row, codes, flags)
+        targets = [start for start, _ in blocks] + [blocks[-1][0] + blocks[-1][1]]
+        targets = [target for target in targets if target % 2 == 0 and target >= self.first_slot]
+        best = None
+        for start, length in blocks:
+            if start % 2 or length % 2 or start < self.first_slot:
+                continue
+            if start not in boundaries and start + length not in boundaries:
+                continue
+            for target in targets:
+                if start <= target <= start + length:
+                    continue
+                moved_codes, moved_flags, junctions = self._moved_row(row, start, length, target)
+                # 与交换相同，新的衔接处两侧不能属于同一专业（同一科室也不能拼接）
+                specialties = np.where(moved_codes >= 0, self.specialties[np.maximum(moved_codes, 0)], -1)
+                if any(0 < junction < len(specialties) and specialties[junction - 1] >= 0
+                       and specialties[junction - 1] == specialties[junction] for junction in junctions):
+                    continue
+                remaining = len(self._adjacent(moved_codes, moved_flags))
+                if remaining >= len(boundaries):
+                    continue
+                # 一年内原有的后期轮转可以保留，但不能有新的后期轮转移到一年内
+                unchanged = (moved_codes == codes) & (moved_flags == flags)
+                if (self._early_later_slots(row, moved_codes, moved_flags) & ~(early & unchanged)).any():
+                    continue
+                months = list(range(min(start, target) // 2, max(start + length, target) // 2))
+                if not self._capacity_allowed(row, moved_codes, months):
+                    continue
+                key = (remaining, self._row_delta(row, moved_codes))
+                if best is None or key < best[0]:
+                    best = (key, moved_codes, moved_flags, months)
+        if best is None:
+            return None
+        return best[0][1], best[1], best[2], best[3]
+
+    def separate_specialties(self, rows: Optional[Sequence[int]] = None) -> int:
+        """消除学生排期中同一专业前后相连的轮转段
+
+        贪心排期在只剩同专业的轮转时会将其连续安排。对每个相连处，将两侧轮转段之一与同一学生
+        另一个等长的轮转段交换，交换需满足全部排期规则，选择目标函数增加最少的交换。
+        没有可行的交换时（如本专业科室与长度不同的门诊相连），将一侧轮转段移到其他整月处，
+        中间的轮转段整体顺移。两种调整都不可行的相连处保留，由排期检查报告。
+
+        Args:
+            rows: 需要检查的学生行号，默认所有学生
+        Returns:
+            int - 消除的相连处数
+        """
+        fixed = 0
+        for row in range(self.store.codes.shape[0]) if rows is None else rows:
+            while True:
+                best = None
+                for boundary in self._adjacent_boundaries(row):
+                    for (length, _), starts in self._row_groups(row).items():
+                        # 相连处两侧的轮转段
+                        for block in (boundary - length, boundary):
+                            if block not in starts:
+                                continue
+                            for other in starts:
+                                if other == block or not self._swap_allowed(row, block, other, length):
+                                    continue
+                                delta = self._swap_delta(row, block, other, length)
+                                if best is None or delta < best[0]:
+                                    best = (delta, block, other, length)
+                if best is not None:
+                    self._apply_swap(row, *best[1:])
+                    fixed += 1
+                    continue
+                move = self._best_move(row)
+                if move is None:
+                    break
+                before = len(self._adjacent_boundaries(row))
+                self._apply_row(row, *move[1:])
+                fixed += before - len(self._adjacent_boundaries(row))
+        return fixed
+
+    def optimize(self, time_budget: float, max_iterations: Optional[int] = None,
+                 rows: Optional[Sequence[int]] = None, allow_sideways: bool = True,
+                 should_stop: Optional[Callable[[], bool]] = None) -> int:
+        """在时间预算内进行局部搜索，只接受不使目标函数变差的交换
+
+        当前排期始终是已找到的最好排期，超时即返回。
+
+        Args:
+            time_budget: 时间预算（秒）
+            max_iterations: 最多尝试次数，为None时只受时间限制
+            rows: 允许调整的学生行号，默认所有学生
+            allow_sideways: 是否接受目标函数不变的交换，为False时只接受使目标函数减少的交换
+            should_stop: 定期调用，返回True时提前结束
+        Returns:
+            int - 目标函数的减少量
+        """
+        candidate_rows = np.arange(self.store.codes.shape[0]) if rows is None else np.asarray(rows, dtype=np.intp)
+        if not candidate_rows.size:
+            return 0
+        deadline = time.perf_counter() + time_budget
+        improvement = 0
+        iteration = 0
+        while max_iterations is None or iteration < max_iterations:
+            iteration += 1
+            if iteration % _DEADLINE_CHECK_INTERVAL == 0:
+                if time.perf_counter() >= deadline or (should_stop is not None and should_stop()):
+                    break
+
+            # 随机选择一个学生及其两个可交换的轮转段
+            row = int(candidate_rows[self.rng.integers(candidate_rows.size)])
+            groups = self._row_groups(row)
+            if not groups:
+                continue
+            keys = list(groups)
+            key = keys[self.rng.integers(len(keys))]
+            length, starts = key[0], groups[key]
+            i = int(self.rng.integers(len(starts)))
+            j = int(self.rng.integers(len(starts) - 1))
+            if j >= i:
+                j += 1
+            first, second = starts[i], starts[j]
+
+            delta = self._swap_delta(row, first, second, length)
+            if delta > 0 or (delta == 0 and not allow_sideways):
+                continue
+            if not self._swap_allowed(row, first, second, length):
+                continue
+            self._apply_swap(row, first, second, length)
+            improvement -= delta
+        return improvement
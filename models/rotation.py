@@ -1,22 +1,152 @@
+import copy
+import hashlib
 import json
 import os
 import random
-import pandas as pd
+import struct
+import time
+import zlib
 import numpy as np
-from datetime import datetime, timedelta
-from dateutil.relativedelta import relativedelta
-from typing import List, Dict, Any, Tuple, Set
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Sequence, Tuple, Set, Callable, Union
 
 from models.student import Student, StudentManager
+from models.capacity import (Bottleneck, CapacityError, CapacityLimits, UNLIMITED, capacity_limits,
+                             find_bottlenecks, find_unmet_minimums)
 from models.department import Department, DepartmentManager
+from models.optimizer import LocalSearchOptimizer
+from models.schedule_index import Placement, ScheduleIndex
+from models.schedule_store import ScheduleStore, EMPTY, SUFFIX_FLAGS
+from models.schedule_validator import ValidationReport, month_spread, validate_schedule
+from models.sibling_assignment import SiblingAssigner
+from utils.database import Database
+from utils.excel_io import append_department_sheets, append_schedule_sheet, new_workbook
+from utils.month_calendar import MonthCalendar
+from utils.result_cache import ResultCache
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# 排期算法版本，算法的结果发生变化时递增，使之前缓存的排期失效
+SCHEDULE_ALGORITHM_VERSION = 1
+# 后期轮转科室需在开始日期一年后安排
+LATER_ROTATION_MONTHS = 12
+# 均衡评分中每个未完成轮转的惩罚分
+UNFINISHED_ROTATION_PENALTY = 10
+# 各科室每月人数最大值与最小值之差的上限，超过时排期检查报告人数不均衡
+MAX_MONTHLY_SPREAD = 2
+# 未达到最少人数的科室在贪心排期评分中的优先量，大于理想人数的差距，使其优先安排
+UNDERSTAFFED_PRIORITY = 1000
+# 同专业科室整体分配的最多轮数：轮转结构相同的科室整体求解的轮数，
+# 以及轮转结构不同的科室逐个学生调整的轮数，前几轮已得到绝大部分改进
+SIBLING_ASSIGN_ROUNDS = 4
+SIBLING_STRUCTURE_ROUNDS = 2
+# 导出排期表的学生信息列
+SCHEDULE_INFO_HEADERS = ["姓名", "科室", "年级", "职位"]
+
+
+class ScheduleCancelled(Exception):
+    """排期被用户取消"""
+
+
+def aligned_occupancy(stores: Sequence[ScheduleStore], calendar: MonthCalendar, months: int,
+                      department_names: Sequence[str], half_slots: bool = False) -> np.ndarray:
+    """将多个排期的科室人数按实际月份对齐到同一个日历上相加
+
+    各排期的开始月份可以不同，按科室名对应列，日历范围外的月份和不在department_names中的科室忽略。
+
+    Args:
+        calendar: 目标日历，第0行为其开始月份
+        months: 目标月数
+        department_names: 目标矩阵各列的科室名
+        half_slots: 为True时按半月时段统计，行数为2 × months
+    Returns:
+        np.ndarray - 月份（或半月时段） × 科室 的人数矩阵
+    """
+    scale = 2 if half_slots else 1
+    result = np.zeros((scale * months, len(department_names)), dtype=np.int64)
+    columns = {name: col for col, name in enumerate(department_names)}
+    for store in stores:
+        counts = store.slot_occupancy() if half_slots else store.occupancy()
+        mapping = [(col, columns[name]) for col, name in enumerate(store.department_names) if name in columns]
+        if not mapping:
+            continue
+        source_cols, target_cols = (np.array(cols, dtype=np.intp) for cols in zip(*mapping))
+        # 该排期第0个月在目标日历中的行号
+        offset = scale * (store.calendar.start_ordinal - calendar.start_ordinal)
+        first, last = max(offset, 0), min(offset + len(counts), len(result))
+        if first < last:
+            result[first:last, target_cols] += counts[first - offset:last - offset][:, source_cols]
+    return result
+
+
+class OccupancyStatistics:
+    """科室月度人数统计
+
+    所有统计量都由同一个人数矩阵经NumPy归约得到，界面直接使用，不再从排期字典重新统计。
+    门诊等带特殊标识的轮转作为单独的统计单位，名称带标识后缀。
+    """
+    def __init__(self, names: List[str], months: List[str], counts: np.ndarray, spread: np.ndarray):
+        """
+        Args:
+            names: 统计单位名称，按名称排序
+            months: 月份列表
+            counts: 单位 × 月份 的人数矩阵
+            spread: 每个单位在所有学生都轮转的月份中人数最大值与最小值之差，后期轮转只统计一年后
+        """
+        self.names = names
+        self.months = months
+        self.counts = counts
+        self.spread = spread
+        self.month_totals = counts.sum(axis=0)  # 每月轮转总人数
+        self.unit_totals = counts.sum(axis=1)  # 每个单位所有月份的人数之和
+        self.max_count = int(counts.max(initial=0))
+
 
 class RotationScheduler:
     def __init__(self, student_manager: StudentManager, department_manager: DepartmentManager):
         self.student_manager = student_manager
         self.department_manager = department_manager
-        self.schedule = {}  # 保存排期结果，格式：{学生名: {日期: 科室名}}
-        self.department_counts = {}  # 二维数组，记录每个科室每个月的人数
+        self.store = None  # 保存排期结果的矩阵存储，字典形式见schedule属性
+        self.grade = None  # 排期的年级
+        self.student_snapshot = {}  # 排期时的学生信息 {学生名: 学生信息字典}，用于对比名单变化
+        self.calendar = None  # 本次排期的月份日历
+        self.department_counts = None  # 二维数组(月份 × 科室)，记录每个科室每个月的人数
+        self.department_names = []  # 矩阵列下标 -> 科室名
+        self.department_index = {}  # 科室名 -> 矩阵列下标
+        self.department_later = None  # 每个科室是否为后期轮转
         self.department_total_counts = {}  # 一维数组，记录每个科室的总人数
+        self.unfinished_rotations = {}  # 未安排完成的轮转，格式：{学生名: [(科室名, 剩余月数)]}
+        self.active_months = 0  # 所有学生都在轮转的月数
+        self.capacity: Optional[CapacityLimits] = None  # 各科室每月的人数限制，没有设置人数限制时为None
+        self._rng = None  # 随机重启时用于打破平局的随机数生成器
+        self._statistics_cache = None  # ((年级, 排期矩阵, 排期版本), 人数统计)
+        # 其他年级已确定的排期，作为各科室的固定人数参与均衡，不调整，见set_background
+        self.background_stores: List[ScheduleStore] = []
+        self._index_cache = None  # ((年级, 排期矩阵, 排期版本), 排期查询索引)
+        # 排期结果的磁盘缓存，设置后输入相同的排期直接返回缓存的结果
+        self.result_cache: Optional[ResultCache] = None
+        self.last_cache_key: Optional[str] = None  # 最近一次排期输入的哈希
+        self.cache_hit = False  # 最近一次排期是否直接使用了缓存的结果
+        # 进度回调 (阶段, 已完成数, 总数)，总数为0表示无法估计进度；可在工作线程中调用
+        self.progress_callback: Optional[Callable[[str, int, int], None]] = None
+        # 返回True时取消排期，排期过程中定期检查，取消时抛出ScheduleCancelled
+        self.should_cancel: Optional[Callable[[], bool]] = None
+        # 每次排期前由_prepare_requirements计算的科室信息缓存
+        self._base_rotations = []  # 基础轮转列表
+        self._base_rotation_months = None  # 基础轮转月数
+        self._specialty_departments = {}  # 专业 -> 该专业的科室列表，按科室顺序
+        self._department_specialties = {}  # 科室名 -> 专业
+        self._requirement_templates = {}  # 培养方案 -> 轮转需求模板
+        self._requirements_version = None  # 缓存对应的科室数据版本
+
+    @property
+    def schedule(self) -> Dict[str, Dict[str, str]]:
+        """排期结果，格式：{学生名: {日期: 科室名}}，由排期矩阵按需生成"""
+        if self.store is None:
+            return {}
+        return self.store.to_dict()
 
     def _calculate_base_rotation_months(self) -> int:
         """计算该学生的基础轮转月数"""
@@ -37,9 +167,10 @@ class RotationScheduler:
     def _calculate_total_rotation_months(self, student: Student) -> int:
         """计算该学生需要的总轮转月数"""
             
-        # 计算所有科室的基础轮转月数
+        # 计算所有科室的基础轮转月数，排期过程中使用缓存值
+        self._prepare_requirements()
         total_months = 0
-        total_months += self._calculate_base_rotation_months()
+        total_months += self._base_rotation_months
         
         # 学生自己的专业额外增加2个月
         total_months += 2
@@ -50,73 +181,681 @@ class RotationScheduler:
             
         return total_months
 
-    def generate_schedule(self, start_date: datetime, grade: str) -> Dict[str, Dict[str, str]]:
-        """生成轮转排期"""
-        students = [s for s in self.student_manager.get_students() if s.grade == grade]
+    def generate_schedule(self, start_date: datetime, grade: str, restarts: int = 1,
+                          seed: Optional[int] = None, workers: Optional[int] = None,
+                          optimize_seconds: float = 0.0,
+                          optimize_iterations: Optional[int] = None,
+                          balance_siblings: bool = True) -> Dict[str, Dict[str, str]]:
+        """生成轮转排期
+
+        Args:
+            start_date: 轮转开始日期
+            grade: 年级
+            restarts: 随机重启次数，大于1时多进程并行排期，保留均衡评分最好的结果
+            seed: 随机种子，第i次重启使用 seed + i；为None且只排一次时按名单顺序确定性排期
+            workers: 并行进程数，默认使用CPU核数
+            optimize_seconds: 贪心排期后局部搜索优化的时间预算（秒），为0时不优化
+            optimize_iterations: 局部搜索最多尝试次数，指定后优化结果与运行速度无关
+            balance_siblings: 贪心排期后是否按月度人数整体重新选择轮转结构相同的同专业科室
+        Raises:
+            CapacityError: 科室人数上限不足以安排所有学生，排期开始前检查
+            ScheduleCancelled: should_cancel返回True时抛出，此时调度器中的排期结果不完整，应丢弃
+        """
+        self.cache_hit = False
+        self.last_cache_key = self.input_hash(start_date, grade, restarts, seed, optimize_seconds,
+                                              optimize_iterations, balance_siblings)
+        if self.result_cache is not None and self._load_cached_result(self.last_cache_key):
+            self.cache_hit = True
+            self._report_progress("读取缓存", 1, 1)
+            return self.schedule
+        bottlenecks = self.check_capacity(start_date, grade)
+        if bottlenecks:
+            raise CapacityError(bottlenecks)
+        self.grade = grade
+        self.student_snapshot = {s.name: s.to_dict() for s in self.student_manager.get_students_by_grade(grade)}
+        if restarts <= 1:
+            self._generate_single(start_date, grade, seed, balance_siblings)
+        else:
+            self._generate_restarts(start_date, grade, restarts, seed, workers, balance_siblings)
+        
+        if self.store is not None and (optimize_seconds > 0 or optimize_iterations):
+            self.optimize_schedule(optimize_seconds, optimize_iterations, seed)
+        if self.result_cache is not None and self.store is not None:
+            self.result_cache.put(self.last_cache_key, self._encode_result())
+        return self.schedule
+
+    def input_hash(self, start_date: datetime, grade: str, restarts: int = 1, seed: Optional[int] = None,
+                   optimize_seconds: float = 0.0, optimize_iterations: Optional[int] = None,
+                   balance_siblings: bool = True) -> str:
+        """计算排期输入的哈希，作为结果缓存的键
+
+        包括该年级学生和科室配置的全部字段、开始日期、排期参数、算法版本以及其他年级的固定人数；
+        进程数不影响结果，不计入。只按时间限制局部搜索时结果与运行速度有关，
+        缓存保证之后输入相同时返回第一次生成的结果。
+        """
+        inputs = {
+            "version": SCHEDULE_ALGORITHM_VERSION,
+            "grade": grade,
+            "students": [s.to_dict() for s in self.student_manager.get_students_by_grade(grade)],
+            "departments": [dept.to_dict() for dept in self.department_manager.get_departments()],
+            "start_date": start_date.strftime("%Y-%m-%d"),
+            "restarts": restarts,
+            "seed": seed,
+            "optimize_seconds": optimize_seconds,
+            "optimize_iterations": optimize_iterations,
+            "balance_siblings": balance_siblings,
+            "background": [[store.calendar.start_date.isoformat(), store.months, store.department_names,
+                            hashlib.sha256(store.codes.tobytes() + store.flags.tobytes()).hexdigest()]
+                           for store in self.background_stores],
+        }
+        text = json.dumps(inputs, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _encode_result(self) -> bytes:
+        """将排期结果编码为 JSON长度 + 压缩的JSON信息 + 压缩的排期矩阵"""
+        state = zlib.compress(json.dumps(self._saved_state(), ensure_ascii=False).encode("utf-8"))
+        return struct.pack(">I", len(state)) + state + self.store.to_bytes()
+
+    def _load_cached_result(self, key: str) -> bool:
+        """载入缓存的排期结果，没有或无法解析时返回False"""
+        data = self.result_cache.get(key)
+        if data is None:
+            return False
+        try:
+            (length,) = struct.unpack_from(">I", data)
+            state = json.loads(zlib.decompress(data[4:4 + length]).decode("utf-8"))
+            self._restore_saved_state(state, data[4 + length:])
+        except (ValueError, KeyError, struct.error, zlib.error) as e:
+            print(f"读取排期缓存失败: {e}")
+            return False
+        return True
+
+    def _schedule_months(self, students: List[Student]) -> Tuple[int, List[int]]:
+        """计算排期月数和每个学生的轮转月数"""
+        max_months = self._base_rotation_months + 4  # 设置最大月数
+        max_months_int = int(max_months)
+        if max_months_int < max_months:
+            max_months_int += 1  # 向上取整，确保覆盖所有月份
+        # 自选专业较多的学生可能超出默认月数
+        student_months = [self._get_rotation_months_int(s) for s in students]
+        return max([max_months_int] + student_months), student_months
+
+    def check_capacity(self, start_date: datetime, grade: str) -> List[Bottleneck]:
+        """排期前检查科室人数限制能否满足
+
+        按培养方案相同的学生分组，比较各专业所需的人月数与排期期间的人数上限（减去其他年级的固定人数），
+        以及各科室每月最少人数需要的人月数与学生最多能提供的人月数，不需要生成排期。
+        没有设置人数限制时直接返回空列表。
+
+        Returns:
+            List[Bottleneck] - 人数上限不足或最少人数无法满足的专业及其科室，为空表示没有发现问题
+        """
+        students = self.student_manager.get_students_by_grade(grade)
+        departments = self.department_manager.get_departments()
+        if not students or not any(dept.has_capacity_limits() for dept in departments):
+            return []
+        self._prepare_requirements()
+        months, _ = self._schedule_months(students)
+        calendar = MonthCalendar(start_date, months)
+        limits = capacity_limits(departments, calendar, months)
+        # 培养方案相同的学生共用同一个需求模板
+        templates = {}
+        for student in students:
+            template = self._get_requirement_template(student)
+            templates.setdefault(id(template), [template, 0])[1] += 1
+        background = None
+        if self.background_stores:
+            background = aligned_occupancy(self.background_stores, calendar, months,
+                                           [dept.name for dept in departments])
+        templates = [tuple(entry) for entry in templates.values()]
+        bottlenecks = []
+        if (limits.maximum < UNLIMITED).any():
+            bottlenecks += find_bottlenecks(departments, templates, limits, months, LATER_ROTATION_MONTHS, background)
+        if limits.minimum.any():
+            bottlenecks += find_unmet_minimums(departments, templates, limits, months, LATER_ROTATION_MONTHS,
+                                               background)
+        return bottlenecks
+
+    def _refresh_capacity(self):
+        """按当前科室设置和排期日历更新人数限制矩阵"""
+        self.capacity = capacity_limits(self.department_manager.get_departments(), self.calendar, self.store.months)
+
+    def _generate_restarts(self, start_date: datetime, grade: str, restarts: int,
+                           seed: Optional[int], workers: Optional[int], balance_siblings: bool = True):
+        """多次随机重启排期，保留均衡评分最好的结果"""
+        base_seed = 0 if seed is None else seed
+        seeds = [base_seed + i for i in range(restarts)]
+        results = []
+        self._report_progress("随机重启", 0, restarts)
+        if workers == 1:
+            for restart_seed in seeds:
+                results.append(_run_restart(self.student_manager, self.department_manager, start_date, grade,
+                                            restart_seed, balance_siblings, self.background_stores))
+                self._report_progress("随机重启", len(results), restarts)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(_run_restart, self.student_manager, self.department_manager,
+                                           start_date, grade, restart_seed, balance_siblings,
+                                           self.background_stores)
+                           for restart_seed in seeds]
+                try:
+                    for future in as_completed(futures):
+                        results.append(future.result())
+                        self._report_progress("随机重启", len(results), restarts)
+                except ScheduleCancelled:
+                    # 取消尚未开始的重启，正在运行的重启结束后丢弃
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
+        
+        # 评分相同时取种子较小的结果，保证结果可复现
+        best = min(results, key=lambda result: (result["score"], result["seed"]))
+        self._restore_result_state(best)
+
+    def optimize_schedule(self, time_budget: float, max_iterations: Optional[int] = None,
+                          seed: Optional[int] = None, rows: Optional[List[int]] = None,
+                          first_month: int = 0, allow_sideways: bool = True) -> int:
+        """对当前排期进行局部搜索优化，调整学生的轮转顺序使各科室人数更均衡
+
+        Args:
+            rows: 允许调整的学生行号，默认所有学生
+            first_month: 只调整从该月开始的排期
+            allow_sideways: 是否接受目标函数不变的交换，为False时尽量少改动已有排期
+
+        Returns:
+            int - 目标函数（各科室半月人数平方和）的减少量
+        """
+        if self.store is None:
+            return 0
+        if max_iterations and time_budget <= 0:
+            # 只指定尝试次数时不限制时间
+            time_budget = float("inf")
+        optimizer = self._create_optimizer(seed, first_month)
+        
+        start = time.perf_counter()
+        def should_stop() -> bool:
+            if self.progress_callback is not None and time_budget != float("inf"):
+                elapsed = min(time.perf_counter() - start, time_budget)
+                self.progress_callback("优化排期", int(elapsed * 1000), int(time_budget * 1000))
+            return self.should_cancel is not None and self.should_cancel()
+        
+        improvement = optimizer.optimize(time_budget, max_iterations, rows, allow_sideways, should_stop)
+        # 轮转顺序变化后重新统计月度人数
+        self._refresh_department_counts()
+        self._report_progress("优化排期", 1, 1)
+        return improvement
+
+    def _create_optimizer(self, seed: Optional[int] = None, first_month: int = 0) -> LocalSearchOptimizer:
+        """按当前科室配置、人数限制和其他年级的固定人数创建局部搜索优化器"""
+        departments = self.department_manager.get_departments()
+        specialty_codes = {}
+        department_specialties = [specialty_codes.setdefault(dept.specialty, len(specialty_codes)) for dept in departments]
+        background = self._background_counts(self.store.months, half_slots=True) if self.background_stores else None
+        self._refresh_capacity()
+        room = surplus = None
+        if self.capacity is not None:
+            room = self.capacity.maximum - self.department_counts
+            surplus = self.department_counts - self.capacity.minimum
+        return LocalSearchOptimizer(self.store, department_specialties, self.department_later,
+                                    LATER_ROTATION_MONTHS, seed, first_month, background, room,
+                                    self.store.start_months(), surplus)
+
+    def separate_consecutive_rotations(self, rows: Optional[List[int]] = None, first_month: int = 0) -> int:
+        """交换或移动轮转段，消除贪心排期中同一专业前后相连的轮转
+
+        Args:
+            rows: 需要检查的学生行号，默认所有学生
+            first_month: 只调整从该月开始的排期
+        Returns:
+            int - 消除的相连处数
+        """
+        if self.store is None:
+            return 0
+        fixed = self._create_optimizer(first_month=first_month).separate_specialties(rows)
+        if fixed:
+            self._refresh_department_counts()
+        return fixed
+
+    def set_background(self, stores: Sequence[ScheduleStore]):
+        """设置其他年级已确定的排期作为固定人数
+
+        排期、同专业科室分配和局部搜索均衡的是本年级与这些排期相加后的科室月度人数，
+        各年级按实际月份对齐，开始日期可以不同。已有排期时立即更新月度人数。
+        """
+        self.background_stores = list(stores)
+        if self.store is not None:
+            self._refresh_department_counts()
+
+    def _background_counts(self, months: int, half_slots: bool = False) -> np.ndarray:
+        """其他年级在本排期日历上的 月份（或半月时段） × 科室 固定人数"""
+        return aligned_occupancy(self.background_stores, self.calendar, months, self.department_names, half_slots)
+
+    def _refresh_department_counts(self):
+        """由排期矩阵和其他年级的固定人数重新统计月度人数"""
+        self.department_counts = self.store.occupancy()
+        if self.background_stores:
+            self.department_counts += self._background_counts(self.store.months).astype(np.int32)
+
+    def _report_progress(self, stage: str, done: int, total: int):
+        """报告排期进度，需要取消时抛出ScheduleCancelled"""
+        if self.should_cancel is not None and self.should_cancel():
+            raise ScheduleCancelled()
+        if self.progress_callback is not None:
+            self.progress_callback(stage, done, total)
+
+    def assign_sibling_departments(self, max_rounds: int = SIBLING_ASSIGN_ROUNDS,
+                                   structure_rounds: int = SIBLING_STRUCTURE_ROUNDS) -> int:
+        """按各科室月度人数，为所有学生整体重新选择轮转结构相同的同专业科室
+
+        贪心排期时同专业科室只按总人数选择，这里根据学生实际的轮转时段整体分配，
+        避免某个科室在部分月份人数过多。轮转结构相同的科室整体分配；轮转结构不同的科室之间
+        只在新科室的轮转段能放进学生原有时段（缩短空出的半月用未完成的半月轮转补上）时逐个调整。
+
+        Args:
+            max_rounds: 轮转结构相同的科室整体分配的最多轮数
+            structure_rounds: 轮转结构不同的科室逐个学生调整的最多轮数，0表示不调整
+        Returns:
+            int - 科室有变化的学生数
+        """
+        if self.store is None:
+            return 0
+        # 同专业、是否后期轮转相同的科室为一组，组内再按轮转结构分组
+        groups = {}
+        lengths = {}
+        specialty_codes = {}
+        specialties = []  # 每个科室编号对应的专业编号
+        for code, name in enumerate(self.department_names):
+            dept = self.department_manager.get_department(name)
+            specialties.append(specialty_codes.setdefault(dept.specialty if dept is not None else name,
+                                                          len(specialty_codes)))
+            if dept is None:
+                continue
+            groups.setdefault((dept.specialty, bool(dept.is_later_rotation)), []).append(code)
+            lengths[code] = [round(2 * months) for months in dept.months_per_rotation]
+        # 有人数限制的科室不参与整体重新分配，保持贪心排期时按人数限制的选择
+        self._refresh_capacity()
+        limited = np.zeros(len(self.department_names), dtype=bool)
+        if self.capacity is not None:
+            limited = (self.capacity.maximum < UNLIMITED).any(axis=0) | (self.capacity.minimum > 0).any(axis=0)
+        groups = [[code for code in codes if not limited[code]] for codes in groups.values()]
+        same_structure = {}
+        for codes in groups:
+            for code in codes:
+                same_structure.setdefault((tuple(codes), tuple(lengths[code])), []).append(code)
+        background = self._background_counts(self.store.months, half_slots=True) if self.background_stores else None
+        assigner = SiblingAssigner(self.store, list(same_structure.values()), background)
+        moves = assigner.assign(max_rounds)
+        
+        # 未完成的半月轮转可补上轮转结构调整后空出的半月
+        fillers = {}
+        for name, rotations in self.unfinished_rotations.items():
+            for dept_name, months in rotations:
+                code = self.department_index.get(dept_name)
+                if months == 0.5 and code is not None and not self.department_later[code] and not limited[code]:
+                    fillers.setdefault(self.store.student_index[name], []).append(code)
+        later_start_slots = 2 * (self.store.start_months() + LATER_ROTATION_MONTHS)
+        structure_moves, fills = assigner.assign_structures(groups, lengths, specialties, self.department_later,
+                                                            later_start_slots, fillers, structure_rounds)
+        # 同一学生两个阶段的调整合并为从原科室到最终科室
+        merged = {}
+        for row, old, new in moves + structure_moves:
+            key = (row, specialties[old])
+            merged[key] = (row, merged[key][1] if key in merged else old, new)
+        moves = [move for move in merged.values() if move[1] != move[2]]
+        
+        # 补上的半月轮转不再是未完成的轮转
+        for row, code in fills:
+            name, dept_name = self.store.student_names[row], self.department_names[code]
+            unfinished = self.unfinished_rotations[name]
+            unfinished.remove((dept_name, 0.5))
+            if not unfinished:
+                del self.unfinished_rotations[name]
+            self.department_total_counts[dept_name] = self.department_total_counts.get(dept_name, 0) + 1
+        
+        # 更新科室总人数和未完成轮转的科室名
+        for row, old, new in moves:
+            old_name, new_name = self.department_names[old], self.department_names[new]
+            codes, flags = self.store.codes[row], self.store.flags[row]
+            mask = codes == new
+            continued = np.concatenate(([False], mask[:-1] & (flags[1:] == flags[:-1])))
+            rotations = int(np.count_nonzero(mask & ~continued))
+            unfinished = self.unfinished_rotations.get(self.store.student_names[row])
+            if unfinished:
+                rotations += sum(1 for name, _ in unfinished if name == old_name)
+                self.unfinished_rotations[self.store.student_names[row]] = [
+                    (new_name if name == old_name else name, months) for name, months in unfinished]
+            self.department_total_counts[old_name] = self.department_total_counts.get(old_name, 0) - rotations
+            self.department_total_counts[new_name] = self.department_total_counts.get(new_name, 0) + rotations
+        if moves or fills:
+            self._refresh_department_counts()
+        return len({row for row, _, _ in moves})
+
+    def _generate_single(self, start_date: datetime, grade: str, seed: Optional[int] = None,
+                         balance_siblings: bool = False):
+        """执行一次排期，seed不为None时随机打乱学生顺序并随机处理平局"""
+        students = self.student_manager.get_students_by_grade(grade)
         departments = self.department_manager.get_departments()
         
+        self.store = None
+        self.department_total_counts = {}
+        self.unfinished_rotations = {}
         if not students or not departments:
-            return {}
+            return
         
-        # 获取所有专业
-        all_specialties = set(dept.specialty for dept in departments)
-        # print(f"需要安排的专业: {len(all_specialties)}个 - {', '.join(all_specialties)}")
+        # 收集所有需要排期的科室信息
+        self._prepare_requirements()
         
         # 初始化一个全局的月度科室人数矩阵
-        max_months = self._calculate_base_rotation_months() + 4  # 设置最大月数
-        max_months_int = int(max_months)
-        if max_months_int < max_months:
-            max_months_int += 1  # 向上取整，确保覆盖所有月份
-        month_keys = []
-        for i in range(max_months_int):
-            current_date = start_date + relativedelta(months=i)
-            month_keys.append(current_date.strftime("%Y-%m"))
+        max_months_int, student_months = self._schedule_months(students)
+        # 所有学生都在轮转的月数，用于评价人数均衡
+        self.active_months = min(student_months)
+        # 预先计算月份序号与月份键，排期过程中只使用整数月份序号
+        self.calendar = MonthCalendar(start_date, max_months_int)
         
-        # 初始化全局月度科室人数矩阵 {月份: {科室: 人数}}
-        global_dept_counts = {}
-        for month_key in month_keys:
-            global_dept_counts[month_key] = {dept.name: 0 for dept in departments}
+        # 初始化全局月度科室人数矩阵 (月份 × 科室)
+        self._initialize_department_counts(departments, max_months_int)
         
-        # 初始化科室月度人数统计
-        self._initialize_department_counts(departments, start_date, max_months_int)
+        # 初始化排期矩阵，每个学生一行
+        self.store = ScheduleStore([s.name for s in students], self.department_names, self.calendar)
+        self._refresh_capacity()
         
-        # 收集所有需要排期的科室信息
-        required_rotations = self._build_required_rotations()
+        # 随机重启时打乱学生排期顺序，排期矩阵中仍按名单顺序保存
+        order = list(range(len(students)))
+        self._rng = None
+        if seed is not None:
+            random.Random(seed).shuffle(order)
+            self._rng = np.random.default_rng(seed)
         
         # 为每个学生生成轮转安排
-        for student in students:
-            # 根据学生类型获取需要的总轮转月数
-            total_months = self._calculate_total_rotation_months(student)
-            # print(f"学生 {student.name} 需要轮转 {total_months} 个月")
-            
-            # 创建学生的排期字典
-            self.schedule[student.name] = {}
-            
+        for done, row in enumerate(order):
+            self._report_progress("生成排期", done, len(order))
+            student = students[row]
             # 获取该学生需要的轮转科室列表
-            student_rotations = self._get_student_required_rotations(student, required_rotations)
-            
-            # 确保total_months是整数，用于切片
-            total_months_int = int(total_months)
-            if total_months_int < total_months:
-                total_months_int += 1  # 向上取整，确保覆盖所有月份
+            student_rotations = self._get_student_required_rotations(student)
             
             # 为学生分配轮转科室（按月份顺序）
-            self._assign_rotations_by_month(student, student_rotations, start_date, month_keys[:total_months_int], global_dept_counts, len(students))
-            
-            
+            self._assign_rotations_by_month(row, student_rotations, student_months[row], len(students))
+        
+        self._report_progress("生成排期", len(order), len(order))
+        self.separate_consecutive_rotations()
+        if balance_siblings:
+            self.assign_sibling_departments()
+
+    def copy(self, student_manager: Optional[StudentManager] = None,
+             department_manager: Optional[DepartmentManager] = None) -> 'RotationScheduler':
+        """复制调度器，副本的排期矩阵、人数统计等都是独立的，修改副本不影响本调度器
+
+        Args:
+            student_manager: 副本使用的学生管理器，默认与本调度器共用
+            department_manager: 副本使用的科室管理器，默认与本调度器共用
+        """
+        # 管理器、结果缓存和回调不复制
+        memo = {id(self.student_manager): student_manager or self.student_manager,
+                id(self.department_manager): department_manager or self.department_manager,
+                id(self.result_cache): self.result_cache,
+                id(self.progress_callback): self.progress_callback,
+                id(self.should_cancel): self.should_cancel}
+        return copy.deepcopy(self, memo)
+
+    def diff_students(self) -> Tuple[List[Student], List[str], List[Student]]:
+        """对比生成排期时与当前的学生名单
+
+        Returns:
+            (新增的学生, 删除的学生名, 信息有变化的学生)
+        """
+        current = {s.name: s for s in self.student_manager.get_students_by_grade(self.grade)}
+        added = [s for name, s in current.items() if name not in self.student_snapshot]
+        removed = [name for name in self.student_snapshot if name not in current]
+        changed = [s for name, s in current.items()
+                   if name in self.student_snapshot and s.to_dict() != self.student_snapshot[name]]
+        return added, removed, changed
+
+    def repair_schedule(self, added: List[Student] = (), removed: List[str] = (), changed: List[Student] = (),
+                        frozen_before: Optional[datetime] = None, optimize_seconds: float = 0.5,
+                        neighborhood: int = 10, seed: Optional[int] = None) -> Dict[str, Dict[str, str]]:
+        """在已有排期上局部调整，只重新安排新增、删除或信息变化的学生
+
+        frozen_before所在月份之前的排期保持不变；信息变化的学生从该月起按新信息重新安排剩余轮转，
+        新增学生从该月开始轮转。之后对受影响的学生和随机选取的少量其他学生做局部搜索，均衡科室人数。
+
+        Args:
+            added: 新增的学生
+            removed: 删除的学生名
+            changed: 信息有变化的学生
+            frozen_before: 冻结日期，该日期所在月份之前的排期不变，默认不冻结
+            optimize_seconds: 局部搜索的时间预算（秒）
+            neighborhood: 参与局部搜索的其他学生人数
+            seed: 随机种子
+        """
+        if self.store is None:
+            raise ValueError("没有可调整的排期，请先生成排期")
+        
+        self._prepare_requirements()
+        frozen_month = 0
+        if frozen_before is not None:
+            frozen_month = min(max(self.calendar.offset(frozen_before), 0), self.store.months)
+        frozen_slot = 2 * frozen_month
+        
+        # 删除学生
+        if removed:
+            self.store.remove_students(list(removed))
+            for name in removed:
+                self.unfinished_rotations.pop(name, None)
+                self.student_snapshot.pop(name, None)
+        
+        # 信息变化的学生清除冻结月份之后的安排，不在排期中的按新增处理
+        added = list(added)
+        changed_rows = []
+        for student in changed:
+            row = self.store.student_index.get(student.name)
+            if row is None:
+                added.append(student)
+                continue
+            self.store.clear(row, frozen_slot)
+            changed_rows.append((row, student))
+        
+        # 新增学生从冻结月份开始轮转，排期不够长时延长
+        added_rows = list(zip(self.store.add_students([s.name for s in added]), added))
+        self.store.extend_months(max([self.store.months] +
+                                     [frozen_month + self._get_rotation_months_int(s) for s in added]))
+        self.calendar = self.store.calendar
+        self._refresh_department_counts()
+        self._refresh_capacity()
+        
+        students_count = len(self.store.student_names)
+        for row, student in changed_rows:
+            rotations = self._get_remaining_rotations(row, student, frozen_slot)
+            self._assign_rotations_by_month(row, rotations, self._get_rotation_months_int(student), students_count,
+                                            first_month=frozen_month,
+                                            last_specialty=self._get_specialty_before(row, frozen_slot))
+        for row, student in added_rows:
+            rotations = self._get_student_required_rotations(student)
+            self._assign_rotations_by_month(row, rotations, self._get_rotation_months_int(student), students_count,
+                                            start_month=frozen_month)
+        
+        # 对受影响的学生及少量其他学生做局部搜索
+        affected = [row for row, _ in changed_rows + added_rows]
+        self.separate_consecutive_rotations(affected, frozen_month)
+        if affected and optimize_seconds > 0:
+            affected_set = set(affected)
+            others = [row for row in range(students_count) if row not in affected_set]
+            neighbours = random.Random(seed).sample(others, min(neighborhood, len(others)))
+            self.optimize_schedule(optimize_seconds, seed=seed, rows=affected + neighbours,
+                                   first_month=frozen_month, allow_sideways=False)
+        self._refresh_department_counts()
+        
+        for student in list(changed) + added:
+            self.student_snapshot[student.name] = student.to_dict()
         return self.schedule
 
-    def _initialize_department_counts(self, departments: List[Department], start_date: datetime, months: int):
-        """初始化科室月度人数统计"""
-        self.department_counts = {}
+    def _get_remaining_rotations(self, row: int, student: Student, frozen_slot: int) -> List[Dict]:
+        """根据冻结部分已完成的轮转，计算学生还需要的轮转，同专业优先选择已轮转过的科室"""
+        # 将冻结部分按连续相同科室和标识切分为轮转段 [(科室编号, 特殊标识, 月数)]
+        done_blocks = []
+        codes = self.store.codes[row, :frozen_slot].tolist()
+        flags = self.store.flags[row, :frozen_slot].tolist()
+        for code, flag in zip(codes, flags):
+            if code == EMPTY:
+                continue
+            if done_blocks and done_blocks[-1][:2] == (code, flag):
+                done_blocks[-1][2] += 0.5
+            else:
+                done_blocks.append([code, flag, 0.5])
+        # 同专业优先选择已轮转过的科室
+        preferred = {}
+        for code, _, _ in done_blocks:
+            name = self.department_names[code]
+            preferred.setdefault(self._department_specialties.get(name), name)
         
-        # 为每个科室创建月度计数器
-        for dept in departments:
-            self.department_counts[dept.name] = {}
-            for i in range(months):
-                current_date = start_date + relativedelta(months=i)
-                date_key = current_date.strftime("%Y-%m")
-                self.department_counts[dept.name][date_key] = 0
+        rotations = [rotation.copy() for rotation in
+                     self._get_student_required_rotations(student, preferred)]
+        keys = [(self.department_index[r["科室名"]], SUFFIX_FLAGS.get(r.get("特殊标识"), 0)) for r in rotations]
+        for rotation in rotations:
+            rotation["剩余月数"] = rotation["月数"]
+        # 每个已完成的轮转段优先抵扣月数相同的轮转，否则按顺序抵扣
+        for code, flag, months in done_blocks:
+            matches = [r for r, key in zip(rotations, keys) if key == (code, flag) and r["剩余月数"] > 0]
+            exact = [r for r in matches if r["剩余月数"] == months]
+            for rotation in exact[:1] or matches:
+                done = min(months, rotation["剩余月数"])
+                rotation["剩余月数"] -= done
+                months -= done
+                if months <= 0:
+                    break
+        return [r for r in rotations if r["剩余月数"] > 0]
+
+    def _get_specialty_before(self, row: int, slot: int) -> Optional[str]:
+        """获取学生在某个时段之前轮转的专业"""
+        if slot <= 0:
+            return None
+        code = self.store.codes[row, slot - 1]
+        if code == EMPTY:
+            return None
+        return self._department_specialties.get(self.department_names[code])
+
+    def department_spread(self) -> np.ndarray:
+        """计算每个科室在所有学生都轮转的月份中，月度人数最大值与最小值之差
+
+        后期轮转科室只统计一年后的月份。
+        """
+        if self.department_counts is None:
+            return np.zeros(0, dtype=np.int32)
+        first_month = np.where(self.department_later, LATER_ROTATION_MONTHS, 0)
+        return month_spread(self.department_counts[:self.active_months], first_month)
+
+    def balance_score(self) -> float:
+        """排期均衡评分，越小越好：各科室月度人数差之和 + 未完成轮转的惩罚"""
+        unfinished = sum(len(rotations) for rotations in self.unfinished_rotations.values())
+        return float(self.department_spread().sum()) + UNFINISHED_ROTATION_PENALTY * unfinished
+
+    def validate(self, grade: Optional[str] = None) -> Optional[ValidationReport]:
+        """按科室配置和学生信息检查指定年级（默认为排期年级）的排期，没有排期时返回None
+
+        人数均衡和人数限制的检查包括其他年级的固定人数。
+        """
+        if self.store is None:
+            return None
+        students = self.student_manager.get_students_by_grade(self.grade if grade is None else grade)
+        background = self._background_counts(self.store.months) if self.background_stores else None
+        self._refresh_capacity()
+        return validate_schedule(self.store, self.department_manager.get_departments(), students,
+                                 LATER_ROTATION_MONTHS, MAX_MONTHLY_SPREAD, background, self.capacity)
+
+    def _get_result_state(self) -> Dict[str, Any]:
+        """导出排期结果，用于在进程间传递"""
+        return {
+            "store": self.store,
+            "department_counts": self.department_counts,
+            "department_total_counts": self.department_total_counts,
+            "unfinished_rotations": self.unfinished_rotations,
+            "active_months": self.active_months,
+        }
+
+    def _restore_result_state(self, state: Dict[str, Any]):
+        """载入其他调度器生成的排期结果"""
+        self.store = state["store"]
+        self.calendar = self.store.calendar if self.store is not None else None
+        self.department_counts = state["department_counts"]
+        self.department_total_counts = state["department_total_counts"]
+        self.unfinished_rotations = state["unfinished_rotations"]
+        self.active_months = state["active_months"]
+        departments = self.department_manager.get_departments()
+        self.department_names = [dept.name for dept in departments]
+        self.department_index = {name: i for i, name in enumerate(self.department_names)}
+        self.department_later = np.array([bool(dept.is_later_rotation) for dept in departments], dtype=bool)
+
+    def save_to_database(self, database: Database):
+        """将当前排期保存到数据库，之后可直接载入，不必重新排期"""
+        if self.store is None:
+            return
+        database.save_schedule(self.grade, self._saved_state(), self.store.to_bytes())
+
+    def _saved_state(self) -> Dict[str, Any]:
+        """排期矩阵以外需要保存的排期信息，可JSON编码"""
+        return {
+            "grade": self.grade,
+            "start_date": self.calendar.start_date.isoformat(),
+            "months": self.store.months,
+            "student_names": self.store.student_names,
+            "department_names": self.store.department_names,
+            "departments": [dept.to_dict() for dept in self.department_manager.get_departments()],
+            "student_snapshot": self.student_snapshot,
+            "department_total_counts": self.department_total_counts,
+            "unfinished_rotations": self.unfinished_rotations,
+            "active_months": self.active_months,
+        }
+
+    def load_from_database(self, database: Database, grade: str) -> bool:
+        """载入数据库中保存的年级排期
+
+        Returns:
+            bool - 是否载入成功，没有保存的排期或科室配置已变化时返回False
+        """
+        saved = database.load_schedule(grade)
+        if saved is None:
+            return False
+        state, data = saved
+        # 排期矩阵中的科室编号对应保存时的科室列表，科室配置变化后需要重新排期；
+        # 保存时的科室信息经Department还原后比较，之后版本新增的字段取默认值
+        saved_departments = [Department.from_dict(data).to_dict() for data in state["departments"]]
+        if saved_departments != [dept.to_dict() for dept in self.department_manager.get_departments()]:
+            return False
+        self._restore_saved_state(state, data, grade)
+        return True
+
+    def _restore_saved_state(self, state: Dict[str, Any], data: bytes, grade: Optional[str] = None):
+        """由_saved_state的结果和压缩的排期矩阵还原排期"""
+        calendar = MonthCalendar(datetime.fromisoformat(state["start_date"]), state["months"])
+        store = ScheduleStore.from_bytes(state["student_names"], state["department_names"], calendar, data)
+        self._restore_result_state({
+            "store": store,
+            "department_counts": store.occupancy(),
+            "department_total_counts": state["department_total_counts"],
+            "unfinished_rotations": {name: [tuple(rotation) for rotation in rotations]
+                                     for name, rotations in state["unfinished_rotations"].items()},
+            "active_months": state["active_months"],
+        })
+        if self.background_stores:
+            self._refresh_department_counts()
+        self.grade = grade if grade is not None else state["grade"]
+        self.student_snapshot = state["student_snapshot"]
+
+    def _get_rotation_months_int(self, student: Student) -> int:
+        """根据学生类型获取需要的总轮转月数，向上取整"""
+        total_months = self._calculate_total_rotation_months(student)
+        total_months_int = int(total_months)
+        if total_months_int < total_months:
+            total_months_int += 1  # 向上取整，确保覆盖所有月份
+        return total_months_int
+
+    def _initialize_department_counts(self, departments: List[Department], months: int):
+        """初始化科室月度人数矩阵，以及科室名称与矩阵列下标的映射"""
+        self.department_names = [dept.name for dept in departments]
+        self.department_index = {name: i for i, name in enumerate(self.department_names)}
+        self.department_later = np.array([bool(dept.is_later_rotation) for dept in departments], dtype=bool)
+        # 行为月份序号，列为科室下标，包括其他年级的固定人数
+        self.department_counts = np.zeros((months, len(self.department_names)), dtype=np.int32)
+        if self.background_stores:
+            self.department_counts += self._background_counts(months).astype(np.int32)
     
     def _build_required_rotations(self) -> List[Dict]:
         """遍历科室，构建基础轮转科室列表"""
@@ -138,64 +877,87 @@ class RotationScheduler:
                     base_rotations.append(rotation_info)
         return base_rotations
     
-    def _get_student_required_rotations(self, student: Student, base_rotations: List[Dict]) -> List[Dict]:
-        """获取该学生需要的轮转科室列表"""
-        # 深拷贝基础轮转列表
-        student_rotations = []
-        for rotation in base_rotations:
-            student_rotations.append(rotation.copy())
-            
-        # 添加学生自己专业的额外轮转月数
-        specialty_departments = self.department_manager.get_departments_by_specialty(student.specialty)
+    def _prepare_requirements(self):
+        """排期前预先计算基础轮转列表、基础月数和各专业的科室
+
+        科室数据版本未变化时沿用已有缓存，包括轮转需求模板。
+        """
+        version = self.department_manager.version
+        if self._requirements_version == version:
+            return
+        departments = self.department_manager.get_departments()
+        self._base_rotations = self._build_required_rotations()
+        self._base_rotation_months = self._calculate_base_rotation_months()
+        self._specialty_departments = {specialty: list(depts) for specialty, depts
+                                       in self.department_manager.get_specialty_index().items()}
+        self._department_specialties = {dept.name: dept.specialty for dept in departments}
+        self._requirement_templates = {}
+        self._requirements_version = version
+
+    def _get_requirement_template(self, student: Student) -> List[Dict]:
+        """获取学生培养方案对应的轮转需求模板
+
+        模板包含基础轮转、本专业门诊轮转和自选专业轮转，同一专业的所有科室都在其中，
+        按 (专业, 培训类型, 自选专业) 缓存，培养方案相同的学生共用同一模板。
+        模板中的轮转信息由多个学生共用，不能修改。
+        """
+        self_selected = ()
+        if student.training_type == "社会培训" and student.self_selected_specialties:
+            self_selected = tuple(student.self_selected_specialties)
+        key = (student.specialty, student.training_type, self_selected)
+        template = self._requirement_templates.get(key)
+        if template is not None:
+            return template
+        
+        template = list(self._base_rotations)
         # 所有学生，添加常规的额外2个月本专业轮转
-        for specialty_department in specialty_departments:
-            rotation_info = {
+        for specialty_department in self._specialty_departments.get(student.specialty, []):
+            template.append({
                 "科室名": specialty_department.name,
                 "科室专业": specialty_department.specialty,
                 "月数": 2.0,
                 "第几次轮转": 1,
                 "后期轮转": True,
                 "特殊标识": "(门诊)"
-            }
-            student_rotations.append(rotation_info)
-            
+            })
         # 社会培训学生，添加自选专业额外轮转月数
-        if student.training_type == "社会培训" and student.self_selected_specialties:
-            for specialty in student.self_selected_specialties:
-                # 获取该专业的科室
-                self_selected_depts = self.department_manager.get_departments_by_specialty(specialty)
-                for self_selected_dept in self_selected_depts:
-                    rotation_info = {
-                        "科室名": self_selected_dept.name,
-                        "科室专业": self_selected_dept.specialty,
-                        "月数": 1.0,
-                        "第几次轮转": 1,
-                        "后期轮转": False
-                    }
-                    student_rotations.append(rotation_info)
+        for specialty in self_selected:
+            for self_selected_dept in self._specialty_departments.get(specialty, []):
+                template.append({
+                    "科室名": self_selected_dept.name,
+                    "科室专业": self_selected_dept.specialty,
+                    "月数": 1.0,
+                    "第几次轮转": 1,
+                    "后期轮转": False
+                })
+        self._requirement_templates[key] = template
+        return template
+    
+    def _get_student_required_rotations(self, student: Student,
+                                        preferred_departments: Optional[Dict[str, str]] = None) -> List[Dict]:
+        """获取该学生需要的轮转科室列表：为每个专业选择一个科室，从需求模板中保留该科室的轮转
+
+        返回的轮转信息与需求模板共用，不能修改。
+
+        Args:
+            preferred_departments: 指定部分专业选择的科室 {专业: 科室名}，其余专业选择人数最少的科室
+        """
+        self._prepare_requirements()
+        template = self._get_requirement_template(student)
         
-        # 对每个专业选择科室时要特殊处理一些情况
+        # 按科室顺序为每个专业选择人数最少的科室
         selected_specialties = {} # 记录每个专业已经选择的科室
-        departments = self.department_manager.get_departments()
-        # 遍历科室，选择每个专业人数最少的科室
-        for dept in departments:
-            specialty = dept.specialty
-            # 如果该专业还未选择科室
-            if specialty not in selected_specialties:
-                # 获取该专业人数最少的科室
-                least_assigned_dept = self._get_least_assigned_department(specialty)
-                if least_assigned_dept:
-                    selected_specialties[specialty] = least_assigned_dept
-
+        for specialty in self._specialty_departments:
+            if preferred_departments and specialty in preferred_departments:
+                selected_specialties[specialty] = preferred_departments[specialty]
+            else:
+                selected_specialties[specialty] = self._get_least_assigned_department(specialty)
         
-        filtered_rotations = []
         # 筛选并保留需要的轮转科室
-        for rotation in student_rotations:
+        filtered_rotations = [rotation for rotation in template
+                              if rotation["科室名"] == selected_specialties[rotation["科室专业"]]]
+        for rotation in filtered_rotations:
             dept_name = rotation["科室名"]
-            dept_specialty = rotation["科室专业"]
-            if(dept_name != selected_specialties[dept_specialty]):
-                continue
-            filtered_rotations.append(rotation)
             self.department_total_counts[dept_name] = self.department_total_counts.get(dept_name, 0) + 1
         return filtered_rotations
     
@@ -208,7 +970,7 @@ class RotationScheduler:
             str - 总人数最少的科室名称
         """
         # 获取该专业的所有科室
-        specialty_depts = self.department_manager.get_departments_by_specialty(specialty)
+        specialty_depts = self._specialty_departments.get(specialty)
         
         if not specialty_depts:
             return None
@@ -217,6 +979,7 @@ class RotationScheduler:
         min_count = float('inf')
         selected_dept = None
         
+        tied_depts = []
         for dept in specialty_depts:
             # 获取该科室的总安排人数
             total_count = self.department_total_counts.get(dept.name, 0)
@@ -225,224 +988,324 @@ class RotationScheduler:
             if total_count < min_count:
                 min_count = total_count
                 selected_dept = dept.name
+                tied_depts = [dept.name]
+            elif total_count == min_count:
+                tied_depts.append(dept.name)
+        
+        # 随机重启时，人数相同的科室随机选择
+        if self._rng is not None and len(tied_depts) > 1:
+            selected_dept = tied_depts[self._rng.integers(len(tied_depts))]
                 
         return selected_dept
 
-    def _assign_rotations_by_month(self, student: Student, rotations: List[Dict], 
-                              start_date: datetime, month_keys: List[str], global_dept_counts: Dict, students_count: int):
-        """按月份顺序为学生分配轮转科室，每月优先安排当月比较理想人数(心内科理想人数 = (月数 × 学生总数) ÷ 总轮转月数)最少的科室"""
-        # 深拷贝轮转列表，以免修改原始数据
-        remaining_rotations = rotations.copy()
-        # 给每个轮转科室添加剩余月数
-        for rotation in remaining_rotations:
-            rotation["剩余月数"] = rotation["月数"]
+    def _assign_rotations_by_month(self, row: int, rotations: List[Dict], 
+                              total_months: int, students_count: int, start_month: int = 0,
+                              first_month: Optional[int] = None, last_specialty: Optional[str] = None):
+        """按月份顺序为学生分配轮转科室，每月优先安排当月比较理想人数(心内科理想人数 = (月数 × 学生总数) ÷ 总轮转月数)最少的科室
+
+        Args:
+            start_month: 学生开始轮转的月份序号
+            first_month: 从该月开始安排（调整已有排期时使用），默认为start_month
+            last_specialty: first_month前一个月轮转的专业
+        """
+        self.unfinished_rotations.pop(self.store.student_names[row], None)
+        if not rotations:
+            return
+        
+        # 将轮转列表转换为数组，每月对所有候选轮转统一打分
+        dept_idx = np.array([self.department_index[r["科室名"]] for r in rotations], dtype=np.intp)
+        months = np.array([r["月数"] for r in rotations], dtype=float)
+        remaining = np.array([r.get("剩余月数", r["月数"]) for r in rotations], dtype=float)  # 剩余月数
+        later = np.array([bool(r["后期轮转"]) for r in rotations])
+        flags = [SUFFIX_FLAGS.get(r.get("特殊标识"), 0) for r in rotations]
+        specialty_codes = {}
+        spec_idx = np.array([specialty_codes.setdefault(r["科室专业"], len(specialty_codes)) for r in rotations], dtype=np.intp)
+        active = remaining > 0  # 尚未完成的轮转
         
-        # 记录近期轮转的专业，防止同一专业连续轮转超过3个月
-        recent_specialties = []
+        # 计算理想人数，月数不超过1个月的科室权重更高
+        month_count = np.where(later, total_months - LATER_ROTATION_MONTHS, total_months)
+        ideal_count = months * students_count / np.maximum(month_count, 1)
+        ideal_weight = np.where(months <= 1, 0.8, 0.5) * ideal_count
+        # 月数不是整数的轮转，可与其他半月轮转拼成一个月
+        fractional = months != np.floor(months)
+        
+        # 记录上个月轮转的专业，防止同一专业连续轮转
+        last_specialty = specialty_codes.get(last_specialty, -1)
+        if first_month is None:
+            first_month = start_month
             
         # 按月份顺序安排
-        for i in range(len(month_keys)):
-            month_key = month_keys[i]
-            # 计算当月各科室人数，用于选择人数最少的科室
-            dept_counts = global_dept_counts[month_key]
+        for i in range(first_month, start_month + total_months):
+            if not active.any():
+                continue
+            candidates = np.flatnonzero(active)
             
-            # 从剩余轮转中选择当月人数最少的科室
-            best_rotation = remaining_rotations[0] if remaining_rotations else None
-            min_count = float('inf')
-            for rotation in remaining_rotations:
-                dept_name = rotation["科室名"]
-
-                # 如果月数和剩余月数不相等，则优先安排
-                if rotation["月数"] != rotation["剩余月数"]:
-                    best_rotation = rotation
-                    break
-
-                # 如果第2次轮转，则搜索轮转中的第1次轮转科室
-                if rotation["第几次轮转"] == 2:
-                    for rotation1 in remaining_rotations:
-                        if rotation1["第几次轮转"] == 1 and rotation1["科室专业"] == rotation["科室专业"]:
-                            continue
-
-                # 近期轮转中有多于等于月数的该专业，则不安排
-                specialty_count = recent_specialties.count(rotation["科室专业"])
-                if specialty_count >= 1:
-                    continue
-
-
-                is_later_rotation = rotation["后期轮转"]
+            # 如果月数和剩余月数不相等（轮转进行到一半），则优先安排
+            # 开始时已检查整个轮转期间的人数上限，继续安排不再检查
+            started = candidates[months[candidates] != remaining[candidates]]
+            if started.size:
+                best = started[0]
+            else:
+                # 近期轮转过的专业不安排
+                eligible = active & (spec_idx != last_specialty)
                 # 如果是后期轮转，检查当前月份是否在一年后
-                if is_later_rotation:
-                    current_month = datetime.strptime(month_key, "%Y-%m")
-                    start_month = start_date
-                    months_diff = (current_month.year - start_month.year) * 12 + (current_month.month - start_month.month)
-                    if months_diff < 12:
-                        continue
+                if i < start_month + LATER_ROTATION_MONTHS:
+                    eligible &= ~later
+                # 有人数上限时，只安排剩余各月都未达到上限的轮转
+                if self.capacity is not None:
+                    room = np.zeros(len(rotations), dtype=bool)
+                    room[candidates] = self._capacity_room(i, dept_idx[candidates], remaining[candidates])
+                    eligible &= room
                 
-                # 计算理想人数
-                month_count = len(month_keys) if not is_later_rotation else len(month_keys) - 12
-                ideal_count = (rotation["月数"] * students_count) / month_count
-                if rotation["月数"] <= 1:
-                    dept_count = dept_counts.get(dept_name, 0) - ideal_count*0.8
+                if eligible.any():
+                    # 当月人数减去理想人数，选择最小的科室
+                    scores = self.department_counts[i, dept_idx] - ideal_weight
+                    if self.capacity is not None:
+                        # 未达到最少人数的科室优先安排
+                        understaffed = self.department_counts[i, dept_idx] < self.capacity.minimum[i, dept_idx]
+                        scores = scores - UNDERSTAFFED_PRIORITY * understaffed
+                    scores = np.where(eligible, scores, np.inf)
+                    best = int(np.argmin(scores))
+                    # 随机重启时，评分相同的轮转随机选择
+                    if self._rng is not None:
+                        tied = np.flatnonzero(scores == scores[best])
+                        if tied.size > 1:
+                            best = int(tied[self._rng.integers(tied.size)])
+                elif self.capacity is None:
+                    # 没有满足条件的轮转时，按原顺序安排第一个
+                    best = candidates[0]
                 else:
-                    dept_count = dept_counts.get(dept_name, 0) - ideal_count*0.5
-                # 如果人数更少，更新最佳科室
-                if dept_count < min_count:
-                    min_count = dept_count
-                    best_rotation = rotation
+                    # 放宽专业和后期轮转的条件，仍不能超过人数上限，所有轮转都已满时该月空出
+                    fitting = candidates[room[candidates]]
+                    if not fitting.size:
+                        continue
+                    best = fitting[0]
             
-            if not best_rotation:
-                continue
-            # 获取科室名和月数
-            dept_name = best_rotation["科室名"]
-            months = best_rotation.get("月数", 1.0)
-            specialty = best_rotation["科室专业"]
-           
+            # 获取科室编号和专业
+            dept = dept_idx[best]
+            last_specialty = spec_idx[best]
             
-            # 更新近期轮转专业记录
-            recent_specialties.append(specialty)
-            if len(recent_specialties) > 1:  # 保持所有科室最大月数+1个月的记录
-                recent_specialties.pop(0)
-                
-            # 安排当月轮转
-            self.schedule[student.name][month_key] = dept_name
-            # 如果科室有特殊标识,添加到排期中
-            if "特殊标识" in best_rotation:
-                self.schedule[student.name][month_key] = f"{dept_name}{best_rotation['特殊标识']}"
-
-            
-            # 如果是0.5个月轮转，寻找月数不是整数的科室
-            if best_rotation["剩余月数"] == 0.5:
-                for rotation in remaining_rotations:
-                    if rotation["科室名"] == dept_name:
-                        continue
-                    if rotation["月数"] != int(rotation["月数"]):
-                        self.schedule[student.name][month_key] = f"{dept_name}/{rotation['科室名']}"
-                        global_dept_counts[month_key][dept_name] += 1
-                        global_dept_counts[month_key][rotation["科室名"]] += 1
-                        best_rotation["剩余月数"] -= 0.5
-                        rotation["剩余月数"] -= 0.5
-                        if rotation["剩余月数"] <= 0:
-                            remaining_rotations.remove(rotation)
-                        break
+            # 如果是0.5个月轮转，寻找月数不是整数的科室，拼成一个月
+            if remaining[best] == 0.5:
+                self.store.assign_half(row, i, 0, dept, flags[best])
+                self.department_counts[i, dept] += 1
+                remaining[best] -= 0.5
+                partners = np.flatnonzero(active & fractional & (dept_idx != dept))
+                if self.capacity is not None and partners.size:
+                    partners = partners[self._capacity_room(i, dept_idx[partners], remaining[partners])]
+                if partners.size:
+                    partner = partners[0]
+                    self.store.assign_half(row, i, 1, dept_idx[partner], flags[partner])
+                    self.department_counts[i, dept_idx[partner]] += 1
+                    remaining[partner] -= 0.5
+                    if remaining[partner] <= 0:
+                        active[partner] = False
             else:
-                # 更新全局计数
-                global_dept_counts[month_key][dept_name] += 1
-                best_rotation["剩余月数"] -= 1
+                # 安排当月轮转，更新全局计数
+                self.store.assign_month(row, i, dept, flags[best])
+                self.department_counts[i, dept] += 1
+                remaining[best] -= 1
             
             # 如果该轮转已完成，从列表中移除
-            if best_rotation["剩余月数"] <= 0:
-                remaining_rotations.remove(best_rotation)
-                
-        # # 检查是否所有轮转都已安排
-        # if remaining_rotations:
-        #     print(f"警告: 学生 {student.name} 还有 {len(remaining_rotations)} 个科室未安排完成")
-        #     for rotation in remaining_rotations:
-        #         print(f"  - {rotation['科室名']}: 剩余 {rotation.get('剩余月数', rotation.get('月数', 0))} 个月")
+            if remaining[best] <= 0:
+                active[best] = False
+        
+        # 记录未安排完成的轮转
+        if active.any():
+            self.unfinished_rotations[self.store.student_names[row]] = [
+                (rotations[i]["科室名"], float(remaining[i])) for i in np.flatnonzero(active)]
 
+    def _capacity_room(self, month: int, depts: np.ndarray, remaining: np.ndarray) -> np.ndarray:
+        """检查各轮转从month起的剩余月份中，科室人数是否都未达到上限
+
+        Args:
+            depts: 各轮转的科室编号
+            remaining: 各轮转的剩余月数，半月也占用该月
+        Returns:
+            np.ndarray - 每个轮转是否可以安排
+        """
+        lengths = np.ceil(remaining).astype(np.intp)
+        window = slice(month, month + int(lengths.max(initial=0)))
+        full = self.department_counts[window][:, depts] >= self.capacity.maximum[window][:, depts]
+        within = np.arange(full.shape[0])[:, None] < lengths[None, :]
+        return ~(full & within).any(axis=0)
     
-    def export_to_excel(self, file_path: str, grade: str):
-        """将排期导出到Excel"""
-        # 筛选指定年级的学生
-        students = [s for s in self.student_manager.get_students() if s.grade == grade]
-        
-        if not students or not self.schedule:
-            return False
-            
-        # 找到所有日期
-        all_dates = set()
-        for student_name, dates in self.schedule.items():
-            all_dates.update(dates.keys())
+    def _get_scheduled_students(self, grade: str) -> Tuple[List[Student], List[int]]:
+        """获取指定年级已排期的学生，以及他们在排期矩阵中的行号"""
+        if self.store is None:
+            return [], []
+        students = [s for s in self.student_manager.get_students_by_grade(grade)
+                    if s.name in self.store.student_index]
+        rows = [self.store.student_index[s.name] for s in students]
+        return students, rows
+
+    def _build_schedule_frame(self, grade: str) -> "pd.DataFrame":
+        """从排期矩阵构建 学生 × 月份 的排期表，pandas只在此处用到，按需导入"""
+        import pandas as pd
+        students, rows = self._get_scheduled_students(grade)
+        if not students:
+            return pd.DataFrame()
         
-        # 排序日期
-        sorted_dates = sorted(all_dates)
+        # 只保留有轮转安排的月份
+        months = self.store.used_months(rows)
+        if not months.size:
+            return pd.DataFrame()
+        labels = self.store.labels(rows)[:, months]
         
-        # 创建DataFrame
         data = {
-            "姓名": [],
-            "科室": [],
-            "年级": [],
-            "职位": []
+            "姓名": [s.name for s in students],
+            "科室": [s.specialty for s in students],
+            "年级": [s.grade for s in students],
+            "职位": [s.position for s in students]
         }
-        
-        # 添加日期列
-        for date in sorted_dates:
-            data[date] = []
-            
-        # 填充数据
-        for student in students:
-            if student.name not in self.schedule:
-                continue
-                
-            data["姓名"].append(student.name)
-            data["科室"].append(student.specialty)
-            data["年级"].append(student.grade)
-            data["职位"].append(student.position)
-            
-            for date in sorted_dates:
-                if date in self.schedule[student.name]:
-                    data[date].append(self.schedule[student.name][date])
-                else:
-                    data[date].append("")
-        
-        # 创建DataFrame并导出
-        df = pd.DataFrame(data)
-        df.to_excel(file_path, index=False)
+        for col, month in enumerate(months):
+            data[self.calendar.key(month)] = labels[:, col]
+        return pd.DataFrame(data)
+    
+    def export_to_excel(self, file_path: str, grade: str, rosters: bool = True):
+        """将排期导出到Excel
+
+        直接由排期矩阵逐行写入只写模式的工作簿，按专业填充颜色，不构建DataFrame。
+        rosters为True时再由同一个倒排索引写出科室人数表和每个科室的月度名单。
+        """
+        students, months, labels, specialties, specialty_names = self.get_schedule_grid(grade)
+        if not students:
+            return False
+        workbook = new_workbook()
+        append_schedule_sheet(workbook, "轮转排期", SCHEDULE_INFO_HEADERS,
+                              [[s.name, s.specialty, s.grade, s.position] for s in students],
+                              months, labels, specialties, specialty_names)
+        if rosters:
+            index = self.get_schedule_index(grade)
+            month_offsets = np.flatnonzero(index.counts.any(axis=0)).tolist()
+            append_department_sheets(workbook, index, month_offsets, months, {"轮转排期"})
+        workbook.save(file_path)
         return True
+
+    def _cache_key(self, grade: str) -> Tuple:
+        """按年级缓存的结果对应的键，排期矩阵可能被整体替换，同时比较矩阵对象和版本号"""
+        return grade, self.store, self.store.version if self.store is not None else None
+
+    @staticmethod
+    def _cache_matches(cached_key: Tuple, key: Tuple) -> bool:
+        return cached_key[0] == key[0] and cached_key[1] is key[1] and cached_key[2] == key[2]
+
+    def _store_specialties(self) -> List[str]:
+        """排期矩阵中每个科室编号对应的专业，已删除的科室以科室名作为专业"""
+        specialties = []
+        for name in self.store.department_names:
+            dept = self.department_manager.get_department(name)
+            specialties.append(dept.specialty if dept is not None else name)
+        return specialties
+
+    def get_schedule_index(self, grade: Optional[str] = None) -> Optional[ScheduleIndex]:
+        """获取指定年级（默认为排期年级）的排期查询索引，没有排期时返回None
+
+        索引只在排期变化后重建，界面和导出共用同一个索引。
+        """
+        if self.store is None:
+            return None
+        key = self._cache_key(self.grade if grade is None else grade)
+        if self._index_cache is not None and self._cache_matches(self._index_cache[0], key):
+            return self._index_cache[1]
+        _, rows = self._get_scheduled_students(key[0])
+        index = ScheduleIndex(self.store, rows, self._store_specialties())
+        self._index_cache = (key, index)
+        return index
+
+    def find_students_in_department(self, department: str, month: Union[int, str, date],
+                                    grade: Optional[str] = None) -> List[Placement]:
+        """查询某科室某月轮转的学生，department不带特殊标识时包括门诊等轮转，month可为月份键或日期"""
+        index = self.get_schedule_index(grade)
+        return index.find_by_department(department, month) if index is not None else []
+
+    def find_students_in_specialty(self, specialty: str, month: Union[int, str, date],
+                                   grade: Optional[str] = None) -> List[Placement]:
+        """查询某专业所有科室某月轮转的学生"""
+        index = self.get_schedule_index(grade)
+        return index.find_by_specialty(specialty, month) if index is not None else []
+
+    def find_student_departments(self, student: str, when: Union[int, str, date],
+                                 grade: Optional[str] = None) -> List[Placement]:
+        """查询学生在某日（只返回该日所在半月）或某月轮转的科室"""
+        index = self.get_schedule_index(grade)
+        return index.find_by_student(student, when) if index is not None else []
     
-    def get_schedule_for_display(self, grade: str) -> pd.DataFrame:
+    def get_schedule_for_display(self, grade: str) -> "pd.DataFrame":
         """获取用于显示的排期数据"""
-        # 筛选指定年级的学生
-        students = [s for s in self.student_manager.get_students() if s.grade == grade]
-        
-        if not students or not self.schedule:
-            return pd.DataFrame()
-            
-        # 找到所有日期
-        all_dates = set()
-        for student_name, dates in self.schedule.items():
-            if student_name in [s.name for s in students]:
-                all_dates.update(dates.keys())
-        
-        # 排序日期
-        sorted_dates = sorted(all_dates)
+        return self._build_schedule_frame(grade)
+
+    def get_schedule_grid(self, grade: str) -> Tuple[List[Student], List[str], np.ndarray, np.ndarray, List[str]]:
+        """获取排期表格显示所需的数据，直接由排期矩阵生成，不构建DataFrame
+
+        Returns:
+            (学生列表, 月份列表, 学生 × 月份 的科室名称矩阵,
+             学生 × 月份 的专业编号矩阵（未安排为-1，"A/B"半月轮转取A的专业）, 专业名称列表)
+        """
+        students, rows = self._get_scheduled_students(grade)
+        months = self.store.used_months(rows) if students else np.zeros(0, dtype=np.intp)
+        if not months.size:
+            return [], [], np.zeros((0, 0), dtype=object), np.zeros((0, 0), dtype=np.int16), []
+        labels = self.store.labels(rows)[:, months]
         
-        if not sorted_dates:
-            return pd.DataFrame()
-            
-        # 创建DataFrame的数据
-        data = {
-            "姓名": [],
-            "科室": [],
-            "年级": [],
-            "职位": []
-        }
+        # 科室编号 -> 专业编号，最后一项对应未安排（编号-1）
+        specialty_codes = {}
+        code_specialties = [specialty_codes.setdefault(specialty, len(specialty_codes))
+                            for specialty in self._store_specialties()]
+        specialty_names = list(specialty_codes)
+        table = np.array(code_specialties + [-1], dtype=np.int16)
+        codes = self.store.codes[np.asarray(rows, dtype=np.intp)]
+        first, second = codes[:, 0::2][:, months], codes[:, 1::2][:, months]
+        specialties = table[np.where(first >= 0, first, second)]
+        return students, [self.calendar.key(month) for month in months], labels, specialties, specialty_names
+
+    def get_occupancy_statistics(self, grade: str) -> OccupancyStatistics:
+        """统计指定年级每个科室每个月的人数，门诊等带特殊标识的轮转单独统计
+
+        只保留有人轮转的科室（按名称排序）和月份。排期未变化时返回缓存的结果。
+        """
+        key = self._cache_key(grade)
+        if self._statistics_cache is not None and self._cache_matches(self._statistics_cache[0], key):
+            return self._statistics_cache[1]
         
-        # 添加日期列，并为每个日期创建空列表
-        for date in sorted_dates:
-            display_date = datetime.strptime(date, "%Y-%m").strftime("%Y-%m")
-            data[display_date] = []
-            
-        # 填充数据
-        for student in students:
-            if student.name not in self.schedule:
-                continue
-                
-            data["姓名"].append(student.name)
-            data["科室"].append(student.specialty)
-            data["年级"].append(student.grade)
-            data["职位"].append(student.position)
+        students, rows = self._get_scheduled_students(grade)
+        if not students:
+            statistics = OccupancyStatistics([], [], np.zeros((0, 0), dtype=np.int32), np.zeros(0, dtype=np.int32))
+        else:
+            counts = self.store.occupancy(rows, split_flags=True)
+            names = self.store.occupancy_names(split_flags=True)
+            # 门诊等带特殊标识的轮转按后期轮转统计人数差
+            width = len(self.store.department_names)
+            units = np.arange(counts.shape[1])
+            later = self.department_later[units % width] | (units >= width)
+            spread = month_spread(counts[:self.active_months], np.where(later, LATER_ROTATION_MONTHS, 0))
             
-            for date in sorted_dates:
-                display_date = datetime.strptime(date, "%Y-%m").strftime("%Y-%m")
-                if date in self.schedule[student.name]:
-                    data[display_date].append(self.schedule[student.name][date])
-                else:
-                    data[display_date].append("")
-        
-        # 检查所有列的长度是否一致
-        length_check = len(data["姓名"])
-        for key, value in data.items():
-            if len(value) != length_check:
-                data[key] = value + [""] * (length_check - len(value))
-        
-        return pd.DataFrame(data) 
\ No newline at end of file
+            months = self.store.used_months(rows)
+            units = np.array(sorted(np.flatnonzero(counts.any(axis=0)), key=lambda unit: names[unit]), dtype=np.intp)
+            statistics = OccupancyStatistics([names[unit] for unit in units],
+                                             [self.calendar.key(month) for month in months],
+                                             counts[np.ix_(months, units)].T, spread[units])
+        self._statistics_cache = (key, statistics)
+        return statistics
+
+    def get_department_month_counts(self, grade: str) -> Tuple[List[str], List[str], np.ndarray]:
+        """统计指定年级每个科室每个月的人数，门诊等带特殊标识的轮转单独统计
+
+        Returns:
+            (科室名称列表, 月份列表, 科室 × 月份 的人数矩阵)
+        """
+        statistics = self.get_occupancy_statistics(grade)
+        return statistics.names, statistics.months, statistics.counts
+
+
+def _run_restart(student_manager: StudentManager, department_manager: DepartmentManager,
+                 start_date: datetime, grade: str, seed: int, balance_siblings: bool = True,
+                 background_stores: Sequence[ScheduleStore] = ()) -> Dict[str, Any]:
+    """执行一次随机重启排期（可在子进程中运行），返回排期结果及均衡评分"""
+    scheduler = RotationScheduler(student_manager, department_manager)
+    scheduler.background_stores = list(background_stores)
+    scheduler._generate_single(start_date, grade, seed, balance_siblings)
+    result = scheduler._get_result_state()
+    result["seed"] = seed
+    result["score"] = scheduler.balance_score()
+    return result
@@ -0,0 +1,183 @@
+import numpy as np
+from datetime import date
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from models.schedule_store import ScheduleStore
+
+# 学生在某月轮转的时段
+WHOLE_MONTH = 0
+FIRST_HALF = 1
+SECOND_HALF = 2
+HALF_SUFFIXES = {WHOLE_MONTH: "", FIRST_HALF: "(上半月)", SECOND_HALF: "(下半月)"}
+# 每月1日至该日为上半月，之后为下半月
+FIRST_HALF_LAST_DAY = 15
+
+
+class Placement(NamedTuple):
+    """一条查询到的轮转安排"""
+    student: str  # 学生姓名
+    department: str  # 轮转单位名称，带特殊标识，如"心内一科(门诊)"
+    month: int  # 月份序号
+    half: int  # 轮转时段 WHOLE_MONTH/FIRST_HALF/SECOND_HALF
+
+
+def _segments(keys: np.ndarray, size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """按整数键分段：返回 (稳定排序后的下标, 每个键的起始位置（长度size + 1）)"""
+    order = np.argsort(keys, kind="stable")
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(keys, minlength=size))))
+    return order, offsets
+
+
+class ScheduleIndex:
+    """排期查询索引
+
+    由排期矩阵一次构建：每个学生每月的上下半月时段展开为 (单位, 月份, 学生) 记录，
+    排序后按 (单位, 月份) 和 (专业, 月份) 分段保存，查询某科室或某专业某月的学生只需取一段数组；
+    同时保存每个学生各半月时段所在的单位，按学生和日期查询直接取矩阵元素。
+    门诊等带特殊标识的轮转作为单独的单位，编号与ScheduleStore.occupancy(split_flags=True)的列一致。
+    索引构建后不随排期矩阵变化，version记录构建时的排期版本，由调用方判断是否需要重建。
+    """
+    def __init__(self, store: ScheduleStore, rows: Optional[Sequence[int]] = None,
+                 specialties: Optional[Sequence[str]] = None):
+        """
+        Args:
+            store: 排期矩阵
+            rows: 参与索引的学生行号，默认所有学生
+            specialties: 每个科室编号对应的专业，默认以科室名作为专业
+        """
+        rows = np.arange(len(store.student_names)) if rows is None else np.asarray(rows, dtype=np.intp)
+        self.version = store.version  # 构建索引时的排期版本
+        self.calendar = store.calendar
+        self.months = store.months
+        self._names = list(store.student_names)
+        self.unit_names = store.occupancy_names(split_flags=True)
+        self.unit_index = {name: unit for unit, name in enumerate(self.unit_names)}
+
+        # 科室名（不带特殊标识）-> 该科室的所有单位
+        width = len(store.department_names)
+        self.department_units: Dict[str, List[int]] = {}
+        for unit in range(len(self.unit_names)):
+            self.department_units.setdefault(store.department_names[unit % width], []).append(unit)
+        # 专业 -> 编号，以及每个单位所属的专业编号
+        specialties = list(store.department_names) if specialties is None else list(specialties)
+        self.specialty_index: Dict[str, int] = {}
+        for specialty in specialties:
+            self.specialty_index.setdefault(specialty, len(self.specialty_index))
+        unit_specialties = np.array([self.specialty_index[specialties[unit % width]]
+                                     for unit in range(len(self.unit_names))], dtype=np.int64)
+
+        codes = store.codes[rows].astype(np.int64)
+        units = np.where(codes >= 0, codes + width * store.flags[rows], -1)
+        # 学生姓名 -> 在self._slot_units中的行，用于按学生和日期查询
+        self._slot_units = units.astype(np.int32)
+        self._student_positions = {self._names[row]: position
+                                   for position, row in enumerate(rows.tolist())}
+
+        first, second = units[:, 0::2], units[:, 1::2]
+        positions, months = np.indices(first.shape)
+        # 上下半月相同时记为整月，否则分别记为上半月和下半月
+        whole = first == second
+        first_mask = first >= 0
+        second_mask = (second >= 0) & ~whole
+        entry_units = np.concatenate([first[first_mask], second[second_mask]])
+        entry_months = np.concatenate([months[first_mask], months[second_mask]])
+        entry_rows = rows[np.concatenate([positions[first_mask], positions[second_mask]])]
+        entry_halves = np.concatenate([np.where(whole[first_mask], WHOLE_MONTH, FIRST_HALF),
+                                       np.full(np.count_nonzero(second_mask), SECOND_HALF)])
+
+        # 按 (单位, 月份, 学生行号) 排序，同一单元格中的学生按名单顺序
+        order = np.lexsort((entry_rows, entry_months, entry_units))
+        entry_units, entry_months = entry_units[order], entry_months[order]
+        entry_rows, entry_halves = entry_rows[order], entry_halves[order].astype(np.uint8)
+        keys = entry_units * self.months + entry_months
+        self.counts = np.bincount(keys, minlength=len(self.unit_names) * self.months).reshape(
+            len(self.unit_names), self.months).astype(np.int32)  # 单位 × 月份 的人数
+        self._offsets = np.concatenate(([0], np.cumsum(self.counts.ravel())))
+        self._rows = entry_rows
+        self._halves = entry_halves
+        self._units = entry_units.astype(np.int32)
+
+        # 专业索引：在 (单位, 月份) 顺序上按 (专业, 月份) 稳定分段，同一专业内按单位顺序排列
+        specialty_keys = unit_specialties[entry_units] * self.months + entry_months
+        self._specialty_order, self._specialty_offsets = _segments(
+            specialty_keys, len(self.specialty_index) * self.months)
+
+    def month_offset(self, month: Union[int, str, date]) -> int:
+        """月份序号、"YYYY-MM"键或日期转换为月份序号"""
+        return month if isinstance(month, (int, np.integer)) else self.calendar.offset(month)
+
+    def students(self, unit: int, month: int) -> Tuple[np.ndarray, np.ndarray]:
+        """获取某单位某月轮转的学生
+
+        Returns:
+            (学生在排期矩阵中的行号, 轮转时段 WHOLE_MONTH/FIRST_HALF/SECOND_HALF)
+        """
+        key = unit * self.months + month
+        start, end = self._offsets[key], self._offsets[key + 1]
+        return self._rows[start:end], self._halves[start:end]
+
+    def student_names(self, unit: int, month: int, mark_halves: bool = True) -> List[str]:
+        """获取某单位某月轮转的学生姓名，半月轮转的姓名后标注上半月或下半月"""
+        rows, halves = self.students(unit, month)
+        names = self._names
+        if not mark_halves:
+            return [names[row] for row in rows.tolist()]
+        return [names[row] + HALF_SUFFIXES[half] for row, half in zip(rows.tolist(), halves.tolist())]
+
+    def used_units(self) -> List[int]:
+        """有学生轮转的单位，按名称排序"""
+        return sorted(np.flatnonzero(self.counts.any(axis=1)).tolist(), key=lambda unit: self.unit_names[unit])
+
+    def _placements(self, entries: np.ndarray, month: int) -> List[Placement]:
+        names, unit_names = self._names, self.unit_names
+        return [Placement(names[row], unit_names[unit], month, half) for row, unit, half in
+                zip(self._rows[entries].tolist(), self._units[entries].tolist(), self._halves[entries].tolist())]
+
+    def find_by_department(self, department: str, month: Union[int, str, date]) -> List[Placement]:
+        """查询某科室某月轮转的学生
+
+        department为不带特殊标识的科室名时包括该科室的所有轮转（如门诊），
+        带特殊标识时只查询该单位。科室不存在或月份超出排期范围时返回空列表。
+        """
+        month = self.month_offset(month)
+        if not 0 <= month < self.months:
+            return []
+        units = self.department_units.get(department)
+        if units is None:
+            units = [self.unit_index[department]] if department in self.unit_index else []
+        placements = []
+        for unit in units:
+            key = unit * self.months + month
+            placements.extend(self._placements(np.arange(self._offsets[key], self._offsets[key + 1]), month))
+        return placements
+
+    def find_by_specialty(self, specialty: str, month: Union[int, str, date]) -> List[Placement]:
+        """查询某专业所有科室某月轮转的学生，按科室顺序排列"""
+        month = self.month_offset(month)
+        code = self.specialty_index.get(specialty)
+        if code is None or not 0 <= month < self.months:
+            return []
+        key = code * self.months + month
+        entries = self._specialty_order[self._specialty_offsets[key]:self._specialty_offsets[key + 1]]
+        return self._placements(entries, month)
+
+    def find_by_student(self, student: str, when: Union[int, str, date]) -> List[Placement]:
+        """查询学生在某月或某日轮转的科室
+
+        when为日期时只返回该日所在半月的科室，为月份序号或"YYYY-MM"键时返回整月的安排，
+        上下半月在不同科室时返回两条记录。学生不在索引中或没有安排时返回空列表。
+        """
+        position = self._student_positions.get(student)
+        month = self.month_offset(when)
+        if position is None or not 0 <= month < self.months:
+            return []
+        first, second = self._slot_units[position, 2 * month:2 * month + 2].tolist()
+        if isinstance(when, date):
+            unit, half = (first, FIRST_HALF) if when.day <= FIRST_HALF_LAST_DAY else (second, SECOND_HALF)
+            if unit < 0:
+                return []
+            return [Placement(student, self.unit_names[unit], month, WHOLE_MONTH if first == second else half)]
+        if first == second:
+            return [] if first < 0 else [Placement(student, self.unit_names[first], month, WHOLE_MONTH)]
+        return [Placement(student, self.unit_names[unit], month, half)
+                for unit, half in ((first, FIRST_HALF), (second, SECOND_HALF)) if unit >= 0]
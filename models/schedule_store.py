@@ -0,0 +1,229 @@
+import zlib
+import numpy as np
+from typing import Dict, List, Optional, Sequence
+
+from utils.month_calendar import MonthCalendar
+
+# 未安排科室的时段
+EMPTY = -1
+
+# 特殊标识位，与轮转信息中的"特殊标识"对应
+FLAG_OUTPATIENT = 1
+FLAG_SUFFIXES = {FLAG_OUTPATIENT: "(门诊)"}
+SUFFIX_FLAGS = {suffix: flag for flag, suffix in FLAG_SUFFIXES.items()}
+
+
+class ScheduleStore:
+    """排期结果存储
+
+    以 学生 × 半月时段 的int16矩阵保存科室编号，每个月对应前后两个半月时段，
+    整月轮转的两个时段编号相同，"A/B"形式的半月轮转两个时段分别为A和B。
+    门诊等特殊标识保存在同形状的标识矩阵中。
+    {学生名: {月份: 科室名}} 形式的排期字典只在需要时由矩阵生成并缓存。
+    """
+    def __init__(self, student_names: Sequence[str], department_names: Sequence[str], calendar: MonthCalendar):
+        self.student_names = list(student_names)
+        self.student_index = {name: i for i, name in enumerate(self.student_names)}
+        self.department_names = list(department_names)
+        self.calendar = calendar
+        shape = (len(self.student_names), 2 * len(calendar))
+        self.codes = np.full(shape, EMPTY, dtype=np.int16)  # 科室编号
+        self.flags = np.zeros(shape, dtype=np.uint8)  # 特殊标识
+        self.version = 0  # 每次修改后递增，用于判断缓存是否过期
+        self._cache_version = -1
+        self._labels = None
+        self._dict = None
+
+    @property
+    def months(self) -> int:
+        """排期总月数"""
+        return len(self.calendar)
+
+    def assign_month(self, row: int, month: int, dept: int, flag: int = 0):
+        """安排整月轮转"""
+        self.codes[row, 2 * month:2 * month + 2] = dept
+        self.flags[row, 2 * month:2 * month + 2] = flag
+        self.version += 1
+
+    def assign_half(self, row: int, month: int, half: int, dept: int, flag: int = 0):
+        """安排半月轮转，half为0表示上半月，1表示下半月"""
+        self.codes[row, 2 * month + half] = dept
+        self.flags[row, 2 * month + half] = flag
+        self.version += 1
+
+    def swap_blocks(self, row: int, first: int, second: int, length: int):
+        """交换同一学生两个等长时段区间的安排，first/second为半月时段下标"""
+        a = slice(first, first + length)
+        b = slice(second, second + length)
+        self.codes[row, a], self.codes[row, b] = self.codes[row, b].copy(), self.codes[row, a].copy()
+        self.flags[row, a], self.flags[row, b] = self.flags[row, b].copy(), self.flags[row, a].copy()
+        self.version += 1
+
+    def relabel(self, row: int, slots: Sequence[int], dept: int):
+        """将学生若干半月时段的科室改为dept，特殊标识不变"""
+        self.codes[row, np.asarray(slots, dtype=np.intp)] = dept
+        self.version += 1
+
+    def set_row(self, row: int, codes: np.ndarray, flags: np.ndarray):
+        """替换学生所有半月时段的科室和特殊标识"""
+        self.codes[row] = codes
+        self.flags[row] = flags
+        self.version += 1
+
+    def clear(self, row: int, first_slot: int = 0):
+        """清除学生从first_slot开始的所有安排"""
+        self.codes[row, first_slot:] = EMPTY
+        self.flags[row, first_slot:] = 0
+        self.version += 1
+
+    def add_students(self, names: Sequence[str]) -> List[int]:
+        """在末尾添加学生行，返回新行号"""
+        first_row = len(self.student_names)
+        self.student_names.extend(names)
+        self.student_index = {name: i for i, name in enumerate(self.student_names)}
+        extra = (len(names), self.codes.shape[1])
+        self.codes = np.vstack([self.codes, np.full(extra, EMPTY, dtype=np.int16)])
+        self.flags = np.vstack([self.flags, np.zeros(extra, dtype=np.uint8)])
+        self.version += 1
+        return list(range(first_row, len(self.student_names)))
+
+    def remove_students(self, names: Sequence[str]):
+        """删除学生行，其余学生的行号按原顺序重新编号"""
+        removed = set(names)
+        keep = [row for row, name in enumerate(self.student_names) if name not in removed]
+        self.student_names = [self.student_names[row] for row in keep]
+        self.student_index = {name: i for i, name in enumerate(self.student_names)}
+        self.codes = self.codes[keep]
+        self.flags = self.flags[keep]
+        self.version += 1
+
+    def extend_months(self, months: int):
+        """将排期延长到months个月"""
+        if months <= self.months:
+            return
+        extra = (self.codes.shape[0], 2 * (months - self.months))
+        self.calendar = MonthCalendar(self.calendar.start_date, months)
+        self.codes = np.hstack([self.codes, np.full(extra, EMPTY, dtype=np.int16)])
+        self.flags = np.hstack([self.flags, np.zeros(extra, dtype=np.uint8)])
+        self.version += 1
+
+    def _compose_label(self, first: int, second: int, first_flag: int, second_flag: int) -> str:
+        """根据两个半月时段的科室编号生成显示名称"""
+        if first == second and first_flag == second_flag:
+            if first == EMPTY:
+                return ""
+            return self.department_names[first] + FLAG_SUFFIXES.get(first_flag, "")
+        parts = []
+        for dept, flag in ((first, first_flag), (second, second_flag)):
+            if dept != EMPTY:
+                parts.append(self.department_names[dept] + FLAG_SUFFIXES.get(flag, ""))
+        return "/".join(parts)
+
+    def labels(self, rows: Optional[Sequence[int]] = None) -> np.ndarray:
+        """获取 学生 × 月份 的科室名称矩阵，未安排的月份为空字符串"""
+        if self._cache_version != self.version:
+            self._refresh_cache()
+        if self._labels is None:
+            first = self.codes[:, 0::2].astype(np.int64) + 1
+            second = self.codes[:, 1::2].astype(np.int64) + 1
+            width = len(self.department_names) + 1
+            # 将两个时段的科室编号和标识合成为一个整数，只对出现过的组合生成名称
+            combined = ((first * width + second) * 256 + self.flags[:, 0::2]) * 256 + self.flags[:, 1::2]
+            unique, inverse = np.unique(combined, return_inverse=True)
+            table = np.empty(len(unique), dtype=object)
+            for i, value in enumerate(unique.tolist()):
+                value, second_flag = divmod(value, 256)
+                value, first_flag = divmod(value, 256)
+                first_code, second_code = divmod(value, width)
+                table[i] = self._compose_label(first_code - 1, second_code - 1, first_flag, second_flag)
+            self._labels = table[inverse.reshape(-1)].reshape(combined.shape)
+        if rows is None:
+            return self._labels
+        return self._labels[np.asarray(rows, dtype=np.intp)]
+
+    def to_dict(self) -> Dict[str, Dict[str, str]]:
+        """生成 {学生名: {月份: 科室名}} 形式的排期字典"""
+        if self._cache_version != self.version:
+            self._refresh_cache()
+        if self._dict is None:
+            labels = self.labels()
+            keys = self.calendar.keys
+            schedule = {}
+            for row, name in enumerate(self.student_names):
+                schedule[name] = {keys[m]: labels[row, m] for m in np.flatnonzero(labels[row] != "")}
+            self._dict = schedule
+        return self._dict
+
+    def used_months(self, rows: Optional[Sequence[int]] = None) -> np.ndarray:
+        """获取有学生安排轮转的月份序号"""
+        codes = self.codes if rows is None else self.codes[np.asarray(rows, dtype=np.intp)]
+        return np.flatnonzero((codes >= 0).reshape(len(codes), -1, 2).any(axis=(0, 2)))
+
+    def start_months(self, rows: Optional[Sequence[int]] = None) -> np.ndarray:
+        """获取每个学生开始轮转的月份序号，即第一个有安排的月份，没有安排的学生为0"""
+        codes = self.codes if rows is None else self.codes[np.asarray(rows, dtype=np.intp)]
+        assigned = codes >= 0
+        return np.where(assigned.any(axis=1), assigned.argmax(axis=1) // 2, 0)
+
+    def occupancy(self, rows: Optional[Sequence[int]] = None, split_flags: bool = False) -> np.ndarray:
+        """统计 月份 × 科室 的人数矩阵
+
+        半月轮转的两个科室各计1人。split_flags为True时，带特殊标识的轮转单独统计，
+        列下标为 科室编号 + 标识 × 科室数，对应名称见occupancy_names。
+        """
+        codes = self.codes if rows is None else self.codes[np.asarray(rows, dtype=np.intp)]
+        width = len(self.department_names)
+        units = codes.astype(np.int64)
+        if split_flags:
+            flags = self.flags if rows is None else self.flags[np.asarray(rows, dtype=np.intp)]
+            units = np.where(units >= 0, units + width * flags, EMPTY)
+            width *= int(self.flags.max(initial=0)) + 1
+        first, second = units[:, 0::2], units[:, 1::2]
+        months = np.broadcast_to(np.arange(self.months), first.shape)
+        counts = np.zeros((self.months, width), dtype=np.int32)
+        mask = first >= 0
+        np.add.at(counts, (months[mask], first[mask]), 1)
+        mask = (second >= 0) & (second != first)
+        np.add.at(counts, (months[mask], second[mask]), 1)
+        return counts
+
+    def slot_occupancy(self) -> np.ndarray:
+        """统计 半月时段 × 科室 的人数矩阵"""
+        load = np.zeros((self.codes.shape[1], len(self.department_names)), dtype=np.int64)
+        slots = np.broadcast_to(np.arange(self.codes.shape[1]), self.codes.shape)
+        mask = self.codes >= 0
+        np.add.at(load, (slots[mask], self.codes[mask].astype(np.intp)), 1)
+        return load
+
+    def occupancy_names(self, split_flags: bool = False) -> List[str]:
+        """获取occupancy结果各列对应的科室名称"""
+        if not split_flags:
+            return list(self.department_names)
+        names = []
+        for flag in range(int(self.flags.max(initial=0)) + 1):
+            suffix = FLAG_SUFFIXES.get(flag, "")
+            names.extend(name + suffix for name in self.department_names)
+        return names
+
+    def to_bytes(self) -> bytes:
+        """将科室编号和标识矩阵压缩为字节串，与学生名、科室名和日历一起可还原排期"""
+        return zlib.compress(self.codes.astype("<i2").tobytes() + self.flags.tobytes())
+
+    @classmethod
+    def from_bytes(cls, student_names: Sequence[str], department_names: Sequence[str], calendar: MonthCalendar,
+                   data: bytes) -> 'ScheduleStore':
+        """由to_bytes的结果还原排期矩阵"""
+        store = cls(student_names, department_names, calendar)
+        raw = zlib.decompress(data)
+        size = store.codes.size
+        if len(raw) != 3 * size:
+            raise ValueError("排期数据与学生数、月数不一致")
+        store.codes = np.frombuffer(raw[:2 * size], dtype="<i2").astype(np.int16).reshape(store.codes.shape)
+        store.flags = np.frombuffer(raw[2 * size:], dtype=np.uint8).copy().reshape(store.flags.shape)
+        return store
+
+    def _refresh_cache(self):
+        """矩阵修改后清空生成的缓存"""
+        self._labels = None
+        self._dict = None
+        self._cache_version = self.version
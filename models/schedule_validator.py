@@ -0,0 +1,224 @@
+import numpy as np
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from models.capacity import CapacityLimits, UNLIMITED
+from models.department import Department
+from models.schedule_store import ScheduleStore, FLAG_OUTPATIENT, FLAG_SUFFIXES
+from models.student import Student
+
+# 检查的规则
+RULE_MISSING = "没有排期"
+RULE_INCOMPLETE = "轮转未完成"
+RULE_EXCESS = "轮转月数超出"
+RULE_LATER = "后期轮转过早"
+RULE_CONSECUTIVE = "同专业连续轮转"
+RULE_HALF_MONTH = "半月轮转未拼接"
+RULE_SPREAD = "科室人数不均衡"
+RULE_CAPACITY = "科室人数超出限制"
+RULES = (RULE_MISSING, RULE_INCOMPLETE, RULE_EXCESS, RULE_LATER, RULE_CONSECUTIVE, RULE_HALF_MONTH, RULE_SPREAD,
+         RULE_CAPACITY)
+
+
+class Violation(NamedTuple):
+    """一条违反排期规则的记录"""
+    rule: str  # 规则，见RULES
+    student: Optional[str]  # 学生姓名，科室人数类的规则为None
+    month: Optional[str]  # 发生的月份"YYYY-MM"，与月份无关时为None
+    detail: str  # 说明
+
+
+class ValidationReport:
+    """排期检查结果，违规记录按规则、学生名单顺序和月份排列"""
+    def __init__(self, violations: List[Violation]):
+        self.violations = violations
+
+    @property
+    def ok(self) -> bool:
+        return not self.violations
+
+    def __len__(self) -> int:
+        return len(self.violations)
+
+    def by_rule(self, rule: str) -> List[Violation]:
+        return [violation for violation in self.violations if violation.rule == rule]
+
+    def counts(self) -> Dict[str, int]:
+        """每条规则的违规数，没有违规的规则不在结果中"""
+        counts = {}
+        for violation in self.violations:
+            counts[violation.rule] = counts.get(violation.rule, 0) + 1
+        return counts
+
+    def students(self) -> List[str]:
+        """有违规的学生，按首次出现的顺序"""
+        return list(dict.fromkeys(v.student for v in self.violations if v.student is not None))
+
+    def to_dicts(self) -> List[Dict[str, Optional[str]]]:
+        """转换为可JSON编码的字典列表"""
+        return [violation._asdict() for violation in self.violations]
+
+
+def month_spread(counts: np.ndarray, first_month: np.ndarray) -> np.ndarray:
+    """计算每列在first_month及之后各月份人数的最大值与最小值之差
+
+    Args:
+        counts: 月份 × 科室 的人数矩阵
+        first_month: 每个科室开始统计的月份序号
+    """
+    valid = np.arange(len(counts))[:, None] >= first_month[None, :]
+    high = np.where(valid, counts, np.iinfo(np.int32).min).max(axis=0, initial=np.iinfo(np.int32).min)
+    low = np.where(valid, counts, np.iinfo(np.int32).max).min(axis=0, initial=np.iinfo(np.int32).max)
+    return np.where(valid.any(axis=0), high - low, 0)
+
+
+def validate_schedule(store: ScheduleStore, departments: Sequence[Department], students: Sequence[Student],
+                      later_start_month: int, max_spread: int,
+                      background: Optional[np.ndarray] = None,
+                      capacity: Optional[CapacityLimits] = None) -> ValidationReport:
+    """一次检查整个年级的排期是否符合排期规则
+
+    所有要求都由科室配置和学生信息得出：每个专业的轮转月数为学生所选科室的轮转月数之和，
+    本专业另加2个月门诊轮转，社会培训学生每个自选专业另加1个月；后期轮转科室和门诊轮转
+    在学生开始轮转一年后；相邻的两个轮转段不能属于同一专业；半月轮转需与另一个半月轮转拼成一个月；
+    所有学生都在轮转的月份中，各科室每月人数的最大值与最小值之差不超过max_spread（后期轮转科室只统计一年后）；
+    设置了人数限制时，有学生轮转的月份中各科室人数在最少人数和最多人数之间。
+    各项检查都是对 学生 × 半月时段 矩阵的整体运算，不逐个学生解析排期。
+
+    Args:
+        store: 排期矩阵
+        departments: 科室配置，排期矩阵中不在配置里的科室不检查轮转月数
+        students: 需要检查的学生，不在排期矩阵中的学生记为没有排期
+        later_start_month: 后期轮转最早开始的月份，相对每个学生开始轮转的月份
+        max_spread: 各科室每月人数允许的最大差值
+        background: 其他年级的 月份 × 科室 固定人数，计入人数均衡和人数限制的检查
+        capacity: 各科室每月的人数限制，与排期矩阵的月份和科室对应，为None时不检查
+    Returns:
+        ValidationReport
+    """
+    violations = []
+    calendar = store.calendar
+    scheduled = [student for student in students if student.name in store.student_index]
+    violations.extend(Violation(RULE_MISSING, student.name, None, "排期中没有该学生")
+                      for student in students if student.name not in store.student_index)
+    rows = np.array([store.student_index[student.name] for student in scheduled], dtype=np.intp)
+    names = [student.name for student in scheduled]
+    codes = store.codes[rows].astype(np.intp)
+    flags = store.flags[rows]
+    assigned = codes >= 0
+    safe_codes = np.maximum(codes, 0)
+
+    # 排期矩阵中每个科室编号对应的配置，不在配置中的科室专业编号为-1
+    configured = {dept.name: dept for dept in departments}
+    specialty_codes = {}
+    for dept in departments:
+        specialty_codes.setdefault(dept.specialty, len(specialty_codes))
+    specialty_names = list(specialty_codes)
+    width = len(store.department_names)
+    dept_specialty = np.full(width, -1, dtype=np.intp)
+    dept_later = np.zeros(width, dtype=bool)
+    dept_slots = np.zeros(width, dtype=np.int64)  # 科室所有轮转的半月时段数
+    for code, name in enumerate(store.department_names):
+        dept = configured.get(name)
+        if dept is not None:
+            dept_specialty[code] = specialty_codes[dept.specialty]
+            dept_later[code] = bool(dept.is_later_rotation)
+            dept_slots[code] = round(2 * dept.get_total_months())
+    slot_specialty = np.where(assigned, dept_specialty[safe_codes], -1)
+
+    def label(position: int, slot: int) -> str:
+        """某个时段的科室名称，带特殊标识"""
+        return store.department_names[codes[position, slot]] + FLAG_SUFFIXES.get(int(flags[position, slot]), "")
+
+    # 每个学生开始轮转的月份：第一个有安排的月份
+    has_slots = assigned.any(axis=1)
+    start_month = store.start_months(rows)
+
+    # 1. 各专业轮转月数：学生 × 科室 的半月时段数，按专业加总后与要求比较
+    slot_counts = np.bincount((np.arange(len(rows))[:, None] * width + codes)[assigned],
+                              minlength=len(rows) * width).reshape(len(rows), width)
+    actual = np.zeros((len(rows), len(specialty_names)), dtype=np.int64)
+    required = np.zeros_like(actual)
+    for specialty, code in specialty_codes.items():
+        columns = np.flatnonzero(dept_specialty == code)
+        actual[:, code] = slot_counts[:, columns].sum(axis=1)
+        # 学生所选科室为该专业中轮转时段最多的科室，相同时取轮转月数较少的科室
+        preference = slot_counts[:, columns] * (dept_slots.max(initial=0) + 1) - dept_slots[columns]
+        chosen = columns[np.argmax(preference, axis=1)]
+        required[:, code] = dept_slots[chosen]
+    for position, student in enumerate(scheduled):
+        if student.specialty in specialty_codes:
+            required[position, specialty_codes[student.specialty]] += 4  # 本专业门诊2个月
+        if student.training_type == "社会培训":
+            for specialty in student.self_selected_specialties or []:
+                if specialty in specialty_codes:
+                    required[position, specialty_codes[specialty]] += 2  # 自选专业1个月
+    for rule, mask in ((RULE_INCOMPLETE, actual < required), (RULE_EXCESS, actual > required)):
+        for position, code in zip(*np.nonzero(mask)):
+            violations.append(Violation(rule, names[position], None,
+                                        f"{specialty_names[code]}需要{required[position, code] / 2:g}个月，"
+                                        f"实际{actual[position, code] / 2:g}个月"))
+
+    # 2. 后期轮转：后期轮转科室和门诊轮转的时段不能早于开始轮转一年后，每个学生每个科室记一次
+    slots = np.arange(codes.shape[1])
+    later_slots = assigned & (dept_later[safe_codes] | (flags & FLAG_OUTPATIENT).astype(bool))
+    early = later_slots & (slots[None, :] < 2 * (start_month[:, None] + later_start_month))
+    positions, early_slots = np.nonzero(early)
+    keys = positions * width + codes[positions, early_slots]
+    _, first = np.unique(keys, return_index=True)
+    for index in np.sort(first):
+        position, slot = positions[index], early_slots[index]
+        violations.append(Violation(RULE_LATER, names[position], calendar.key(slot // 2),
+                                    f"{label(position, slot)}应在开始轮转"
+                                    f"{later_start_month}个月后安排"))
+
+    # 3. 相邻的轮转段（科室或标识变化处）属于同一专业
+    change = (codes[:, 1:] != codes[:, :-1]) | (flags[:, 1:] != flags[:, :-1])
+    same = change & (slot_specialty[:, 1:] >= 0) & (slot_specialty[:, 1:] == slot_specialty[:, :-1])
+    for position, boundary in zip(*np.nonzero(same)):
+        slot = boundary + 1
+        violations.append(Violation(RULE_CONSECUTIVE, names[position], calendar.key(slot // 2),
+                                    f"{label(position, slot - 1)}之后紧接{label(position, slot)}，"
+                                    f"同属{specialty_names[slot_specialty[position, slot]]}"))
+
+    # 4. 只有半个月有安排的月份
+    single = assigned[:, 0::2] != assigned[:, 1::2]
+    for position, month in zip(*np.nonzero(single)):
+        slot = 2 * month if assigned[position, 2 * month] else 2 * month + 1
+        half = "上半月" if slot % 2 == 0 else "下半月"
+        violations.append(Violation(RULE_HALF_MONTH, names[position], calendar.key(month),
+                                    f"{half}轮转{label(position, slot)}，另半个月没有安排"))
+
+    # 5. 所有学生都在轮转的月份中各科室每月人数之差
+    if rows.size and has_slots.all():
+        end_month = (codes.shape[1] - np.argmax(assigned[:, ::-1], axis=1) + 1) // 2
+        first_month, last_month = int(start_month.max()), int(end_month.min())
+        counts = store.occupancy(rows).astype(np.int64)
+        if background is not None:
+            counts += background[:len(counts)]
+        window = counts[first_month:last_month]
+        # 后期轮转月份与排期一样从排期表第一个月起算，换算为窗口内的月份
+        spread = month_spread(window, np.where(dept_later, max(later_start_month - first_month, 0), 0))
+        for code in np.flatnonzero(spread > max_spread):
+            violations.append(Violation(RULE_SPREAD, None, None,
+                                        f"{store.department_names[code]}在{calendar.key(first_month)}至"
+                                        f"{calendar.key(last_month - 1)}期间每月人数相差{spread[code]}人，"
+                                        f"超过{max_spread}人"))
+
+    # 6. 有学生轮转的月份中各科室人数超出人数限制
+    if capacity is not None and rows.size:
+        months = store.used_months(rows)
+        counts = store.occupancy(rows).astype(np.int64)
+        if background is not None:
+            counts += background[:len(counts)]
+        counts = counts[months]
+        maximum = capacity.maximum[months]
+        minimum = capacity.minimum[months]
+        over = (maximum < UNLIMITED) & (counts > maximum)
+        under = counts < minimum
+        for index, code in zip(*np.nonzero(over | under)):
+            count = counts[index, code]
+            bound = (f"超过最多人数{maximum[index, code]}人" if over[index, code]
+                     else f"少于最少人数{minimum[index, code]}人")
+            violations.append(Violation(RULE_CAPACITY, None, calendar.key(months[index]),
+                                        f"{store.department_names[code]}有{count}人，{bound}"))
+    return ValidationReport(violations)
@@ -0,0 +1,530 @@
+import heapq
+import itertools
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from models.schedule_store import ScheduleStore, EMPTY
+
+# 费用比较的容差
+_EPSILON = 1e-9
+
+
+def solve_transportation(costs: np.ndarray, capacities: Sequence[int]) -> np.ndarray:
+    """求解最小费用运输问题：每个学生分配到一个科室，各科室人数不超过容量，总费用最小
+
+    采用逐个加入学生的最短增广路算法。残量网络中学生节点只作为科室之间的中转，
+    将其压缩为科室节点之间的边：科室i到科室j的费用为 min(费用[t, j] - 费用[t, i])，
+    t为当前分配在科室i的学生，用带延迟删除的堆维护。每次增广在科室节点上做向量化的Bellman-Ford，
+    复杂度与学生数近似线性，与科室数的三次方成正比，适合同专业少量科室的情况。
+
+    Args:
+        costs: 学生 × 科室 的费用矩阵
+        capacities: 每个科室的人数上限，总和不小于学生数
+    Returns:
+        np.ndarray - 每个学生分配的科室列下标
+    """
+    costs = np.asarray(costs, dtype=float)
+    students, width = costs.shape
+    capacities = list(capacities)
+    if sum(capacities) < students:
+        raise ValueError("科室容量不足，无法分配所有学生")
+    assigned = np.full(students, -1, dtype=np.intp)
+    counts = [0] * width
+    # heaps[i][j]: [(费用[t, j] - 费用[t, i], t)]，t为分配在科室i的学生
+    heaps = [[[] for _ in range(width)] for _ in range(width)]
+
+    def place(student: int, dept: int):
+        assigned[student] = dept
+        row = costs[student]
+        for target in range(width):
+            if target != dept:
+                heapq.heappush(heaps[dept][target], (row[target] - row[dept], student))
+
+    def top(source: int, target: int):
+        heap = heaps[source][target]
+        while heap and assigned[heap[0][1]] != source:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    # 所有科室都未满时，每个学生都在自己费用最小的科室，转移学生不会更优，直接分配
+    unlimited = True
+    for student in range(students):
+        # 从新学生出发到各科室的最短距离，prev记录经由哪个科室转移学生到达
+        dist = costs[student].copy()
+        prev = np.full(width, -1, dtype=np.intp)
+        unlimited = unlimited and all(count < capacity for count, capacity in zip(counts, capacities))
+        if not unlimited:
+            # 增广前堆不变，科室之间的边只取一次，Bellman-Ford按整行向量松弛
+            edges = np.full((width, width), np.inf)
+            for source in range(width):
+                if counts[source] == 0:
+                    continue
+                for target in range(width):
+                    entry = top(source, target) if target != source else None
+                    if entry is not None:
+                        edges[source, target] = entry[0]
+            columns = np.arange(width)
+            for _ in range(width - 1):
+                through = dist[:, None] + edges
+                best = through.argmin(axis=0)
+                shortest = through[best, columns]
+                better = shortest < dist - _EPSILON
+                if not better.any():
+                    break
+                dist[better] = shortest[better]
+                prev[better] = best[better]
+        dist, prev = dist.tolist(), prev.tolist()
+
+        open_depts = [dept for dept in range(width) if counts[dept] < capacities[dept]]
+        end = min(open_depts, key=lambda dept: (dist[dept], dept))
+        path = [end]
+        while prev[path[-1]] >= 0:
+            path.append(prev[path[-1]])
+        path.reverse()
+        # 从终点开始依次将学生转移到下一个科室，最后将新学生放入起点科室
+        for source, target in reversed(list(zip(path[:-1], path[1:]))):
+            moved = top(source, target)[1]
+            counts[source] -= 1
+            counts[target] += 1
+            place(moved, target)
+        counts[path[0]] += 1
+        place(student, path[0])
+    return assigned
+
+
+def _row_runs(mask: np.ndarray) -> List[List[Tuple[int, int]]]:
+    """二维布尔矩阵每行中连续为True的区间 [[(起点, 长度)]]"""
+    padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    rows, edges = np.nonzero(np.diff(padded, axis=1))
+    runs = [[] for _ in range(mask.shape[0])]
+    # 每行的边界成对出现：区间起点、终点
+    for row, start, end in zip(rows[0::2].tolist(), edges[0::2].tolist(), edges[1::2].tolist()):
+        runs[row].append((start, end - start))
+    return runs
+
+
+class SiblingAssigner:
+    """同专业科室的整体分配
+
+    贪心排期逐个学生选择同专业中总人数最少的科室，没有考虑科室在各月份的忙闲。
+    本阶段在排期完成后，对轮转结构相同（各次轮转月数、是否后期轮转都相同）的同专业科室，
+    根据每个学生在该专业的轮转时段，整体重新选择科室，使各科室每个半月时段的人数更均衡。
+    轮转结构相同的科室互换只改变科室名，不改变轮转时段和排期规则。
+
+    目标函数与局部搜索相同，为 半月时段 × 科室 人数的平方和。每轮在当前分配处线性化：
+    学生分配到某科室的费用为其轮转时段内该科室其他学生人数之和，
+    各科室人数上限为平均人数向上取整，以运输问题求解全体学生的分配，目标函数变小才接受。
+
+    轮转结构不同的同专业科室（如各次轮转为[2, 1.5]和[2, 2]个月）由assign_structures逐个学生调整：
+    新科室的各次轮转在原轮转段上缩短或向相邻的空闲时段延长，缩短空出的半月由该学生未完成的
+    半月轮转补上，不产生新的半月未拼接、同专业相连或过早的后期轮转。
+    """
+    def __init__(self, store: ScheduleStore, groups: Sequence[Sequence[int]],
+                 background: Optional[np.ndarray] = None):
+        """
+        Args:
+            store: 需要调整的排期矩阵，直接在其上修改
+            groups: 可以互换的科室编号分组
+            background: 其他年级在各 半月时段 × 科室 的固定人数，计入费用但不调整
+        """
+        self.store = store
+        self.groups = [list(group) for group in groups if len(group) > 1]
+        self.background = background
+
+    def _load(self) -> np.ndarray:
+        """统计 半月时段 × 科室 的人数矩阵，包括其他年级的固定人数"""
+        load = self.store.slot_occupancy()
+        if self.background is not None:
+            load += self.background
+        return load
+
+    @staticmethod
+    def _move_delta(load: np.ndarray, window: np.ndarray, source: int, target: int) -> int:
+        """一个学生从source科室移到target科室时目标函数的变化量"""
+        return int(2 * (load[window, target] - load[window, source] + 1).sum())
+
+    def _apply_chains(self, current: np.ndarray, proposal: np.ndarray, costs: np.ndarray,
+                      windows: List[np.ndarray], load: np.ndarray, capacities: Sequence[int]) -> bool:
+        """将运输问题的解分解为学生依次换科室的链，逐条按实际变化量决定是否接受
+
+        线性化的解同时移动大量学生时会矫枉过正，因此将新旧分配之差分解为
+        环（各科室人数不变）或路径（终点科室有空余容量），目标函数实际减小才接受。
+
+        Returns:
+            bool - 是否有链被接受，current和load在原处更新
+        """
+        # 按 (原科室, 新科室) 分组待移动的学生，线性化收益大的优先
+        pending = {}
+        moved = np.flatnonzero(proposal != current)
+        gains = costs[moved, current[moved]] - costs[moved, proposal[moved]]
+        for i in moved[np.argsort(-gains, kind="stable")].tolist():
+            pending.setdefault((int(current[i]), int(proposal[i])), []).append(i)
+        counts = np.bincount(current, minlength=load.shape[1])
+
+        accepted = False
+        while pending:
+            # 从任一移动出发，沿着"新科室的学生再移出"延伸，回到起点或无法延伸时结束
+            key = next(iter(pending))
+            chain = []
+            dept = key[0]
+            visited = set()
+            while True:
+                visited.add(dept)
+                key = next((k for k in pending if k[0] == dept), None)
+                if key is None:
+                    break
+                chain.append(pending[key].pop(0))
+                if not pending[key]:
+                    del pending[key]
+                dept = int(proposal[chain[-1]])
+                if dept in visited:
+                    break
+            first, last = int(current[chain[0]]), int(proposal[chain[-1]])
+            if first != last and counts[last] >= capacities[last]:
+                continue
+
+            delta = 0
+            for i in chain:
+                delta += self._move_delta(load, windows[i], current[i], proposal[i])
+                load[windows[i], current[i]] -= 1
+                load[windows[i], proposal[i]] += 1
+            if delta < 0:
+                counts[first] -= 1
+                counts[last] += 1
+                for i in chain:
+                    current[i] = proposal[i]
+                accepted = True
+            else:
+                for i in chain:
+                    load[windows[i], proposal[i]] -= 1
+                    load[windows[i], current[i]] += 1
+        return accepted
+
+    def assign(self, max_rounds: int = 10) -> List[Tuple[int, int, int]]:
+        """重新分配各组科室
+
+        Args:
+            max_rounds: 每组最多线性化求解的轮数
+        Returns:
+            List[Tuple[int, int, int]] - 科室有变化的学生 [(行号, 原科室编号, 新科室编号)]
+        """
+        original = self.store.codes.copy()
+        load = self._load()
+        for group in self.groups:
+            group_codes = np.asarray(group, dtype=np.int16)
+            # 每个学生在本组中只轮转一个科室，记录该科室和对应的时段
+            in_group = np.isin(self.store.codes, group_codes)
+            rows, sources = self._single_code_rows(in_group)
+            if len(rows) < 2:
+                continue
+            rows = rows.tolist()
+            windows = [np.flatnonzero(in_group[row]) for row in rows]
+            current = np.array([group.index(source) for source in sources.tolist()], dtype=np.intp)
+            capacities = [-(-len(rows) // len(group))] * len(group)
+            group_load = load[:, group]
+
+            window_masks = in_group[rows].astype(np.int64)
+            window_lengths = window_masks.sum(axis=1)
+            positions = np.arange(len(rows))
+            for _ in range(max_rounds):
+                # 费用：学生时段内各科室除自己外的人数之和，(x+1)^2 - x^2 = 2x + 1
+                window_load = window_masks @ group_load
+                window_load[positions, current] -= window_lengths
+                costs = (2 * window_load + window_lengths[:, None]).astype(float)
+                proposal = solve_transportation(costs, capacities)
+                if not self._apply_chains(current, proposal, costs, windows, group_load, capacities):
+                    break
+
+            for row, window, column in zip(rows, windows, current.tolist()):
+                if self.store.codes[row, window[0]] != group[column]:
+                    self.store.relabel(row, window, group[column])
+            load[:, group] = group_load
+
+        changed = np.flatnonzero((original != self.store.codes).any(axis=1))
+        moves = []
+        for row in changed.tolist():
+            mask = original[row] != self.store.codes[row]
+            moves.append((row, int(original[row][mask][0]), int(self.store.codes[row][mask][0])))
+        return moves
+
+    def assign_structures(self, groups: Sequence[Sequence[int]], lengths: Dict[int, Sequence[int]],
+                          specialties: Sequence[int], later: Sequence[bool], later_start_slots: Sequence[int],
+                          fillers: Optional[Dict[int, List[int]]] = None,
+                          max_rounds: int = 10) -> Tuple[List[Tuple[int, int, int]], List[Tuple[int, int]]]:
+        """在轮转结构不同的同专业科室之间逐个调整学生
+
+        每轮依次为组内每个学生选择最好的科室：能补上未完成半月轮转的优先，其次目标函数减小最多，
+        都没有改进时保持不变。只调整在组内一个科室完成了全部轮转（门诊除外）的学生。
+
+        Args:
+            groups: 可以互换的同专业科室编号分组
+            lengths: 科室编号 -> 各次轮转的半月时段数
+            specialties: 每个科室编号对应的专业编号，用于检查同专业相连
+            later: 每个科室编号是否为后期轮转
+            later_start_slots: 每个学生后期轮转最早可安排的半月时段
+            fillers: 行号 -> 该学生未完成的半月轮转的科室编号，可用于补上缩短后空出的半月
+            max_rounds: 最多调整的轮数
+        Returns:
+            (科室有变化的学生 [(行号, 原科室编号, 新科室编号)], 补上的半月轮转 [(行号, 科室编号)])
+        """
+        fillers = {row: list(codes) for row, codes in (fillers or {}).items()}
+        specialties = np.asarray(specialties, dtype=np.int64)
+        later = np.asarray(later, dtype=bool)
+        load = self._load()
+        origin = {}  # (行号, 组下标) -> 原科室
+        fills = []
+        for index, group in enumerate(groups):
+            if len({tuple(lengths[code]) for code in group}) < 2:
+                continue
+            group_codes = np.asarray(group, dtype=np.int16)
+            for _ in range(max_rounds):
+                changed = False
+                # 调整只改变该学生的行，本轮开始时整体计算各学生在组内的科室和轮转段，
+                # 并按本轮开始时的人数筛选出有改进方案的学生，只对这些学生逐个计算
+                prefixes = {}
+                rows = self._group_rows(group_codes)
+                improvable = self._improvable_rows(rows, group, lengths, fillers, load)
+                for row, source, runs, slots in rows:
+                    if row not in improvable:
+                        continue
+                    move = self._best_structure_move(row, source, runs, slots, group, lengths, specialties, later,
+                                                     int(later_start_slots[row]), fillers.get(row, []),
+                                                     load, prefixes)
+                    if move is None:
+                        continue
+                    codes, flags, filled, source, target = move
+                    old = self.store.codes[row]
+                    moved = np.flatnonzero(old != codes)
+                    for before, after in ((old[moved], -1), (codes[moved], 1)):
+                        mask = before >= 0
+                        np.add.at(load, (moved[mask], before[mask].astype(np.intp)), after)
+                        # 人数有变化的科室重新计算前缀和
+                        for code in np.unique(before[mask]).tolist():
+                            prefixes.pop(code, None)
+                    self.store.set_row(row, codes, flags)
+                    origin.setdefault((row, index), source)
+                    for code in filled:
+                        fillers[row].remove(code)
+                        fills.append((row, code))
+                    changed = True
+                if not changed:
+                    break
+        moves = []
+        for (row, index), source in origin.items():
+            target = int(self.store.codes[row][np.isin(self.store.codes[row], groups[index])][0])
+            if target != source:
+                moves.append((row, source, target))
+        return moves, fills
+
+    def _single_code_rows(self, in_group: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """在组内只轮转一个科室的学生
+
+        Args:
+            in_group: 学生 × 半月时段 是否为组内科室
+        Returns:
+            (行号, 各学生在组内的科室编号)
+        """
+        rows = np.flatnonzero(in_group.any(axis=1))
+        codes, in_group = self.store.codes[rows], in_group[rows]
+        high = np.where(in_group, codes, EMPTY).max(axis=1)
+        low = np.where(in_group, codes, np.iinfo(codes.dtype).max).min(axis=1)
+        single = high == low
+        return rows[single], high[single]
+
+    def _group_rows(self, group_codes: np.ndarray) -> List[Tuple[int, int, List[Tuple[int, int]],
+                                                                  List[Tuple[int, int]]]]:
+        """在组内只轮转一个科室的学生
+
+        Returns:
+            [(行号, 科室编号, 不带特殊标识的轮转段, 该科室所有的轮转段)]，轮转段为 (起点, 长度)
+        """
+        in_group = np.isin(self.store.codes, group_codes)
+        rows, sources = self._single_code_rows(in_group)
+        in_group = in_group[rows]
+        # 门诊等带特殊标识的轮转段长度固定，只改科室
+        plain = _row_runs(in_group & (self.store.flags[rows] == 0))
+        whole = _row_runs(in_group)
+        return list(zip(rows.tolist(), sources.tolist(), plain, whole))
+
+    def _improvable_rows(self, rows: Sequence[Tuple[int, int, List[Tuple[int, int]], List[Tuple[int, int]]]],
+                         group: Sequence[int], lengths: Dict[int, Sequence[int]], fillers: Dict[int, List[int]],
+                         load: np.ndarray) -> Set[int]:
+        """按当前人数整体计算各学生所有方案组内科室人数的变化量，返回有方案使之减小的学生
+
+        与_best_structure_move的变化量相同，但对原科室相同的学生按矩阵一起计算，不检查排期规则。
+        """
+        width = self.store.codes.shape[1]
+        # 科室各时段人数加1的变化量 2x + 1 的前缀和
+        prefix = np.zeros((width + 1, load.shape[1]), dtype=np.int64)
+        prefix[1:] = np.cumsum(2 * load + 1, axis=0)
+        by_source = {}
+        for row, source, runs, _ in rows:
+            if sorted(length for _, length in runs) == sorted(lengths[source]):
+                by_source.setdefault(source, []).append((row, runs))
+        improvable = set()
+        for source, entries in by_source.items():
+            row_numbers = np.array([row for row, _ in entries], dtype=np.intp)
+            starts = np.array([[start for start, _ in runs] for _, runs in entries], dtype=np.int64)
+            run_lengths = np.array([[length for _, length in runs] for _, runs in entries], dtype=np.int64)
+            available = np.array([sum(code not in group for code in fillers.get(row, [])) for row, _ in entries])
+            codes = self.store.codes[row_numbers]
+            mask = codes == source
+            # 每个学生空闲时段数的前缀和，延长的时段需要空闲
+            empty = np.zeros((len(entries), width + 1), dtype=np.int64)
+            empty[:, 1:] = np.cumsum(codes == EMPTY, axis=1)
+            positions = np.arange(len(entries))[:, None]
+            # (x-1)^2 - x^2 = 1 - 2x
+            removed = (mask * (1 - 2 * load[:, source])).sum(axis=1)
+            best = np.zeros(len(entries), dtype=np.int64)
+            for target in group:
+                if target == source or len(lengths[target]) != starts.shape[1]:
+                    continue
+                column = prefix[:, target]
+                base = removed + (mask * (2 * load[:, target] + 1)).sum(axis=1)
+                for order in set(itertools.permutations(lengths[target])):
+                    extra = np.asarray(order, dtype=np.int64)[None, :] - run_lengths
+                    allowed = np.maximum(-extra, 0).sum(axis=1) <= available
+                    for sides in itertools.product((0, 1), repeat=starts.shape[1]):
+                        after = np.asarray(sides, dtype=bool)[None, :]
+                        # 延长的时段在轮转段前或后，空出的时段在轮转段前端或后端
+                        first = np.where(extra > 0, np.where(after, starts + run_lengths, starts - extra),
+                                         np.where(after, starts + run_lengths + extra, starts))
+                        last = first + np.abs(extra)
+                        inside = (first >= 0) & (last <= width)
+                        first, last = np.clip(first, 0, width), np.clip(last, 0, width)
+                        free = empty[positions, last] - empty[positions, first]
+                        valid = allowed & (inside & ((extra <= 0) | (free == extra))).all(axis=1)
+                        window = column[last] - column[first]
+                        delta = base + (np.sign(extra) * window).sum(axis=1)
+                        best = np.where(valid, np.minimum(best, delta), best)
+            improvable.update(row_numbers[best < 0].tolist())
+        return improvable
+
+    def _best_structure_move(self, row: int, source: int, runs: Sequence[Tuple[int, int]],
+                             slots: Sequence[Tuple[int, int]], group: Sequence[int],
+                             lengths: Dict[int, Sequence[int]], specialties: np.ndarray, later: np.ndarray,
+                             later_start_slot: int, fillers: List[int], load: np.ndarray,
+                             prefixes: Dict[int, List[int]]):
+        """计算学生换到组内其他科室的最好方案，没有改进时返回None
+
+        各方案组内科室人数的变化量只取决于原科室的时段和延长、空出的时段，由各科室的前缀和计算，
+        再按变化量从小到大检查排期规则，第一个符合规则的方案即为最好方案。
+
+        Args:
+            runs: 原科室不带特殊标识的轮转段
+            slots: 原科室所有的轮转段
+            prefixes: 科室编号 -> 各时段人数加1的变化量 2x + 1 的前缀和，人数变化后由调用方清空
+        Returns:
+            (新的科室行, 新的标识行, 补上的半月轮转科室, 原科室, 新科室)
+        """
+        if sorted(length for _, length in runs) != sorted(lengths[source]):
+            return None
+        # 组内科室补在空出的时段会与新科室相连，只用其他科室的半月轮转
+        fillers = [code for code in fillers if code not in group]
+        width = self.store.codes.shape[1]
+
+        def prefix(code: int) -> List[int]:
+            if code not in prefixes:
+                prefixes[code] = [0] + np.cumsum(2 * load[:, code] + 1).tolist()
+            return prefixes[code]
+
+        # 原科室各时段人数减1的变化量，(x-1)^2 - x^2 = 1 - 2x
+        source_prefix = prefix(source)
+        removed = sum(2 * length - (source_prefix[start + length] - source_prefix[start])
+                      for start, length in slots)
+
+        candidates = []
+        for target in group:
+            if target == source or len(lengths[target]) != len(runs):
+                continue
+            # 新科室在原科室各时段人数加1的变化量，(x+1)^2 - x^2 = 2x + 1
+            target_prefix = prefix(target)
+            added = sum(target_prefix[start + length] - target_prefix[start] for start, length in slots)
+            for order in set(itertools.permutations(lengths[target])):
+                shrink = sum(max(length - wanted, 0) for (_, length), wanted in zip(runs, order))
+                if shrink > len(fillers):
+                    continue
+                for sides in itertools.product((0, 1), repeat=len(runs)):
+                    delta = removed + added
+                    for (start, length), wanted, side in zip(runs, order, sides):
+                        extra = wanted - length
+                        if extra > 0:
+                            first = start - extra if side == 0 else start + length
+                            if first < 0 or first + extra > width:
+                                break
+                            delta += target_prefix[first + extra] - target_prefix[first]
+                        elif extra < 0:
+                            first = start if side == 0 else start + wanted
+                            delta -= target_prefix[first - extra] - target_prefix[first]
+                    else:
+                        if delta < 0:
+                            # 补上的半月轮转本应安排，只比较组内科室的人数变化，变化量相同时补上多的优先
+                            candidates.append(((delta, -shrink), len(candidates), target, order, sides))
+        if not candidates:
+            return None
+
+        codes = self.store.codes[row]
+        flags = self.store.flags[row]
+        unpaired = self._unpaired_months(codes)
+        adjacent = self._adjacent_specialties(codes, flags, specialties)
+        for _, _, target, order, sides in sorted(candidates):
+            candidate = self._restructure(codes, flags, source, target, runs, order, sides, fillers)
+            if candidate is None:
+                continue
+            new_codes, new_flags, filled = candidate
+            if self._unpaired_months(new_codes) > unpaired:
+                continue
+            if self._adjacent_specialties(new_codes, new_flags, specialties) > adjacent:
+                continue
+            if later[target] and (np.flatnonzero(new_codes == target) < later_start_slot).any():
+                continue
+            return new_codes, new_flags, filled, source, target
+        return None
+
+    @staticmethod
+    def _restructure(codes: np.ndarray, flags: np.ndarray, source: int, target: int,
+                     runs: Sequence[Tuple[int, int]], order: Sequence[int], sides: Sequence[int],
+                     fillers: Sequence[int]):
+        """按新科室的各次轮转长度调整学生的轮转段
+
+        side为0时在轮转段前端延长或空出，为1时在后端。延长需要相邻时段空闲，空出的时段依次用未完成的
+        半月轮转补上，不够补上时返回None。
+        Returns:
+            (新的科室行, 新的标识行, 补上的半月轮转科室)
+        """
+        new_codes = codes.copy()
+        new_flags = flags.copy()
+        new_codes[codes == source] = target
+        available = list(fillers)
+        filled = []
+        for (start, length), wanted, side in zip(runs, order, sides):
+            extra = wanted - length
+            if extra > 0:
+                first = start - extra if side == 0 else start + length
+                if first < 0 or first + extra > len(codes) or (new_codes[first:first + extra] != EMPTY).any():
+                    return None
+                new_codes[first:first + extra] = target
+                new_flags[first:first + extra] = 0
+            elif extra < 0:
+                if len(available) < -extra:
+                    return None
+                first = start if side == 0 else start + wanted
+                for slot in range(first, first - extra):
+                    filled.append(available.pop(0))
+                    new_codes[slot] = filled[-1]
+                    new_flags[slot] = 0
+        return new_codes, new_flags, filled
+
+    @staticmethod
+    def _unpaired_months(codes: np.ndarray) -> int:
+        """只有半个月有安排的月份数"""
+        assigned = codes >= 0
+        return int(np.count_nonzero(assigned[0::2] != assigned[1::2]))
+
+    @staticmethod
+    def _adjacent_specialties(codes: np.ndarray, flags: np.ndarray, specialties: np.ndarray) -> int:
+        """相邻的两个轮转段属于同一专业的次数"""
+        slot_specialty = np.where(codes >= 0, specialties[np.maximum(codes, 0)], -1)
+        change = (codes[1:] != codes[:-1]) | (flags[1:] != flags[:-1])
+        return int(np.count_nonzero(change & (slot_specialty[1:] >= 0) & (slot_specialty[1:] == slot_specialty[:-1])))
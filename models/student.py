@@ -1,6 +1,17 @@
 import json
 import os
-from typing import List, Dict, Any, Optional
+import re
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from utils.database import Database, default_database_file
+from utils.excel_io import REQUIRED_STUDENT_FIELDS, read_columns
+from utils.persistence import JsonFileWriter
+
+# 培训方式
+TRAINING_TYPES = ("专科培训", "社会培训")
+# Excel中多个自选专业之间的分隔符
+SPECIALTY_SEPARATORS = re.compile(r"[,，、;；/\s]+")
 
 class Student:
     def __init__(
@@ -46,13 +57,45 @@ class Student:
 
 
 class StudentManager:
-    def __init__(self):
+    def __init__(self, data_file: Optional[str] = None, save_delay: float = 0.0,
+                 database_file: Optional[str] = None):
+        """
+        Args:
+            data_file: 学生数据文件，默认data/students.json
+            save_delay: 延迟保存的秒数，0表示每次修改后立即保存
+            database_file: SQLite数据库文件，数据文件和数据库都未指定时使用环境变量LUNZHAN_DATABASE，
+                环境变量也未设置时使用JSON文件
+        """
         self.students = []
-        self.data_file = "data/students.json"
+        if data_file is None and database_file is None:
+            # 调用方指定了数据文件时不使用环境变量，避免写入用户的数据库
+            database_file = default_database_file()
+        self.data_file = data_file or "data/students.json"
+        self.save_delay = save_delay
+        self.database_file = database_file
+        self._database = Database(self.database_file) if self.database_file else None
+        self._writer = JsonFileWriter("学生数据", save_delay)
+        self._batch_depth = 0  # 嵌套的批量修改层数
+        self._batch_dirty = False  # 批量修改期间是否有需要保存的修改
         self._load_students()
+    
+    def __getstate__(self):
+        # 写入器包含线程锁、数据库连接不能序列化（多进程排期时传递管理器）
+        state = self.__dict__.copy()
+        del state["_writer"]
+        del state["_database"]
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._writer = JsonFileWriter("学生数据", self.save_delay)
+        self._database = Database(self.database_file) if self.database_file else None
         
     def _load_students(self):
-        """从文件加载学生数据"""
+        """从数据库或文件加载学生数据，数据库为空时导入已有的JSON文件"""
+        if self._database is not None and self._database.count("students"):
+            self.students = [Student.from_dict(item) for item in self._database.load("students")]
+            return
         if os.path.exists(self.data_file):
             try:
                 with open(self.data_file, 'r', encoding='utf-8') as f:
@@ -61,72 +104,154 @@ class StudentManager:
             except Exception as e:
                 print(f"加载学生数据失败: {e}")
                 self.students = []
+        if self._database is not None and self.students:
+            self.save_students()
                 
     def save_students(self):
-        """保存学生数据到文件"""
-        # 确保目录存在
-        os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
+        """保存所有学生数据到文件或数据库
+        
+        批量修改期间只做标记，结束时保存一次；设置了延迟保存时在后台合并写入。
+        """
+        if self._batch_depth:
+            self._batch_dirty = True
+            return
+        data = [student.to_dict() for student in self.students]
+        if self._database is not None:
+            self._database.replace_all("students", data)
+        else:
+            self._writer.submit(self.data_file, data)
+    
+    def _save_change(self, write_row: Callable[[Database], None]):
+        """保存单个学生的修改：使用数据库且不在批量修改中时只写入变化的行，否则保存所有数据"""
+        if self._database is not None and not self._batch_depth:
+            write_row(self._database)
+        else:
+            self.save_students()
+    
+    def flush(self) -> bool:
+        """立即写入延迟保存的数据，返回是否写入成功"""
+        return self._writer.flush()
+    
+    @contextmanager
+    def batch(self):
+        """批量修改学生数据，期间的增删改只在结束时保存一次
         
+        可以嵌套，最外层结束时保存。出现异常时恢复为修改前的数据，不保存。
+        """
+        backup = list(self.students) if self._batch_depth == 0 else None
+        self._batch_depth += 1
         try:
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                data = [student.to_dict() for student in self.students]
-                json.dump(data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"保存学生数据失败: {e}")
+            yield self
+        except BaseException:
+            if backup is not None:
+                self.students = backup
+                self._batch_dirty = False
+            raise
+        finally:
+            self._batch_depth -= 1
+        if self._batch_depth == 0 and self._batch_dirty:
+            self._batch_dirty = False
+            self.save_students()
             
     def add_student(self, student: Student):
         """添加学生"""
         self.students.append(student)
-        self.save_students()
+        self._save_change(lambda database: database.insert("students", len(self.students) - 1, student.to_dict()))
         
     def remove_student(self, index: int):
         """删除学生"""
         if 0 <= index < len(self.students):
             del self.students[index]
-            self.save_students()
+            self._save_change(lambda database: database.delete("students", index))
             
     def update_student(self, index: int, student: Student):
         """更新学生信息"""
         if 0 <= index < len(self.students):
             self.students[index] = student
-            self.save_students()
+            self._save_change(lambda database: database.update("students", index, student.to_dict()))
             
     def get_students(self) -> List[Student]:
         """获取所有学生"""
         return self.students
+    
+    def get_students_by_grade(self, grade: str) -> List[Student]:
+        """获取指定年级的学生，按名单顺序
         
-    def import_from_excel(self, file_path: str) -> int:
-        """从Excel导入学生数据"""
-        import pandas as pd
+        使用数据库时按年级索引查询，批量修改尚未保存时在内存中筛选。
+        """
+        if self._database is not None and not self._batch_dirty:
+            return [self.students[seq] for seq in self._database.find("students", "grade", grade)]
+        return [student for student in self.students if student.grade == grade]
+        
+    def import_students(self, file_path: str,
+                        columns: Optional[Mapping[str, Sequence[str]]] = None) -> 'ImportResult':
+        """从Excel导入学生数据
         
+        流式读取所有行后统一校验：必填字段、培训方式、社会培训的自选专业，
+        与已有学生或文件中前面的行重名的跳过。所有有效的学生一次保存。
+        
+        Args:
+            file_path: Excel文件路径
+            columns: 字段 -> 可能的表头，默认见utils.excel_io.STUDENT_COLUMNS
+        Raises:
+            ValueError: 缺少姓名、科室或年级列
+        """
+        values, row_numbers = read_columns(file_path, columns, REQUIRED_STUDENT_FIELDS)
+        count = len(row_numbers)
+        empty = [""] * count
+        names, specialties, grades = values["name"], values["specialty"], values["grade"]
+        positions = values.get("position", empty)
+        training_types = [text or "专科培训" for text in values.get("training_type", empty)]
+        self_selected = [[part for part in SPECIALTY_SEPARATORS.split(text) if part]
+                         for text in values.get("self_selected_specialties", empty)]
+        
+        result = ImportResult()
+        seen = {student.name for student in self.students}
+        for i in range(count):
+            if not (names[i] and specialties[i] and grades[i]):
+                reason = "姓名、科室和年级不能为空"
+            elif names[i] in seen:
+                reason = f"学生 '{names[i]}' 已存在"
+            elif training_types[i] not in TRAINING_TYPES:
+                reason = f"未知的培训方式 '{training_types[i]}'"
+            elif training_types[i] == "社会培训" and len(set(self_selected[i])) < 2:
+                reason = "社会培训需要两个不同的自选专业"
+            else:
+                seen.add(names[i])
+                result.students.append(Student(
+                    name=names[i],
+                    specialty=specialties[i],
+                    grade=grades[i],
+                    position=positions[i],
+                    training_type=training_types[i],
+                    self_selected_specialties=(list(dict.fromkeys(self_selected[i]))
+                                               if training_types[i] == "社会培训" else [])
+                ))
+                continue
+            result.skipped.append((row_numbers[i], reason))
+        
+        if result.students:
+            first = len(self.students)
+            self.students.extend(result.students)
+            self._save_change(lambda database: database.insert_many(
+                "students", first, [student.to_dict() for student in result.students]))
+        return result
+        
+    def import_from_excel(self, file_path: str) -> int:
+        """从Excel导入学生数据，返回导入的人数，导入失败时返回0"""
         try:
-            df = pd.read_excel(file_path)
-            count = 0
-            
-            for _, row in df.iterrows():
-                # 假设Excel文件有必要的列
-                name = row.get('姓名', '')
-                specialty = row.get('科室', '')
-                grade = row.get('年级', '')
-                position = row.get('职位', '')
-                
-                # 默认为专科培训
-                training_type = "专科培训"
-                self_selected_specialties = []
-                
-                if name and specialty and grade:
-                    student = Student(
-                        name=name,
-                        specialty=specialty,
-                        grade=grade,
-                        position=position,
-                        training_type=training_type,
-                        self_selected_specialties=self_selected_specialties
-                    )
-                    self.add_student(student)
-                    count += 1
-                    
-            return count
+            return self.import_students(file_path).count
         except Exception as e:
             print(f"导入Excel失败: {e}")
-            return 0 
\ No newline at end of file
+            return 0
+
+
+class ImportResult:
+    """Excel导入结果"""
+    def __init__(self):
+        self.students: List[Student] = []  # 导入的学生
+        self.skipped: List[Tuple[int, str]] = []  # 跳过的行 [(Excel行号, 原因)]
+    
+    @property
+    def count(self) -> int:
+        return len(self.students)
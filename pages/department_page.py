@@ -1,12 +1,13 @@
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, 
                              QLineEdit, QComboBox, QPushButton, QTableWidget, 
                              QTableWidgetItem, QMessageBox, QHeaderView, 
-                             QGroupBox, QDoubleSpinBox, QCheckBox, QScrollArea,
+                             QGroupBox, QDoubleSpinBox, QSpinBox, QCheckBox, QScrollArea,
                              QGridLayout, QFrame)
 from PyQt6.QtGui import QFont, QColor, QPalette
 from PyQt6.QtCore import Qt, pyqtSignal
 
 from models.department import Department, DepartmentManager
+from utils.persistence import INTERACTIVE_SAVE_DELAY
 
 class DepartmentPage(QWidget):
     # 定义信号
@@ -16,7 +17,7 @@ class DepartmentPage(QWidget):
         super().__init__()
         
         # 初始化管理器
-        self.department_manager = DepartmentManager()
+        self.department_manager = DepartmentManager(save_delay=INTERACTIVE_SAVE_DELAY)
         
         # 设置UI
         self._setup_ui()
@@ -144,10 +145,26 @@ class DepartmentPage(QWidget):
         """)
         form_layout.addWidget(self.later_rotation_check, 0, 6)
         
+        # 每月人数限制，0表示不限
+        min_label = QLabel("每月最少人数:")
+        min_label.setStyleSheet(label_style)
+        form_layout.addWidget(min_label, 1, 0)
+        
+        self.min_capacity_input = self._create_capacity_input()
+        form_layout.addWidget(self.min_capacity_input, 1, 1)
+        
+        max_label = QLabel("每月最多人数:")
+        max_label.setStyleSheet(label_style)
+        form_layout.addWidget(max_label, 1, 2)
+        
+        self.max_capacity_input = self._create_capacity_input()
+        form_layout.addWidget(self.max_capacity_input, 1, 3)
+        
         input_layout.addLayout(form_layout)
         
         # 添加说明标签
-        hint_label = QLabel("轮转配置格式说明: 直接输入每次轮转的月数，如\"2.0/1.5\"表示需要轮转2次，第一次2个月，第二次1.5个月")
+        hint_label = QLabel("轮转配置格式说明: 直接输入每次轮转的月数，如\"2.0/1.5\"表示需要轮转2次，第一次2个月，第二次1.5个月；"
+                            "每月人数为0表示不限，最多人数在排期时严格限制")
         hint_label.setStyleSheet("color: #888888; font-style: italic; padding: 5px;")
         input_layout.addWidget(hint_label)
         
@@ -225,9 +242,9 @@ class DepartmentPage(QWidget):
         self.department_table = QTableWidget()
         self.department_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
         self.department_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
-        self.department_table.setColumnCount(4)
+        self.department_table.setColumnCount(5)
         self.department_table.setHorizontalHeaderLabels([
-            "科室名称", "科室专业", "轮转配置", "后期轮转"
+            "科室名称", "科室专业", "轮转配置", "后期轮转", "每月人数"
         ])
         self.department_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
         self.department_table.setStyleSheet("""
@@ -260,6 +277,31 @@ class DepartmentPage(QWidget):
         # 保存当前编辑的科室索引
         self.current_edit_index = -1
     
+    def _create_capacity_input(self):
+        """创建每月人数输入框，0显示为不限"""
+        spin_box = QSpinBox()
+        spin_box.setRange(0, 999)
+        spin_box.setSpecialValueText("不限")
+        return spin_box
+    
+    def _capacity_values(self):
+        """读取输入的 (最少人数, 最多人数)，不限为None"""
+        minimum = self.min_capacity_input.value() or None
+        maximum = self.max_capacity_input.value() or None
+        return minimum, maximum
+    
+    def _format_capacity(self, department):
+        """人数限制的显示文本"""
+        if department.min_capacity is None and department.max_capacity is None:
+            text = "不限"
+        else:
+            low = department.min_capacity if department.min_capacity is not None else 0
+            high = department.max_capacity if department.max_capacity is not None else "不限"
+            text = f"{low}~{high}"
+        if department.monthly_capacity:
+            text += f"（{len(department.monthly_capacity)}个月单独设置）"
+        return text
+    
     def _parse_rotation_config(self, config_text):
         """解析轮转配置文本，返回(轮转次数, [月数列表])"""
         try:
@@ -329,6 +371,7 @@ class DepartmentPage(QWidget):
             # 后期轮转显示为"是"或"否"
             is_later = "是" if department.is_later_rotation else "否"
             self.department_table.setItem(row, 3, QTableWidgetItem(is_later))
+            self.department_table.setItem(row, 4, QTableWidgetItem(self._format_capacity(department)))
     
     def _add_department(self):
         """添加科室"""
@@ -354,13 +397,20 @@ class DepartmentPage(QWidget):
             QMessageBox.warning(self, "提示", "轮转配置格式错误，请使用如'2/1.5'的格式")
             return
         
+        min_capacity, max_capacity = self._capacity_values()
+        if min_capacity is not None and max_capacity is not None and min_capacity > max_capacity:
+            QMessageBox.warning(self, "提示", "每月最少人数不能大于最多人数")
+            return
+        
         # 创建科室对象
         department = Department(
             name=name,
             specialty=specialty,
             rotation_times=rotation_times,
             months_per_rotation=months_per_rotation,
-            is_later_rotation=is_later_rotation
+            is_later_rotation=is_later_rotation,
+            min_capacity=min_capacity,
+            max_capacity=max_capacity
         )
         
         # 添加科室
@@ -403,13 +453,21 @@ class DepartmentPage(QWidget):
             QMessageBox.warning(self, "提示", "轮转配置格式错误，请使用如'2/1.5'的格式")
             return
         
-        # 创建科室对象
+        min_capacity, max_capacity = self._capacity_values()
+        if min_capacity is not None and max_capacity is not None and min_capacity > max_capacity:
+            QMessageBox.warning(self, "提示", "每月最少人数不能大于最多人数")
+            return
+        
+        # 创建科室对象，按月份单独设置的人数界面上不编辑，保留原有设置
         department = Department(
             name=name,
             specialty=specialty,
             rotation_times=rotation_times,
             months_per_rotation=months_per_rotation,
-            is_later_rotation=is_later_rotation
+            is_later_rotation=is_later_rotation,
+            min_capacity=min_capacity,
+            max_capacity=max_capacity,
+            monthly_capacity=departments[self.current_edit_index].monthly_capacity
         )
         
         # 更新科室
@@ -484,6 +542,8 @@ class DepartmentPage(QWidget):
         self.rotation_config_input.setText(config_text)
         
         self.later_rotation_check.setChecked(department.is_later_rotation)
+        self.min_capacity_input.setValue(department.min_capacity or 0)
+        self.max_capacity_input.setValue(department.max_capacity or 0)
         
         # 启用按钮
         self.update_button.setEnabled(True)
@@ -497,6 +557,8 @@ class DepartmentPage(QWidget):
         self.specialty_input.clear()
         self.rotation_config_input.clear()
         self.later_rotation_check.setChecked(False)
+        self.min_capacity_input.setValue(0)
+        self.max_capacity_input.setValue(0)
         self.current_edit_index = -1
     
     def _reset_button_states(self):
@@ -1,63 +1,196 @@
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, 
-                             QPushButton, QTableWidget, QTableWidgetItem, 
+                             QPushButton, QTableView,
                              QFileDialog, QMessageBox, QHeaderView, QGroupBox, 
                              QComboBox, QDateEdit, QSpinBox, QScrollArea,
-                             QFrame, QGridLayout, QTabWidget)
-from PyQt6.QtGui import QFont, QColor, QPainter, QBrush
-from PyQt6.QtCore import Qt, QDate, pyqtSlot, QSize
+                             QFrame, QGridLayout, QTabWidget, QProgressDialog,
+                             QApplication)
+from PyQt6.QtGui import QFont, QColor, QBrush
+from PyQt6.QtCore import (Qt, QDate, pyqtSlot, pyqtSignal, QSize, QThread,
+                          QAbstractTableModel, QModelIndex)
 
 import os
-import pandas as pd
+import pickle
+import numpy as np
 from datetime import datetime, timedelta
 from collections import defaultdict
 
-from models.rotation import RotationScheduler
+from models.rotation import RotationScheduler, ScheduleCancelled
+from models.student import Student
+from utils.database import open_default_database
+from utils.result_cache import ResultCache
+from utils.palette import SPECIALTY_PALETTE, first_appearance_order
 from pages.student_page import StudentPage
 from pages.department_page import DepartmentPage
 
-class GanttChartTable(QTableWidget):
-    """甘特图表格"""
+class ScheduleWorker(QThread):
+    """在后台线程中生成排期，完成后将调度器交回界面线程"""
+    progress = pyqtSignal(str, int, int)  # 阶段, 已完成数, 总数
+    succeeded = pyqtSignal(object)  # 生成完成的调度器
+    failed = pyqtSignal(str)  # 错误信息
+    cancelled = pyqtSignal()
+    
+    def __init__(self, scheduler: RotationScheduler, start_date, grade: str, restarts: int,
+                 optimize_seconds: float, parent=None):
+        super().__init__(parent)
+        self.scheduler = scheduler
+        self.start_date = start_date
+        self.grade = grade
+        self.restarts = restarts
+        self.optimize_seconds = optimize_seconds
+        self.cancel_requested = False
+    
+    def cancel(self):
+        """请求取消，排期在下一个检查点停止"""
+        self.cancel_requested = True
+    
+    def _execute(self):
+        """在后台线程中执行的排期任务"""
+        self.scheduler.generate_schedule(self.start_date, self.grade, restarts=self.restarts,
+                                         optimize_seconds=self.optimize_seconds)
+    
+    def run(self):
+        self.scheduler.progress_callback = self.progress.emit
+        self.scheduler.should_cancel = lambda: self.cancel_requested
+        try:
+            self._execute()
+        except ScheduleCancelled:
+            self.cancelled.emit()
+            return
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            self.failed.emit(str(e))
+            return
+        finally:
+            # 之后在界面线程中使用调度器时不再回调本线程
+            self.scheduler.progress_callback = None
+            self.scheduler.should_cancel = None
+        self.succeeded.emit(self.scheduler)
+
+class ScheduleRepairWorker(ScheduleWorker):
+    """在后台线程中局部调整已有排期
+
+    调整在调度器的副本上进行，副本使用学生和科室数据的快照，界面继续显示和读取原调度器，
+    完成后由界面线程换用副本。
+    """
+    
+    def __init__(self, scheduler: RotationScheduler, added, removed, changed, frozen_before, parent=None):
+        snapshot = scheduler.copy(pickle.loads(pickle.dumps(scheduler.student_manager)),
+                                  pickle.loads(pickle.dumps(scheduler.department_manager)))
+        super().__init__(snapshot, None, scheduler.grade, 1, 0.0, parent)
+        # 使用学生信息的副本，调整期间界面修改学生不影响本次调整，之后再比较名单调整
+        self.added = [Student.from_dict(s.to_dict()) for s in added]
+        self.removed = list(removed)
+        self.changed = [Student.from_dict(s.to_dict()) for s in changed]
+        self.frozen_before = frozen_before
+    
+    def _execute(self):
+        self.scheduler.repair_schedule(self.added, self.removed, self.changed, frozen_before=self.frozen_before)
+
+class ScheduleTableModel(QAbstractTableModel):
+    """学生排期表数据模型
+
+    直接使用排期矩阵生成的科室名称矩阵和专业编号矩阵，视图只对可见单元格取数据，
+    不为每个单元格创建表格项。
+    """
+    INFO_HEADERS = ["姓名", "科室", "年级", "职位"]
+    
+    def __init__(self, students, months, labels: np.ndarray, specialties: np.ndarray, brushes, parent=None):
+        """
+        Args:
+            students: 学生列表，对应每一行
+            months: 月份列表，对应信息列之后的每一列
+            labels: 学生 × 月份 的科室名称矩阵
+            specialties: 学生 × 月份 的专业编号矩阵，-1表示未安排
+            brushes: 专业编号 -> 背景画刷
+        """
+        super().__init__(parent)
+        # 每行为 信息列 + 各月份科室名称，转换为列表，绘制时按下标直接取值
+        self.rows = [[s.name, s.specialty, s.grade, s.position] + row_labels
+                     for s, row_labels in zip(students, labels.tolist())]
+        self.headers = self.INFO_HEADERS + list(months)
+        # 每行为 信息列（无颜色） + 各月份专业对应的画刷
+        info_brushes = [None] * len(self.INFO_HEADERS)
+        self.row_brushes = [info_brushes + [brushes[code] if code >= 0 else None for code in row_codes]
+                            for row_codes in specialties.tolist()]
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        # 绘制每个单元格时会查询多种角色，只处理文字和背景色
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.rows[index.row()][index.column()]
+        if role == Qt.ItemDataRole.BackgroundRole:
+            return self.row_brushes[index.row()][index.column()]
+        return None
+    
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.headers[section]
+        return str(section + 1)
+
+
+class GanttChartTable(QTableView):
+    """甘特图表格，按行高固定的方式只绘制可见行，适合大量学生"""
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setShowGrid(True)
         self.setAlternatingRowColors(True)
-        self.setSelectionMode(QTableWidget.SelectionMode.NoSelection)
-        self.setSizeAdjustPolicy(QTableWidget.SizeAdjustPolicy.AdjustToContents)
-        self.setHorizontalScrollMode(QTableWidget.ScrollMode.ScrollPerPixel)
-        self.setVerticalScrollMode(QTableWidget.ScrollMode.ScrollPerPixel)
+        self.setSelectionMode(QTableView.SelectionMode.NoSelection)
+        self.setEditTriggers(QTableView.EditTrigger.NoEditTriggers)
+        self.setHorizontalScrollMode(QTableView.ScrollMode.ScrollPerPixel)
+        self.setVerticalScrollMode(QTableView.ScrollMode.ScrollPerPixel)
+        self.setWordWrap(False)
+        
+        # 固定行高，滚动时不需要逐行计算内容高度
+        self.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.verticalHeader().setDefaultSectionSize(self.fontMetrics().height() + 16)
+        # 按内容调整列宽时只采样部分行
+        self.horizontalHeader().setResizeContentsPrecision(200)
         
         # 设置表格样式
         self.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background-color: white;
                 alternate-background-color: #f9f9f9;
                 border: 1px solid #dddddd;
                 border-radius: 4px;
                 gridline-color: #dddddd;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 6px;
             }
-            QTableWidget::item:selected {
-                background-color: #66afe9;
-                color: white;
-            }
             QHeaderView::section {
                 background-color: #f0f0f0;
                 padding: 6px;
                 border: 1px solid #dddddd;
                 font-weight: bold;
             }
+            QScrollBar:horizontal {
+                height: 15px;
+            }
+            QScrollBar:vertical {
+                width: 15px;
+            }
+            QScrollBar::handle {
+                background: #bbbbbb;
+                border-radius: 4px;
+            }
+            QScrollBar::handle:hover {
+                background: #999999;
+            }
         """)
         
         # 设置一些颜色映射，用于不同科室显示不同颜色
         self.specialty_colors = {}
         self.color_index = 0
-        self.base_colors = [
-            "#FF9AA2", "#FFB7B2", "#FFDAC1", "#E2F0CB", "#B5EAD7",
-            "#C7CEEA", "#B5D8EB", "#D0B8EA", "#FFC6FF", "#BDB2FF",
-            "#A0C4FF", "#9BF6FF", "#CAFFBF", "#FDFFB6", "#FFD6A5"
-        ]
+        self.base_colors = SPECIALTY_PALETTE
         
     def _get_specialty_color(self, specialty):
         """获取科室专业对应的颜色"""
@@ -65,48 +198,144 @@ class GanttChartTable(QTableWidget):
             self.specialty_colors[specialty] = self.base_colors[self.color_index % len(self.base_colors)]
             self.color_index += 1
         return self.specialty_colors[specialty]
-        
-    def sizeHint(self):
-        """提供表格的建议大小"""
-        width = self.horizontalHeader().length() + self.verticalHeader().width() + 50  # 额外空间用于滚动条
-        height = self.verticalHeader().length() + self.horizontalHeader().height() + 50
-        return QSize(width, height)
+    
+    def set_schedule_model(self, model: QAbstractTableModel = None):
+        """设置数据模型，释放之前的模型，model为None时清空表格"""
+        old_model = self.model()
+        self.setModel(model)
+        if old_model is not None:
+            old_model.deleteLater()
+    
+    def get_specialty_brushes(self, specialties: np.ndarray, specialty_names):
+        """按专业在表格中首次出现的顺序分配颜色，返回 专业编号 -> 画刷 列表"""
+        brushes = [None] * len(specialty_names)
+        for code in first_appearance_order(specialties):
+            brushes[code] = QBrush(QColor(self._get_specialty_color(specialty_names[code])))
+        return brushes
+
+
+class DepartmentMonthModel(QAbstractTableModel):
+    """科室-月份人数统计表数据模型
+
+    直接使用调度器的人数统计，最后一列为各科室人数差，最后一行为每月合计。
+    背景颜色按人数预先生成，每种人数只生成一次。提供排期查询索引时，
+    人数单元格的提示显示该科室该月轮转的学生名单，悬停时才从索引中读取。
+    """
+    SPREAD_HEADER = "人数差"
+    TOTAL_HEADER = "合计"
+    # 颜色分界阈值：人数≤3使用绿色系，>3使用橙色到红色系
+    THRESHOLD = 3
+    
+    def __init__(self, statistics, schedule_index=None, parent=None):
+        super().__init__(parent)
+        self.statistics = statistics
+        self.schedule_index = schedule_index
+        self.row_headers = statistics.names + [self.TOTAL_HEADER]
+        self.column_headers = statistics.months + [self.SPREAD_HEADER]
+        # 每行为各月份人数 + 人数差，合计行的人数差留空
+        self.rows = [counts + [spread] for counts, spread in
+                     zip(statistics.counts.tolist(), statistics.spread.tolist())]
+        self.rows.append(statistics.month_totals.tolist() + [""])
+        self.colors = [self._get_color_for_count(count, statistics.max_count)
+                       for count in range(statistics.max_count + 1)]
+        self.total_brush = QBrush(QColor("#f0f0f0"))
+    
+    @classmethod
+    def _get_color_for_count(cls, count, max_count):
+        """人数对应的 (背景画刷, 文字画刷)，无人时为 (None, None)"""
+        if count == 0:
+            return None, None
+        if count <= cls.THRESHOLD:
+            # 绿色系 - 从浅到深 (较少人数)
+            intensity = count / cls.THRESHOLD  # 0到1之间
+            color = QColor(int(255 - 135 * intensity), 255, int(255 - 135 * intensity))
+            return QBrush(color), None
+        
+        # 橙色到红色系 - 从浅到深 (较多人数)
+        threshold = cls.THRESHOLD
+        intensity = min((count - threshold) / (max_count - threshold), 1.0) if max_count > threshold else 0
+        if intensity < 0.5:  # 橙色区间
+            color = QColor(255, int(255 - 128 * intensity * 2), 0)
+        else:  # 橙色过渡到红色
+            color = QColor(255, int(127 - 127 * (intensity - 0.5) * 2), 0)
+        # 当颜色较深时需要白色文字
+        foreground = QBrush(QColor(255, 255, 255)) if intensity > 0.3 else None
+        return QBrush(color), foreground
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.column_headers)
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        row, col = index.row(), index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            return str(self.rows[row][col])
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            return Qt.AlignmentFlag.AlignCenter
+        is_count = row < len(self.statistics.names) and col < len(self.statistics.months)
+        if role == Qt.ItemDataRole.BackgroundRole:
+            return self.colors[self.rows[row][col]][0] if is_count else self.total_brush
+        if role == Qt.ItemDataRole.ForegroundRole and is_count:
+            return self.colors[self.rows[row][col]][1]
+        if (role == Qt.ItemDataRole.ToolTipRole and is_count and self.schedule_index is not None
+                and self.rows[row][col]):
+            unit = self.schedule_index.unit_index[self.statistics.names[row]]
+            month = self.schedule_index.month_offset(self.statistics.months[col])
+            return "\n".join(self.schedule_index.student_names(unit, month))
+        return None
+    
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.column_headers[section]
+        return self.row_headers[section]
 
 
-class DepartmentMonthTable(QTableWidget):
+class DepartmentMonthTable(QTableView):
     """科室-月份人数统计表格"""
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setShowGrid(True)
         self.setAlternatingRowColors(True)
-        self.setSelectionMode(QTableWidget.SelectionMode.NoSelection)
-        self.setSizeAdjustPolicy(QTableWidget.SizeAdjustPolicy.AdjustToContents)
-        self.setHorizontalScrollMode(QTableWidget.ScrollMode.ScrollPerPixel)
-        self.setVerticalScrollMode(QTableWidget.ScrollMode.ScrollPerPixel)
+        self.setSelectionMode(QTableView.SelectionMode.NoSelection)
+        self.setEditTriggers(QTableView.EditTrigger.NoEditTriggers)
+        self.setSizeAdjustPolicy(QTableView.SizeAdjustPolicy.AdjustToContents)
+        self.setHorizontalScrollMode(QTableView.ScrollMode.ScrollPerPixel)
+        self.setVerticalScrollMode(QTableView.ScrollMode.ScrollPerPixel)
         
         # 设置表格样式
         self.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background-color: white;
                 alternate-background-color: #f9f9f9;
                 border: 1px solid #dddddd;
                 border-radius: 4px;
                 gridline-color: #dddddd;
             }
-            QTableWidget::item {
-                padding: 6px;
-            }
-            QTableWidget::item:selected {
-                background-color: #66afe9;
-                color: white;
+            QTableView::item {
+                padding: 8px;
             }
             QHeaderView::section {
-                background-color: #f0f0f0;
-                padding: 6px;
-                border: 1px solid #dddddd;
+                background-color: #e0e0e0;
+                padding: 8px;
+                border: 1px solid #cccccc;
                 font-weight: bold;
             }
         """)
+        self.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.verticalHeader().setVisible(True)
+    
+    def set_statistics_model(self, model: QAbstractTableModel = None):
+        """设置数据模型，释放之前的模型，model为None时清空表格"""
+        old_model = self.model()
+        self.setModel(model)
+        if old_model is not None:
+            old_model.deleteLater()
+        if model is not None:
+            self.resizeColumnsToContents()
         
     def sizeHint(self):
         """提供表格的建议大小"""
@@ -124,14 +353,24 @@ class RotationPage(QWidget):
         self.department_page = department_page
         
         # 连接信号
-        self.student_page.student_data_changed.connect(self._on_data_changed)
+        self.student_page.student_data_changed.connect(self._on_student_data_changed)
         self.department_page.department_data_changed.connect(self._on_data_changed)
         
         # 创建调度器
         self.scheduler = None
+        # 正在后台生成排期的线程及进度对话框
+        self._worker = None
+        self._progress_dialog = None
+        # 后台线程运行期间学生数据有变化，线程结束后再局部调整
+        self._repair_pending = False
+        QApplication.instance().aboutToQuit.connect(self._stop_worker)
+        # 使用数据库保存数据时，排期结果也保存在数据库中，切换年级时载入
+        self.database = open_default_database()
         
         # 设置UI
         self._setup_ui()
+        self.grade_combo.currentTextChanged.connect(self._load_saved_schedule)
+        self._load_saved_schedule(self.grade_combo.currentText())
         
     def _setup_ui(self):
         # 主布局
@@ -172,7 +411,7 @@ class RotationPage(QWidget):
         
         # 创建输入控件样式
         input_style = """
-            QLineEdit, QComboBox, QDateEdit {
+            QLineEdit, QComboBox, QDateEdit, QSpinBox {
                 padding: 6px;
                 border: 1px solid #cccccc;
                 border-radius: 4px;
@@ -180,7 +419,7 @@ class RotationPage(QWidget):
                 color: #333333;
                 min-height: 25px;
             }
-            QLineEdit:focus, QComboBox:focus, QDateEdit:focus {
+            QLineEdit:focus, QComboBox:focus, QDateEdit:focus, QSpinBox:focus {
                 border: 1px solid #66afe9;
                 outline: 0;
                 box-shadow: 0 0 8px rgba(102, 175, 233, 0.6);
@@ -220,6 +459,30 @@ class RotationPage(QWidget):
         self.start_date_edit.setDate(QDate.currentDate().addMonths(-QDate.currentDate().month() % 12 + 1))  # 设为当年9月1日
         settings_layout.addWidget(self.start_date_edit, 0, 3)
         
+        # 随机重启次数，大于1时并行生成多个排期并保留最均衡的结果
+        restarts_label = QLabel("随机重启:")
+        restarts_label.setStyleSheet(label_style)
+        settings_layout.addWidget(restarts_label, 0, 4)
+        
+        self.restarts_spin = QSpinBox()
+        self.restarts_spin.setStyleSheet(input_style)
+        self.restarts_spin.setRange(1, 64)
+        self.restarts_spin.setValue(1)
+        self.restarts_spin.setToolTip("大于1时使用多个进程生成多个随机排期，保留科室人数最均衡的结果")
+        settings_layout.addWidget(self.restarts_spin, 0, 5)
+        
+        # 局部搜索优化时间，调整学生轮转顺序使各科室人数更均衡
+        optimize_label = QLabel("优化时间(秒):")
+        optimize_label.setStyleSheet(label_style)
+        settings_layout.addWidget(optimize_label, 0, 6)
+        
+        self.optimize_spin = QSpinBox()
+        self.optimize_spin.setStyleSheet(input_style)
+        self.optimize_spin.setRange(0, 300)
+        self.optimize_spin.setValue(0)
+        self.optimize_spin.setToolTip("生成排期后调整学生轮转顺序使各科室人数更均衡，0表示不优化")
+        settings_layout.addWidget(self.optimize_spin, 0, 7)
+        
         # 按钮样式
         button_style = """
             QPushButton {
@@ -249,17 +512,17 @@ class RotationPage(QWidget):
         self.generate_button = QPushButton("生成排期")
         self.generate_button.setStyleSheet(button_style)
         self.generate_button.clicked.connect(self._generate_schedule)
-        settings_layout.addWidget(self.generate_button, 0, 4)
+        settings_layout.addWidget(self.generate_button, 0, 8)
         
         # 导出Excel按钮
         self.export_button = QPushButton("导出Excel")
         self.export_button.setStyleSheet(button_style)
         self.export_button.clicked.connect(self._export_excel)
         self.export_button.setEnabled(False)
-        settings_layout.addWidget(self.export_button, 0, 5)
+        settings_layout.addWidget(self.export_button, 0, 9)
         
         # 添加一个弹性空间
-        settings_layout.setColumnStretch(6, 1)
+        settings_layout.setColumnStretch(10, 1)
         
         main_layout.addWidget(settings_group)
         
@@ -294,40 +557,14 @@ class RotationPage(QWidget):
         student_layout = QVBoxLayout(student_schedule_page)
         
         self.schedule_table = GanttChartTable()
-        self.schedule_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
-        
-        # 创建滚动区域包装表格
-        student_scroll_area = QScrollArea()
-        student_scroll_area.setWidgetResizable(True)
-        student_scroll_area.setWidget(self.schedule_table)
-        student_scroll_area.setStyleSheet("""
-            QScrollArea {
-                border: none;
-                background-color: transparent;
-            }
-            QScrollBar:horizontal {
-                height: 15px;
-            }
-            QScrollBar:vertical {
-                width: 15px;
-            }
-            QScrollBar::handle {
-                background: #bbbbbb;
-                border-radius: 4px;
-            }
-            QScrollBar::handle:hover {
-                background: #999999;
-            }
-        """)
         
-        student_layout.addWidget(student_scroll_area)
+        student_layout.addWidget(self.schedule_table)
         
         # === 4. 科室月份统计表格页 ===
         dept_month_page = QWidget()
         dept_layout = QVBoxLayout(dept_month_page)
         
         self.dept_month_table = DepartmentMonthTable()
-        self.dept_month_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
         
         # 创建滚动区域包装表格
         dept_scroll_area = QScrollArea()
@@ -390,15 +627,14 @@ class RotationPage(QWidget):
         return int(total_months)
     
     def _generate_schedule(self):
-        """生成排期"""
+        """在后台线程中生成排期，显示进度并允许取消"""
+        if self._worker is not None:
+            return
         try:
             # 获取参数
             grade = self.grade_combo.currentText()
             start_date = self.start_date_edit.date().toPyDate()
             
-            # 计算基础轮转月数
-            #months = self._calculate_base_months(grade)
-            
             # 创建调度器
             student_manager = self.student_page.get_student_manager()
             department_manager = self.department_page.get_department_manager()
@@ -411,139 +647,111 @@ class RotationPage(QWidget):
                 QMessageBox.warning(self, "提示", "没有科室数据，请先在科室配置页面添加科室")
                 return
             
-            # 显示正在生成
-           # QMessageBox.information(self, "提示", f"正在生成{months}个月的排期，可能需要等待几秒钟...")
-            
-            # 创建调度器并生成排期
-            self.scheduler = RotationScheduler(student_manager, department_manager)
-            self.scheduler.generate_schedule(start_date, grade)
-            
-            # 显示排期结果
-            self._display_schedule(grade)
-            self._display_dept_month_stats(grade)
+            # 创建调度器，在后台线程中生成排期，完成后再替换当前排期
+            scheduler = RotationScheduler(student_manager, department_manager)
+            scheduler.result_cache = ResultCache()
+            self._worker = ScheduleWorker(scheduler, start_date, grade, self.restarts_spin.value(),
+                                          self.optimize_spin.value(), self)
+            self._worker.progress.connect(self._on_generate_progress)
+            self._worker.succeeded.connect(self._on_generate_succeeded)
+            self._worker.failed.connect(self._on_generate_failed)
+            self._worker.finished.connect(self._on_generate_finished)
+            
+            # 窗口模态的进度对话框：界面保持响应，但生成期间不能修改数据
+            self._progress_dialog = QProgressDialog("正在生成排期...", "取消", 0, 0, self)
+            self._progress_dialog.setWindowTitle("生成排期")
+            self._progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
+            self._progress_dialog.setMinimumDuration(0)
+            self._progress_dialog.setAutoClose(False)
+            self._progress_dialog.setAutoReset(False)
+            self._progress_dialog.canceled.connect(self._cancel_generation)
+            
+            self.generate_button.setEnabled(False)
+            self._worker.start()
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"生成排期时发生错误: {str(e)}")
+            import traceback
+            traceback.print_exc()
+    
+    @pyqtSlot(str, int, int)
+    def _on_generate_progress(self, stage, done, total):
+        """更新生成进度"""
+        if self._progress_dialog is None or self._progress_dialog.wasCanceled():
+            return
+        self._progress_dialog.setLabelText(f"正在{stage}...")
+        self._progress_dialog.setMaximum(total)
+        self._progress_dialog.setValue(min(done, total))
+    
+    @pyqtSlot()
+    def _cancel_generation(self):
+        """取消正在生成的排期"""
+        if self._worker is not None:
+            self._worker.cancel()
+            if self._progress_dialog is not None:
+                self._progress_dialog.setLabelText("正在取消...")
+    
+    @pyqtSlot(object)
+    def _on_generate_succeeded(self, scheduler):
+        """排期生成完成，显示结果"""
+        if self._worker is not None and self._worker.cancel_requested:
+            return
+        self.scheduler = scheduler
+        self._save_schedule()
+        try:
+            self._display_schedule(scheduler.grade)
+            self._display_dept_month_stats(scheduler.grade)
             
             # 启用导出按钮
             self.export_button.setEnabled(True)
         except Exception as e:
-            QMessageBox.critical(self, "错误", f"生成排期时发生错误: {str(e)}")
+            QMessageBox.critical(self, "错误", f"显示排期时发生错误: {str(e)}")
             import traceback
             traceback.print_exc()
     
+    @pyqtSlot(str)
+    def _on_generate_failed(self, message):
+        QMessageBox.critical(self, "错误", f"生成排期时发生错误: {message}")
+    
+    @pyqtSlot()
+    def _on_generate_finished(self):
+        """后台线程结束后关闭进度对话框"""
+        if self._progress_dialog is not None:
+            self._progress_dialog.close()
+            self._progress_dialog.deleteLater()
+            self._progress_dialog = None
+        if self._worker is not None:
+            self._worker.deleteLater()
+            self._worker = None
+        self.generate_button.setEnabled(True)
+        if self._repair_pending:
+            self._repair_pending = False
+            self._on_student_data_changed()
+    
+    @pyqtSlot()
+    def _stop_worker(self):
+        """退出程序时取消并等待后台线程结束"""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker.wait()
+    
     def _display_schedule(self, grade):
         """显示学生排期表"""
         try:
             if not self.scheduler:
                 return
                 
-            # 筛选指定年级的学生
-            student_manager = self.student_page.get_student_manager()
-            students = [s for s in student_manager.get_students() if s.grade == grade]
+            # 从排期矩阵获取指定年级的排期数据
+            students, months, labels, specialties, specialty_names = self.scheduler.get_schedule_grid(grade)
             
-            if not students or not self.scheduler.schedule:
+            if not students:
                 QMessageBox.warning(self, "提示", f"没有{grade}的学生数据或排期结果")
                 return
-                
-            # 找到所有日期
-            all_dates = set()
-            for student_name, dates in self.scheduler.schedule.items():
-                if student_name in [s.name for s in students]:
-                    all_dates.update(dates.keys())
-            
-            # 排序日期
-            sorted_dates = sorted(all_dates)
-            
-            if not sorted_dates:
-                QMessageBox.warning(self, "提示", "没有排期数据")
-                return
-                
-            # 创建DataFrame的数据
-            data = {
-                "姓名": [],
-                "科室": [],
-                "年级": [],
-                "职位": []
-            }
-            
-            # 添加日期列，并为每个日期创建空列表
-            date_columns = []
-            for date in sorted_dates:
-                display_date = datetime.strptime(date, "%Y-%m").strftime("%Y-%m")
-                if display_date not in data:
-                    data[display_date] = []
-                    date_columns.append(display_date)
-                
-            # 填充数据
-            for student in students:
-                if student.name not in self.scheduler.schedule:
-                    continue
-                    
-                data["姓名"].append(student.name)
-                data["科室"].append(student.specialty)
-                data["年级"].append(student.grade)
-                data["职位"].append(student.position)
-                
-                for display_date in date_columns:
-                    found = False
-                    for date in sorted_dates:
-                        curr_display_date = datetime.strptime(date, "%Y-%m").strftime("%Y-%m")
-                        if curr_display_date == display_date and date in self.scheduler.schedule[student.name]:
-                            data[display_date].append(self.scheduler.schedule[student.name][date])
-                            found = True
-                            break
-                    if not found:
-                        data[display_date].append("")
-            
-            # 检查所有列的长度是否一致
-            length_check = len(data["姓名"])
-            for key, value in data.items():
-                if len(value) != length_check:
-                    data[key] = value + [""] * (length_check - len(value))
-            
-            # 创建DataFrame
-            df = pd.DataFrame(data)
-            
-            if df.empty:
-                QMessageBox.warning(self, "提示", "没有排期数据")
-                return
-                
-            # 设置表格
-            row_count = df.shape[0]
-            column_count = df.shape[1]
-            
-            self.schedule_table.setRowCount(row_count)
-            self.schedule_table.setColumnCount(column_count)
-            
-            # 设置列标题
-            self.schedule_table.setHorizontalHeaderLabels(df.columns.tolist())
             
-            # 填充数据
-            for row in range(row_count):
-                for col in range(column_count):
-                    value = str(df.iloc[row, col])
-                    item = QTableWidgetItem(value)
-                    
-                    # 如果是轮转科室（日期列）
-                    if col >= 4:  # 前4列是姓名、科室、年级、职位
-                        # 科室名称
-                        dept_name = value
-                        
-                        # 如果有科室名称，添加背景颜色
-                        if dept_name:
-                            # 为科室专业设置颜色
-                            specialty = None
-                            
-                            # 尝试从科室名称获取专业
-                            for dept in self.department_page.get_department_manager().get_departments():
-                                if dept_name.startswith(dept.name):
-                                    specialty = dept.specialty
-                                    break
-                            
-                            # 如果找到专业，设置背景色
-                            if specialty:
-                                color = self.schedule_table._get_specialty_color(specialty)
-                                item.setBackground(QColor(color))
-                    
-                    self.schedule_table.setItem(row, col, item)
+            # 设置数据模型，颜色按专业预先生成
+            brushes = self.schedule_table.get_specialty_brushes(specialties, specialty_names)
+            model = ScheduleTableModel(students, months, labels, specialties, brushes, self.schedule_table)
+            self.schedule_table.set_schedule_model(model)
+            column_count = model.columnCount()
             
             # 调整列宽
             # 前4列使用ResizeToContents模式
@@ -569,9 +777,6 @@ class RotationPage(QWidget):
             # 设置表格可以水平滚动
             self.schedule_table.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
             
-            # 调整表格大小以适应内容
-            self.schedule_table.resizeRowsToContents()
-            
         except Exception as e:
             QMessageBox.critical(self, "错误", f"显示排期时发生错误: {str(e)}")
             import traceback
@@ -580,167 +785,17 @@ class RotationPage(QWidget):
     def _display_dept_month_stats(self, grade):
         """显示科室-月份人数统计表"""
         try:
-            if not self.scheduler or not self.scheduler.schedule:
+            if not self.scheduler or self.scheduler.store is None:
                 return
                 
-            # 筛选指定年级的学生
-            student_manager = self.student_page.get_student_manager()
-            department_manager = self.department_page.get_department_manager()
-            students = [s for s in student_manager.get_students() if s.grade == grade]
+            # 使用调度器统计的指定年级每个科室每个月的人数
+            statistics = self.scheduler.get_occupancy_statistics(grade)
             
-            if not students:
+            if not statistics.months or not statistics.names:
                 return
-                
-            # 找到所有日期和科室
-            all_dates = set()
-            all_departments = set()
-            for student_name, dates in self.scheduler.schedule.items():
-                if student_name in [s.name for s in students]:
-                    all_dates.update(dates.keys())
-                    for date, dept in dates.items():
-                        if dept:  # 确保科室名不为空
-                            if "/" in dept:
-                                dept_list = dept.split("/")
-                                for dept in dept_list:
-                                    all_departments.add(dept)
-                            else:
-                                all_departments.add(dept)
             
-            # 排序日期和科室
-            sorted_dates = sorted(all_dates)
-            sorted_departments = sorted(all_departments)
-            
-            if not sorted_dates or not sorted_departments:
-                return
-                
-            # 创建月份列表（YYYY-MM格式）
-            months = set()
-            for date in sorted_dates:
-                month = datetime.strptime(date, "%Y-%m").strftime("%Y-%m")
-                months.add(month)
-            sorted_months = sorted(months)
-            
-            # 初始化科室-月份人数统计
-            dept_month_count = defaultdict(lambda: defaultdict(int))
-            
-            # 计算每个科室每个月的人数
-            for student_name, dates in self.scheduler.schedule.items():
-                if student_name in [s.name for s in students]:
-                    for date, dept in dates.items():
-                        if dept:  # 确保科室名不为空
-                            if "/" in dept:
-                                dept_list = dept.split("/")
-                                for dept in dept_list:
-                                    month = datetime.strptime(date, "%Y-%m").strftime("%Y-%m")
-                                    dept_month_count[dept][month] += 1
-                            else:
-                                month = datetime.strptime(date, "%Y-%m").strftime("%Y-%m")
-                                dept_month_count[dept][month] += 1
-            
-            # 找出最大人数，用于颜色梯度计算
-            max_count = 1
-            for dept, months_data in dept_month_count.items():
-                for month, count in months_data.items():
-                    max_count = max(max_count, count)
-            
-            # 设置表格
-            self.dept_month_table.setRowCount(len(sorted_departments))
-            self.dept_month_table.setColumnCount(len(sorted_months))
-            
-            # 设置科室名称为垂直表头
-            self.dept_month_table.setVerticalHeaderLabels(sorted_departments)
-            
-            # 设置水平表头（月份）
-            self.dept_month_table.setHorizontalHeaderLabels(sorted_months)
-            
-            # 颜色分界阈值
-            threshold = 3
-            
-            # 定义颜色函数：人数≤3使用绿色系，>3使用橙色到红色系
-            def get_color_for_count(count):
-                if count == 0:
-                    return QColor(255, 255, 255)  # 白色(无人)
-                
-                # 返回颜色和是否需要使用白色文字
-                if count <= threshold:
-                    # 绿色系 - 从浅到深 (较少人数)
-                    # 255/255/255 到 120/255/120
-                    intensity = count / threshold  # 0到1之间
-                    r = int(255 - 135 * intensity)
-                    g = 255
-                    b = int(255 - 135 * intensity)
-                    return QColor(r, g, b), False  # 不需要白色文字
-                else:
-                    # 橙色到红色系 - 从浅到深 (较多人数)
-                    intensity = min((count - threshold) / (max_count - threshold), 1.0) if max_count > threshold else 0
-                    need_white_text = intensity > 0.3  # 当颜色较深时需要白色文字
-                    
-                    if intensity < 0.5:  # 橙色区间
-                        # 橙色从浅到深
-                        normalized = intensity * 2  # 0到1范围
-                        r = 255
-                        g = int(255 - 128 * normalized)
-                        b = 0
-                    else:  # 红色区间
-                        # 橙色过渡到红色
-                        normalized = (intensity - 0.5) * 2  # 0到1范围
-                        r = 255
-                        g = int(127 - 127 * normalized)
-                        b = 0
-                        
-                    return QColor(r, g, b), need_white_text
-            
-            # 填充数据
-            for row, dept in enumerate(sorted_departments):
-                # 各月份人数
-                for col, month in enumerate(sorted_months):
-                    count = dept_month_count[dept][month]
-                    item = QTableWidgetItem(str(count))
-                    
-                    # 根据人数设置背景颜色
-                    if count > 0:
-                        color, need_white_text = get_color_for_count(count)
-                        
-                        # 设置文本颜色
-                        if need_white_text:
-                            item.setForeground(QColor(255, 255, 255))  # 白色文字
-                        
-                        # 设置背景颜色
-                        item.setBackground(color)
-                    
-                    # 居中对齐
-                    item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                    self.dept_month_table.setItem(row, col, item)
-            
-            # 设置垂直表头自适应宽度
-            self.dept_month_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
-            # 确保垂直表头可见
-            self.dept_month_table.verticalHeader().setVisible(True)
-            
-            # 所有列宽都自适应内容
-            for i in range(len(sorted_months)):
-                self.dept_month_table.horizontalHeader().setSectionResizeMode(i, QHeaderView.ResizeMode.ResizeToContents)
-            
-            # 适当增加单元格间距
-            self.dept_month_table.setStyleSheet(self.dept_month_table.styleSheet() + """
-                QTableWidget::item {
-                    padding: 8px;
-                }
-            """)
-            
-            # 调整水平表头样式，使其更突出
-            self.dept_month_table.horizontalHeader().setStyleSheet("""
-                QHeaderView::section {
-                    background-color: #e0e0e0;
-                    padding: 8px;
-                    border: 1px solid #cccccc;
-                    font-weight: bold;
-                }
-            """)
-            
-            # 调整表格大小，使其适应内容
-            self.dept_month_table.resizeColumnsToContents()
-            self.dept_month_table.resizeRowsToContents()
+            self.dept_month_table.set_statistics_model(DepartmentMonthModel(
+                statistics, self.scheduler.get_schedule_index(grade), self.dept_month_table))
             
         except Exception as e:
             QMessageBox.critical(self, "错误", f"显示科室月份统计时发生错误: {str(e)}")
@@ -790,15 +845,87 @@ class RotationPage(QWidget):
                 import traceback
                 traceback.print_exc()
     
+    def _save_schedule(self):
+        """将当前排期保存到数据库"""
+        if self.database is None or self.scheduler is None:
+            return
+        try:
+            self.scheduler.save_to_database(self.database)
+        except Exception as e:
+            print(f"保存排期失败: {e}")
+    
+    @pyqtSlot(str)
+    def _load_saved_schedule(self, grade):
+        """载入数据库中保存的年级排期，学生名单有变化时在其上局部调整"""
+        if self.database is None or self._worker is not None:
+            return
+        if self.scheduler is not None and self.scheduler.grade == grade:
+            return
+        scheduler = RotationScheduler(self.student_page.get_student_manager(),
+                                      self.department_page.get_department_manager())
+        try:
+            if not scheduler.load_from_database(self.database, grade):
+                return
+        except Exception as e:
+            print(f"载入排期失败: {e}")
+            return
+        self.scheduler = scheduler
+        self.start_date_edit.setDate(QDate(scheduler.calendar.start_date))
+        self._display_schedule(grade)
+        self._display_dept_month_stats(grade)
+        self.export_button.setEnabled(True)
+        self._on_student_data_changed()
+    
+    @pyqtSlot()
+    def _on_student_data_changed(self):
+        """学生数据变化时，在已有排期上只调整受影响的学生，本月及之前的排期保持不变
+
+        调整包括局部搜索，在后台线程中进行，完成后显示结果；正在生成或调整排期时，结束后再调整。
+        """
+        if self._worker is not None:
+            self._repair_pending = True
+            return
+        if not self.scheduler or self.scheduler.store is None:
+            self._on_data_changed()
+            return
+        
+        try:
+            added, removed, changed = self.scheduler.diff_students()
+            if not (added or removed or changed):
+                return
+            frozen_before = QDate.currentDate().addMonths(1).toPyDate()
+            self._worker = ScheduleRepairWorker(self.scheduler, added, removed, changed, frozen_before, self)
+            self._worker.succeeded.connect(self._on_repair_succeeded)
+            self._worker.failed.connect(self._on_repair_failed)
+            self._worker.finished.connect(self._on_generate_finished)
+            self.generate_button.setEnabled(False)
+            self._worker.start()
+        except Exception:
+            import traceback
+            traceback.print_exc()
+            self._on_data_changed()
+    
+    @pyqtSlot(object)
+    def _on_repair_succeeded(self, scheduler):
+        """局部调整完成，换用调整后的调度器，之后与页面的学生和科室数据比较名单变化"""
+        scheduler.student_manager = self.student_page.get_student_manager()
+        scheduler.department_manager = self.department_page.get_department_manager()
+        self._on_generate_succeeded(scheduler)
+    
+    @pyqtSlot(str)
+    def _on_repair_failed(self, message):
+        """局部调整失败时放弃当前排期，需要重新生成"""
+        QMessageBox.warning(self, "提示", f"调整排期时发生错误: {message}\n请重新生成排期")
+        self._on_data_changed()
+    
     @pyqtSlot()
     def _on_data_changed(self):
         """数据变化时的处理"""
-        # 数据变化后，重置调度器
+        # 数据变化后，重置调度器，正在生成的排期基于旧数据，一并取消
         self.scheduler = None
+        self._cancel_generation()
         self.export_button.setEnabled(False)
         
         # 清空表格
-        self.schedule_table.setRowCount(0)
-        self.schedule_table.setColumnCount(0)
-        self.dept_month_table.setRowCount(0)
-        self.dept_month_table.setColumnCount(0) 
\ No newline at end of file
+        self.schedule_table.set_schedule_model(None)
+        self.dept_month_table.set_statistics_model(None) 
\ No newline at end of file
@@ -9,6 +9,7 @@ import os
 import sys
 from models.student import Student, StudentManager
 from models.department import DepartmentManager
+from utils.persistence import INTERACTIVE_SAVE_DELAY
 
 class StudentPage(QWidget):
     # 定义信号
@@ -18,7 +19,7 @@ class StudentPage(QWidget):
         super().__init__()
         
         # 初始化管理器
-        self.student_manager = StudentManager()
+        self.student_manager = StudentManager(save_delay=INTERACTIVE_SAVE_DELAY)
         self.department_manager = DepartmentManager()
         
         # 设置UI
@@ -478,13 +479,25 @@ class StudentPage(QWidget):
         
         if file_path:
             # 导入Excel
-            count = self.student_manager.import_from_excel(file_path)
+            try:
+                result = self.student_manager.import_students(file_path)
+            except Exception as e:
+                QMessageBox.warning(self, "导入失败", f"读取Excel失败: {str(e)}")
+                return
+            count = result.count
+            
+            # 列出前几行跳过的原因
+            skipped_text = ""
+            if result.skipped:
+                details = "\n".join(f"第{row}行: {reason}" for row, reason in result.skipped[:10])
+                more = f"\n……共{len(result.skipped)}行" if len(result.skipped) > 10 else ""
+                skipped_text = f"\n\n跳过{len(result.skipped)}行:\n{details}{more}"
             
             if count > 0:
                 QMessageBox.information(
                     self,
                     "导入成功",
-                    f"成功导入{count}名学生"
+                    f"成功导入{count}名学生{skipped_text}"
                 )
                 
                 # 刷新表格
@@ -496,7 +509,7 @@ class StudentPage(QWidget):
                 QMessageBox.warning(
                     self,
                     "导入失败",
-                    "未能导入任何学生，请检查Excel文件格式"
+                    f"未能导入任何学生，请检查Excel文件格式{skipped_text}"
                 )
     
     def _on_student_selected(self):
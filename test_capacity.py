@@ -0,0 +1,172 @@
+#-*- coding: utf-8 -*-
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime
+
+import numpy as np
+
+from models.capacity import CapacityError, LIMIT_MINIMUM, UNLIMITED, capacity_limits
+from models.student import Student, StudentManager
+from models.department import Department, DepartmentManager
+from models.rotation import RotationScheduler
+from models.schedule_validator import RULE_CAPACITY
+from utils.database import Database
+from utils.month_calendar import MonthCalendar
+
+
+def _make_students(count, grade="2023级"):
+    return [Student(f"学生{i}", ["心内科", "消化科", "呼吸内科"][i % 3], grade, "住院医师", "专科培训")
+            for i in range(count)]
+
+
+class TestCapacitySettings(unittest.TestCase):
+    """测试科室人数限制的保存和月份矩阵"""
+
+    def test_limits_matrix(self):
+        """默认人数适用于所有月份，按月份设置的人数覆盖默认值，都没有设置时返回None"""
+        calendar = MonthCalendar(datetime(2024, 9, 1), 3)
+        departments = [Department("心内科", "心内科", 1, 1.0),
+                       Department("消化科", "消化科", 1, 1.0, min_capacity=1, max_capacity=4,
+                                  monthly_capacity={"2024-10": [None, 2], "2025-05": [3, 3]})]
+        self.assertIsNone(capacity_limits(departments[:1], calendar, 3))
+        limits = capacity_limits(departments, calendar, 3)
+        np.testing.assert_array_equal(limits.maximum, [[UNLIMITED, 4], [UNLIMITED, 2], [UNLIMITED, 4]])
+        np.testing.assert_array_equal(limits.minimum, [[0, 1], [0, 1], [0, 1]])
+        self.assertEqual(departments[1].get_capacity("2024-10"), (1, 2))
+
+    def test_database_migration(self):
+        """旧版本创建的科室表自动添加人数列，已有科室没有人数限制"""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        path = os.path.join(temp_dir.name, "lunzhan.db")
+        connection = sqlite3.connect(path)
+        connection.execute("CREATE TABLE departments (seq INTEGER PRIMARY KEY, name TEXT NOT NULL, "
+                           "specialty TEXT NOT NULL, rotation_times INTEGER NOT NULL, "
+                           "months_per_rotation TEXT NOT NULL, is_later_rotation INTEGER NOT NULL)")
+        connection.execute("INSERT INTO departments VALUES (0, '急诊科', '急诊科', 1, '[3.0]', 0)")
+        connection.commit()
+        connection.close()
+
+        manager = DepartmentManager(os.path.join(os.path.dirname(path), "departments.json"), database_file=path)
+        self.assertEqual([d.name for d in manager.get_departments()], ["急诊科"])
+        self.assertFalse(manager.get_departments()[0].has_capacity_limits())
+        manager.update_department(0, Department("急诊科", "急诊科", 1, 3.0, max_capacity=5,
+                                                monthly_capacity={"2024-09": [2, None]}))
+        record = Database(path).load("departments")[0]
+        self.assertEqual((record["max_capacity"], record["monthly_capacity"]), (5, {"2024-09": [2, None]}))
+
+
+class TestCapacityScheduling(unittest.TestCase):
+    """测试排期时严格遵守人数上限，以及排期前的容量检查"""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        directory = temp_dir.name
+        self.student_manager = StudentManager(os.path.join(directory, "students.json"))
+        self.student_manager.students = _make_students(30)
+        self.department_manager = DepartmentManager(os.path.join(directory, "departments.json"))
+
+    def _set_max(self, maximum, **monthly):
+        with self.department_manager.batch():
+            for index, dept in enumerate(self.department_manager.get_departments()):
+                data = dept.to_dict()
+                data["max_capacity"] = maximum
+                data["monthly_capacity"] = monthly.get(dept.name, {})
+                self.department_manager.update_department(index, Department.from_dict(data))
+
+    def _set_limits(self, name, **fields):
+        """修改一个科室的人数设置"""
+        index = [dept.name for dept in self.department_manager.get_departments()].index(name)
+        data = self.department_manager.get_departments()[index].to_dict()
+        data.update(fields)
+        self.department_manager.update_department(index, Department.from_dict(data))
+
+    def test_bottlenecks(self):
+        """容量不足时不排期，直接报告瓶颈专业及其科室"""
+        self._set_max(2)
+        scheduler = RotationScheduler(self.student_manager, self.department_manager)
+        with self.assertRaises(CapacityError) as context:
+            scheduler.generate_schedule(datetime(2023, 9, 1), "2023级")
+        specialties = [b.specialty for b in context.exception.bottlenecks]
+        self.assertIn("急诊科", specialties)
+        self.assertIn("心内一科", str(context.exception))
+        self.assertIsNone(scheduler.store)
+
+    def test_max_enforced(self):
+        """贪心排期、随机重启和局部搜索后各科室每月人数都不超过上限"""
+        self._set_max(4, 消化科={"2024-01": [None, 1]})
+        scheduler = RotationScheduler(self.student_manager, self.department_manager)
+        self.assertEqual(scheduler.check_capacity(datetime(2023, 9, 1), "2023级"), [])
+        for kwargs in ({}, {"restarts": 2, "seed": 1, "workers": 1, "optimize_iterations": 20000}):
+            scheduler.generate_schedule(datetime(2023, 9, 1), "2023级", **kwargs)
+            occupancy = scheduler.store.occupancy()
+            self.assertTrue((occupancy <= scheduler.capacity.maximum).all())
+            self.assertLessEqual(occupancy[4, scheduler.department_index["消化科"]], 1)
+            np.testing.assert_array_equal(scheduler.department_counts, occupancy)
+
+    def test_unmet_minimum(self):
+        """最少人数超过学生能提供的人月数，或后期轮转科室一年内有最少人数时，排期前报告"""
+        self._set_limits("消化科", min_capacity=20)
+        self._set_limits("急诊科", is_later_rotation=True, monthly_capacity={"2023-10": [1, None]})
+        scheduler = RotationScheduler(self.student_manager, self.department_manager)
+        with self.assertRaises(CapacityError) as context:
+            scheduler.generate_schedule(datetime(2023, 9, 1), "2023级")
+        bottlenecks = {b.departments[0]: b for b in context.exception.bottlenecks}
+        self.assertEqual(set(bottlenecks), {"消化科", "急诊科"})
+        self.assertTrue(all(b.kind == LIMIT_MINIMUM for b in bottlenecks.values()))
+        self.assertEqual((bottlenecks["急诊科"].period, bottlenecks["急诊科"].demand), ("一年内", 1))
+        self.assertIn("最少人数", str(context.exception))
+
+    def test_minimum_kept_by_optimizer(self):
+        """局部搜索不会使科室人数低于最少人数：优化后人数不足的月份不多于贪心排期"""
+        months = {f"{year}-{month:02d}": [2, None] for year, month in ((2023, 11), (2023, 12), (2024, 1), (2024, 2))}
+        for name in ("消化科", "肾内科", "血液科"):
+            self._set_limits(name, monthly_capacity=months)
+        scheduler = RotationScheduler(self.student_manager, self.department_manager)
+        self.assertEqual(scheduler.check_capacity(datetime(2023, 9, 1), "2023级"), [])
+        scheduler.generate_schedule(datetime(2023, 9, 1), "2023级", balance_siblings=False)
+        greedy = set(v.month + v.detail for v in scheduler.validate().by_rule(RULE_CAPACITY))
+        scheduler.optimize_schedule(0, max_iterations=20000, seed=1)
+        optimized = set(v.month + v.detail for v in scheduler.validate().by_rule(RULE_CAPACITY))
+        self.assertLessEqual(optimized, greedy)
+
+    def test_validate_capacity(self):
+        """检查报告列出有学生轮转的月份中超过最多人数和少于最少人数的科室"""
+        scheduler = RotationScheduler(self.student_manager, self.department_manager)
+        scheduler.generate_schedule(datetime(2023, 9, 1), "2023级")
+        self.assertEqual(scheduler.validate().by_rule(RULE_CAPACITY), [])
+        occupancy = scheduler.store.occupancy()
+        column = scheduler.department_index["消化科"]
+        month = int(np.argmax(occupancy[:, column]))
+        count = int(occupancy[month, column])
+        key = scheduler.calendar.key(month)
+        self._set_limits("消化科", monthly_capacity={key: [None, count - 1]})
+        self._set_limits("肾内科", min_capacity=40)
+        violations = scheduler.validate().by_rule(RULE_CAPACITY)
+        self.assertIn((key, f"消化科有{count}人，超过最多人数{count - 1}人"), [(v.month, v.detail) for v in violations])
+        understaffed = [v for v in violations if v.detail.startswith("肾内科")]
+        self.assertEqual(len(understaffed), len(scheduler.store.used_months()))
+        self.assertTrue(all(v.detail.endswith("少于最少人数40人") for v in understaffed))
+
+    def test_saved_schedule_without_capacity_fields(self):
+        """旧版本保存的排期中科室信息没有人数字段，仍可载入"""
+        scheduler = RotationScheduler(self.student_manager, self.department_manager)
+        scheduler.generate_schedule(datetime(2023, 9, 1), "2023级")
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        database = Database(os.path.join(temp_dir.name, "lunzhan.db"))
+        scheduler.save_to_database(database)
+        state, data = database.load_schedule("2023级")
+        for dept in state["departments"]:
+            for key in ("min_capacity", "max_capacity", "monthly_capacity"):
+                del dept[key]
+        database.save_schedule("2023级", state, data)
+        self.assertTrue(RotationScheduler(self.student_manager, self.department_manager)
+                        .load_from_database(database, "2023级"))
+
+
+if __name__ == "__main__":
+    unittest.main()
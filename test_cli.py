@@ -0,0 +1,132 @@
+#-*- coding: utf-8 -*-
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+
+from openpyxl import load_workbook
+
+import lunzhan
+from models.department import Department, DepartmentManager
+from models.rotation import RotationScheduler
+from models.schedule_validator import RULE_SPREAD
+from models.student import Student, StudentManager
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestScheduleCommand(unittest.TestCase):
+    """测试命令行批量排期"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.student_file = os.path.join(self.directory, "students.json")
+        self.department_file = os.path.join(self.directory, "departments.json")
+        manager = StudentManager(self.student_file)
+        with manager.batch():
+            for i in range(6):
+                manager.add_student(Student(f"学生{i}", ["心内科", "消化科"][i % 2], "2023级", "住院医师", "专科培训"))
+            # 只有一个学生的年级所有轮转都能排完
+            manager.add_student(Student("学生6", "心内科", "2022级", "住院医师", "专科培训"))
+
+    def _run(self, out, *grades, extra=()):
+        return lunzhan.main(["schedule", "--grade", *grades, "--start", "2023-09", "--out", out,
+                             "--students", self.student_file, "--departments", self.department_file, *extra])
+
+    def test_json_and_exit_code(self):
+        """多个年级分别输出，有未完成轮转或没有学生的年级返回违规退出码"""
+        out = os.path.join(self.directory, "out", "{grade}.json")
+        self.assertEqual(self._run(out, "2022级"), lunzhan.EXIT_OK)
+        with open(out.format(grade="2022级"), encoding="utf-8") as f:
+            data = json.load(f)
+        self.assertEqual(data["start"], "2023-09")
+        self.assertEqual(list(data["schedule"]), ["学生6"])
+        self.assertEqual(data["violations"], [])
+
+        scheduler = RotationScheduler(StudentManager(self.student_file), DepartmentManager(self.department_file))
+        scheduler.generate_schedule(datetime(2023, 9, 1), "2023级")
+        expected = lunzhan.EXIT_VIOLATIONS if scheduler.unfinished_rotations else lunzhan.EXIT_OK
+        self.assertEqual(self._run(out, "2023级"), expected)
+        with open(out.format(grade="2023级"), encoding="utf-8") as f:
+            data = json.load(f)
+        self.assertEqual(data["schedule"], scheduler.schedule)
+        self.assertEqual(sorted({v["student"] for v in data["violations"]}), sorted(scheduler.unfinished_rotations))
+
+        self.assertEqual(self._run(out, "2022级", "2024级"), lunzhan.EXIT_VIOLATIONS)
+        with open(out.format(grade="2024级"), encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["violations"][0]["rule"], "没有学生")
+
+    def test_validate(self):
+        """--validate 输出排期检查的完整报告，违规记录带规则和月份"""
+        out = os.path.join(self.directory, "{grade}.json")
+        self.assertEqual(self._run(out, "2022级", extra=["--validate"]), lunzhan.EXIT_OK)
+        scheduler = RotationScheduler(StudentManager(self.student_file), DepartmentManager(self.department_file))
+        scheduler.generate_schedule(datetime(2023, 9, 1), "2023级")
+        report = scheduler.validate()
+        failed = any(violation.rule not in lunzhan.WARNING_RULES for violation in report.violations)
+        self.assertEqual(self._run(out, "2023级", extra=["--validate"]),
+                         lunzhan.EXIT_VIOLATIONS if failed else lunzhan.EXIT_OK)
+        with open(out.format(grade="2023级"), encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["violations"], report.to_dicts())
+
+    def test_validate_spread_warning(self):
+        """只有科室人数不均衡时 --validate 仍返回0并输出警告，--fail-on-spread 时返回违规退出码"""
+        manager = DepartmentManager(self.department_file)
+        with manager.batch():
+            while manager.get_departments():
+                manager.remove_department(0)
+            for name in "甲乙丙丁戊己":
+                manager.add_department(Department(f"{name}科", name, 1, 2.0))
+        students = StudentManager(self.student_file)
+        with students.batch():
+            for i in range(6):
+                students.update_student(i, Student(f"学生{i}", "甲乙"[i % 2], "2023级", "住院医师", "专科培训"))
+        out = os.path.join(self.directory, "{grade}.json")
+        self.assertEqual(self._run(out, "2023级", extra=["--validate"]), lunzhan.EXIT_OK)
+        with open(out.format(grade="2023级"), encoding="utf-8") as f:
+            violations = json.load(f)["violations"]
+        self.assertTrue(violations)
+        self.assertEqual({violation["rule"] for violation in violations}, {RULE_SPREAD})
+        self.assertEqual(self._run(out, "2023级", extra=["--validate", "--fail-on-spread"]),
+                         lunzhan.EXIT_VIOLATIONS)
+
+    def test_csv_and_xlsx(self):
+        self._run(os.path.join(self.directory, "排期.csv"), "2023级")
+        with open(os.path.join(self.directory, "排期.csv"), encoding="utf-8-sig") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0][:5], ["姓名", "科室", "年级", "职位", "2023-09"])
+        self.assertEqual(len(rows), 7)
+
+        path = os.path.join(self.directory, "排期.dat")
+        self.assertEqual(self._run(path, "2022级"), lunzhan.EXIT_ERROR)
+        self.assertEqual(self._run(path, "2022级", extra=["--format", "xlsx"]), lunzhan.EXIT_OK)
+        with open(path, "rb") as f:
+            self.assertEqual(load_workbook(f).sheetnames[0], "轮转排期")
+
+    def test_joint(self):
+        """联合排期时各年级可以有不同的开始月份，没有开始月份时返回错误"""
+        out = os.path.join(self.directory, "{grade}.json")
+        self.assertEqual(lunzhan.main(["schedule", "--grade", "2022级=2022-09", "2023级", "--joint",
+                                       "--out", out, "--students", self.student_file,
+                                       "--departments", self.department_file]), lunzhan.EXIT_ERROR)
+        self._run(out, "2022级=2022-09", "2023级", extra=["--joint"])
+        with open(out.format(grade="2022级"), encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["start"], "2022-09")
+        with open(out.format(grade="2023级"), encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["start"], "2023-09")
+
+    def test_no_gui_imports(self):
+        code = "import sys, lunzhan; print([m for m in ('PyQt6', 'pandas') if m in sys.modules])"
+        output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True,
+                                capture_output=True, text=True).stdout.strip()
+        self.assertEqual(output, "[]")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+#-*- coding: utf-8 -*-
+import json
+import os
+import pickle
+import tempfile
+import unittest
+from unittest import mock
+from datetime import datetime
+
+from models.student import Student, StudentManager
+from models.department import Department, DepartmentManager
+from models.rotation import RotationScheduler
+from utils.database import DATABASE_ENV, Database
+
+
+def _make_student(i, grade="2023级"):
+    return Student(f"学生{i}", ["心内科", "消化科", "呼吸内科"][i % 3], grade, "住院医师",
+                   "社会培训" if i % 4 == 0 else "专科培训", ["感染科", "风湿科"] if i % 4 == 0 else [])
+
+
+class TestDatabaseManagers(unittest.TestCase):
+    """测试使用SQLite数据库保存学生和科室数据"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.database_file = os.path.join(self.directory, "lunzhan.db")
+        self.student_file = os.path.join(self.directory, "students.json")
+        self.department_file = os.path.join(self.directory, "departments.json")
+
+    def _students(self):
+        return StudentManager(self.student_file, database_file=self.database_file)
+
+    def test_student_changes(self):
+        """测试增删改后重新打开数据一致，不写JSON文件"""
+        manager = self._students()
+        for i in range(6):
+            manager.add_student(_make_student(i, "2023级" if i % 2 else "2024级"))
+        manager.update_student(1, _make_student(10, "2024级"))
+        manager.remove_student(0)
+        manager.remove_student(3)
+
+        reopened = self._students()
+        self.assertEqual([s.to_dict() for s in reopened.get_students()],
+                         [s.to_dict() for s in manager.get_students()])
+        self.assertEqual([s.name for s in reopened.get_students_by_grade("2024级")], ["学生10", "学生2"])
+        self.assertEqual([s.name for s in reopened.get_students_by_grade("2023级")], ["学生3", "学生5"])
+        self.assertFalse(os.path.exists(self.student_file))
+
+    def test_batch_rollback(self):
+        manager = self._students()
+        manager.add_student(_make_student(0))
+        with self.assertRaises(ValueError):
+            with manager.batch():
+                manager.add_student(_make_student(1))
+                raise ValueError("导入失败")
+        self.assertEqual(len(self._students().get_students()), 1)
+
+    def test_import_json(self):
+        """测试数据库为空时导入已有的JSON数据"""
+        with open(self.student_file, "w", encoding="utf-8") as f:
+            json.dump([_make_student(i).to_dict() for i in range(3)], f, ensure_ascii=False)
+        self.assertEqual(len(self._students().get_students()), 3)
+        os.remove(self.student_file)
+        self.assertEqual(len(self._students().get_students()), 3)
+
+    def test_departments(self):
+        """测试默认科室一次写入数据库，布尔和列表字段还原"""
+        manager = DepartmentManager(self.department_file, database_file=self.database_file)
+        manager.add_department(Department("心内三科", "心内科", 2, [1.5, 1.0], True))
+        reopened = DepartmentManager(self.department_file, database_file=self.database_file)
+        self.assertEqual([d.to_dict() for d in reopened.get_departments()],
+                         [d.to_dict() for d in manager.get_departments()])
+        self.assertIs(reopened.get_department("心内三科").is_later_rotation, True)
+        self.assertFalse(os.path.exists(self.department_file))
+
+    def test_environment_database(self):
+        """测试环境变量指定的数据库只在未指定数据文件和数据库时使用"""
+        with mock.patch.dict(os.environ, {DATABASE_ENV: self.database_file}):
+            manager = StudentManager(self.student_file)
+            manager.add_student(_make_student(0))
+            departments = DepartmentManager(self.department_file)
+            self.assertEqual(StudentManager().database_file, self.database_file)
+        self.assertIsNone(manager.database_file)
+        self.assertIsNone(departments.database_file)
+        self.assertTrue(os.path.exists(self.student_file))
+        self.assertTrue(os.path.exists(self.department_file))
+        self.assertEqual(Database(self.database_file).load("departments"), [])
+
+    def test_pickle(self):
+        manager = self._students()
+        manager.add_student(_make_student(0))
+        copied = pickle.loads(pickle.dumps(manager))
+        self.assertEqual([s.name for s in copied.get_students_by_grade("2023级")], ["学生0"])
+
+
+class TestScheduleDatabase(unittest.TestCase):
+    """测试排期结果保存到数据库后还原"""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        directory = temp_dir.name
+        self.database = Database(os.path.join(directory, "lunzhan.db"))
+        self.student_manager = StudentManager(os.path.join(directory, "students.json"))
+        self.student_manager.students = [_make_student(i) for i in range(10)]
+        self.department_manager = DepartmentManager(os.path.join(directory, "departments.json"))
+
+    def test_round_trip(self):
+        scheduler = RotationScheduler(self.student_manager, self.department_manager)
+        scheduler.generate_schedule(datetime(2023, 9, 1), "2023级")
+        scheduler.save_to_database(self.database)
+
+        loaded = RotationScheduler(self.student_manager, self.department_manager)
+        self.assertTrue(loaded.load_from_database(self.database, "2023级"))
+        self.assertEqual(loaded.schedule, scheduler.schedule)
+        self.assertEqual(loaded.balance_score(), scheduler.balance_score())
+        self.assertEqual(loaded.diff_students(), ([], [], []))
+        self.assertFalse(loaded.load_from_database(self.database, "2024级"))
+
+    def test_departments_changed(self):
+        """科室配置变化后不载入旧排期"""
+        scheduler = RotationScheduler(self.student_manager, self.department_manager)
+        scheduler.generate_schedule(datetime(2023, 9, 1), "2023级")
+        scheduler.save_to_database(self.database)
+        self.department_manager.update_department(0, Department("心内一科", "心内科", 2, [2.0, 2.0]))
+        loaded = RotationScheduler(self.student_manager, self.department_manager)
+        self.assertFalse(loaded.load_from_database(self.database, "2023级"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+#-*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+
+from models.department import Department, DepartmentManager
+
+
+class TestDepartmentManagerIndexes(unittest.TestCase):
+    """测试科室按名称、专业索引在增删改后保持一致"""
+
+    def setUp(self):
+        self.manager = DepartmentManager()
+        # 只在内存中修改科室数据，不写入数据文件
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.manager.data_file = os.path.join(temp_dir.name, "departments.json")
+
+    def _assert_indexes_consistent(self):
+        departments = self.manager.get_departments()
+        for dept in departments:
+            self.assertIs(self.manager.get_department(dept.name), dept)
+        for specialty in self.manager.get_specialties():
+            expected = [dept for dept in departments if dept.specialty == specialty]
+            self.assertEqual(self.manager.get_departments_by_specialty(specialty), expected)
+        self.assertEqual(set(self.manager.get_specialties()), {dept.specialty for dept in departments})
+
+    def test_add_update_remove(self):
+        """测试增删改科室后索引更新，版本号递增"""
+        self._assert_indexes_consistent()
+        version = self.manager.version
+
+        self.manager.add_department(Department("心内三科", "心内科", 1, 1.0))
+        self.assertGreater(self.manager.version, version)
+        self.assertIn("心内三科", [dept.name for dept in self.manager.get_departments_by_specialty("心内科")])
+        self._assert_indexes_consistent()
+
+        version = self.manager.version
+        index = [dept.name for dept in self.manager.get_departments()].index("心内三科")
+        self.manager.update_department(index, Department("心内三科", "老年病科", 1, 1.0))
+        self.assertGreater(self.manager.version, version)
+        self.assertEqual(self.manager.get_department("心内三科").specialty, "老年病科")
+        self._assert_indexes_consistent()
+
+        version = self.manager.version
+        self.manager.remove_department(index)
+        self.assertGreater(self.manager.version, version)
+        self.assertIsNone(self.manager.get_department("心内三科"))
+        self._assert_indexes_consistent()
+
+    def test_unknown_specialty(self):
+        """测试查询不存在的专业返回空列表"""
+        self.assertEqual(self.manager.get_departments_by_specialty("不存在的专业"), [])
+        self.assertIsNone(self.manager.get_department("不存在的科室"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+#-*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+
+from openpyxl import Workbook
+
+from models.student import Student, StudentManager
+
+
+class TestExcelImport(unittest.TestCase):
+    """测试从Excel流式导入学生"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.manager = StudentManager(os.path.join(self.directory, "students.json"))
+        self.manager.add_student(Student("已有学生", "心内科", "2023级", "住院医师", "专科培训"))
+
+    def _write(self, rows):
+        path = os.path.join(self.directory, "import.xlsx")
+        workbook = Workbook()
+        for row in rows:
+            workbook.active.append(row)
+        workbook.save(path)
+        return path
+
+    def test_import(self):
+        path = self._write([
+            ["年级", "姓名", "专业", "职位", "培训方式", "自选专业", "备注"],
+            [2023, "学生1", "消化科", "研究生", None, None, "x"],
+            ["2023级", "学生2", "心内科", "住院医师", "社会培训", "感染科、风湿科", None],
+            [None, None, None, None, None, None, None],
+            ["2023级", "学生1", "消化科", "研究生", None, None, None],
+            ["2023级", "已有学生", "消化科", "研究生", None, None, None],
+            ["2023级", "学生3", None, "研究生", None, None, None],
+            ["2023级", "学生4", "消化科", "研究生", "社会培训", "感染科", None],
+            ["2023级", "学生5", "消化科", "研究生", "进修", None, None],
+        ])
+        result = self.manager.import_students(path)
+        self.assertEqual([s.name for s in result.students], ["学生1", "学生2"])
+        self.assertEqual(result.students[0].grade, "2023")
+        self.assertEqual(result.students[0].training_type, "专科培训")
+        self.assertEqual(result.students[1].self_selected_specialties, ["感染科", "风湿科"])
+        self.assertEqual([row for row, _ in result.skipped], [5, 6, 7, 8, 9])
+        self.assertEqual(self.manager._writer.write_count, 2)
+
+        reloaded = StudentManager(self.manager.data_file)
+        self.assertEqual([s.name for s in reloaded.get_students()], ["已有学生", "学生1", "学生2"])
+
+    def test_custom_columns(self):
+        path = self._write([["学生姓名", "科室", "年级"], ["学生1", "消化科", "2024级"]])
+        with self.assertRaises(ValueError):
+            self.manager.import_students(path)
+        self.assertEqual(self.manager.import_from_excel(path), 0)
+        columns = {"name": ("学生姓名",), "specialty": ("科室",), "grade": ("年级",)}
+        self.assertEqual(self.manager.import_students(path, columns).count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
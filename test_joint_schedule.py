@@ -0,0 +1,95 @@
+#-*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+import numpy as np
+
+from models.student import Student, StudentManager
+from models.department import DepartmentManager
+from models.joint_schedule import JointScheduler
+from models.rotation import RotationScheduler, aligned_occupancy
+from models.schedule_store import ScheduleStore
+from utils.database import Database
+from utils.month_calendar import MonthCalendar
+
+SPECIALTIES = ["心内科", "消化科", "呼吸内科", "急诊科", "肾内科"]
+COHORTS = [("2023级", datetime(2023, 9, 1)), ("2024级", datetime(2024, 9, 1))]
+
+
+class TestAlignedOccupancy(unittest.TestCase):
+    def test_offsets_and_columns(self):
+        """不同开始月份的排期按实际月份对齐，按科室名对应列"""
+        first = ScheduleStore(["甲"], ["心内科", "消化科"], MonthCalendar(datetime(2024, 9, 1), 2))
+        first.assign_month(0, 0, 0)
+        first.assign_half(0, 1, 0, 1)
+        second = ScheduleStore(["乙"], ["消化科", "眼科"], MonthCalendar(datetime(2024, 10, 1), 2))
+        second.assign_month(0, 0, 0)
+        second.assign_month(0, 1, 1)
+        calendar = MonthCalendar(datetime(2024, 8, 1), 3)
+        counts = aligned_occupancy([first, second], calendar, 3, ["消化科", "心内科"])
+        np.testing.assert_array_equal(counts, [[0, 0], [0, 1], [2, 0]])
+        slots = aligned_occupancy([first], calendar, 3, ["消化科", "心内科"], half_slots=True)
+        np.testing.assert_array_equal(slots[:, 0], [0, 0, 0, 0, 1, 0])
+
+
+class TestJointScheduler(unittest.TestCase):
+    """测试多个年级共用科室人数的联合排期"""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        directory = temp_dir.name
+        self.student_manager = StudentManager(os.path.join(directory, "students.json"))
+        self.student_manager.students = [
+            Student(f"{grade}学生{i}", SPECIALTIES[i % 5], grade, "住院医师", "专科培训")
+            for grade, _ in COHORTS for i in range(40)]
+        self.department_manager = DepartmentManager(os.path.join(directory, "departments.json"))
+        self.database = Database(os.path.join(directory, "lunzhan.db"))
+
+    def _separate(self):
+        """各年级分别排期后的合计人数"""
+        joint = JointScheduler(self.student_manager, self.department_manager)
+        for grade, start_date in COHORTS:
+            scheduler = RotationScheduler(self.student_manager, self.department_manager)
+            scheduler.generate_schedule(start_date, grade)
+            joint.add_background(grade, scheduler.store)
+        return joint.combined_occupancy()[1]
+
+    def test_joint_balances_combined_load(self):
+        """联合排期的合计人数更均衡，各年级的轮转内容不变"""
+        separate = self._separate()
+        joint = JointScheduler(self.student_manager, self.department_manager)
+        schedulers = joint.generate(COHORTS)
+        calendar, combined = joint.combined_occupancy()
+        self.assertEqual(calendar.key(0), "2023-09")
+        self.assertEqual(combined.sum(), separate.sum())
+        # 比较两个年级重叠的月份
+        overlap = slice(12, 36)
+        self.assertLess((combined[overlap] ** 2).sum(), (separate[overlap] ** 2).sum())
+        self.assertLessEqual(combined[overlap].max(), separate[overlap].max())
+        # 每个调度器的月度人数包括其他年级
+        later = schedulers["2024级"]
+        np.testing.assert_array_equal(later.department_counts, combined[12:12 + later.store.months])
+
+    def test_background_from_database(self):
+        """之前保存的年级作为固定人数，不被修改"""
+        earlier = RotationScheduler(self.student_manager, self.department_manager)
+        earlier.generate_schedule(datetime(2023, 9, 1), "2023级")
+        earlier.save_to_database(self.database)
+        codes = earlier.store.codes.copy()
+
+        joint = JointScheduler(self.student_manager, self.department_manager)
+        self.assertEqual(joint.load_background(self.database, ["2023级", "2022级"]), ["2023级"])
+        joint.generate(COHORTS[1:], optimize_iterations=2000)
+        np.testing.assert_array_equal(joint.background["2023级"].codes, codes)
+        background = aligned_occupancy([earlier.store], joint.schedulers["2024级"].calendar,
+                                       joint.schedulers["2024级"].store.months,
+                                       joint.schedulers["2024级"].department_names)
+        np.testing.assert_array_equal(joint.schedulers["2024级"].department_counts,
+                                      joint.schedulers["2024级"].store.occupancy() + background)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+#-*- coding: utf-8 -*-
+import unittest
+import numpy as np
+from datetime import datetime
+
+from models.optimizer import LocalSearchOptimizer
+from models.schedule_store import ScheduleStore, FLAG_OUTPATIENT
+from utils.month_calendar import MonthCalendar
+
+
+class TestLocalSearchOptimizer(unittest.TestCase):
+    """测试局部搜索优化在均衡人数的同时遵守排期规则"""
+
+    def setUp(self):
+        # 科室0-3各属不同专业，科室3为后期轮转
+        self.departments = ["甲科", "乙科", "丙科", "丁科"]
+        self.specialties = [0, 1, 2, 3]
+        self.later = [False, False, False, True]
+        calendar = MonthCalendar(datetime(2024, 9, 1), 16)
+        self.store = ScheduleStore([f"学生{i}" for i in range(6)], self.departments, calendar)
+        # 所有学生按相同顺序轮转，人数集中在同一科室
+        for row in range(6):
+            for month, dept in enumerate([0, 0, 1, 1, 2, 2, 0, 1, 2, 0, 1, 2]):
+                self.store.assign_month(row, month, dept)
+            for month in range(12, 16):
+                self.store.assign_month(row, month, 3, FLAG_OUTPATIENT if month >= 14 else 0)
+
+    def _optimize(self, iterations=2000):
+        optimizer = LocalSearchOptimizer(self.store, self.specialties, self.later, later_start_month=12, seed=1)
+        before = optimizer.objective()
+        improvement = optimizer.optimize(time_budget=5, max_iterations=iterations)
+        return optimizer, before, improvement
+
+    def test_objective_improves(self):
+        """测试目标函数减少且增量计算与重新计算一致"""
+        totals_before = [np.bincount(row, minlength=4).tolist() for row in self.store.codes]
+        optimizer, before, improvement = self._optimize()
+        self.assertGreater(improvement, 0)
+        self.assertEqual(optimizer.objective(), before - improvement)
+        rebuilt = LocalSearchOptimizer(self.store, self.specialties, self.later)
+        self.assertEqual(rebuilt.objective(), optimizer.objective())
+        # 每个学生各科室轮转月数不变
+        totals_after = [np.bincount(row, minlength=4).tolist() for row in self.store.codes]
+        self.assertEqual(totals_before, totals_after)
+
+    def test_rules_respected(self):
+        """测试后期轮转仍在一年后，且同一专业不前后相连"""
+        self._optimize()
+        codes = self.store.codes
+        self.assertTrue((codes[:, :24] != 3).all())
+        specialties = np.array(self.specialties)[codes]
+        same = (specialties[:, 1:] == specialties[:, :-1]) & (codes[:, 1:] != codes[:, :-1])
+        self.assertFalse(same.any())
+
+    def test_deterministic_with_iterations(self):
+        """测试指定尝试次数时结果可复现"""
+        self._optimize(500)
+        first = self.store.codes.copy()
+        self.setUp()
+        self._optimize(500)
+        self.assertTrue((first == self.store.codes).all())
+
+    def test_separate_specialties(self):
+        """同专业前后相连的轮转段与等长的其他轮转段交换，后期轮转仍在一年后"""
+        # 学生0第4月丙科与第5月丙科门诊相连
+        self.store.assign_month(0, 5, 2, FLAG_OUTPATIENT)
+        totals = np.bincount(self.store.codes[0], minlength=4).tolist()
+        optimizer = LocalSearchOptimizer(self.store, self.specialties, self.later, later_start_month=12)
+        self.assertEqual(optimizer._adjacent_boundaries(0), [10, 28])
+        self.assertEqual(optimizer.separate_specialties([0]), 1)
+        # 丁科门诊只能与一年后的轮转段交换，无法分开
+        self.assertEqual(optimizer._adjacent_boundaries(0), [28])
+        later_slots = np.flatnonzero(self.store.codes[0] == 3)
+        self.assertTrue((later_slots >= 24).all())
+        self.assertEqual(np.bincount(self.store.codes[0], minlength=4).tolist(), totals)
+
+    def test_separate_specialties_move(self):
+        """相连的轮转段长度不同、没有可交换的等长轮转段时，移到其他整月处，中间的轮转段顺移"""
+        # 学生0第8-11月丙科之后紧接第12月丙科门诊，第13-15月丁科；门诊和丁科都不能提前到一年内
+        for month in range(8, 12):
+            self.store.assign_month(0, month, 2)
+        self.store.assign_month(0, 12, 2, FLAG_OUTPATIENT)
+        for month in range(13, 16):
+            self.store.assign_month(0, month, 3)
+        totals = np.bincount(self.store.codes[0], minlength=4).tolist()
+        optimizer = LocalSearchOptimizer(self.store, self.specialties, self.later, later_start_month=12)
+        blocks = len(optimizer._row_blocks(0))
+        self.assertEqual(optimizer._adjacent_boundaries(0), [24])
+        self.assertEqual(optimizer.separate_specialties([0]), 1)
+        self.assertEqual(optimizer._adjacent_boundaries(0), [])
+        self.assertEqual(optimizer.objective(), LocalSearchOptimizer(self.store, self.specialties, self.later).objective())
+        # 轮转内容不变，没有拼接同一科室的轮转段，门诊和后期轮转仍在一年后
+        self.assertEqual(np.bincount(self.store.codes[0], minlength=4).tolist(), totals)
+        self.assertEqual(len(optimizer._row_blocks(0)), blocks)
+        later = (self.store.codes[0] == 3) | (self.store.flags[0] == FLAG_OUTPATIENT)
+        self.assertEqual(later.sum(), 8)
+        self.assertTrue((np.flatnonzero(later) >= 24).all())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+#-*- coding: utf-8 -*-
+import json
+import os
+import pickle
+import tempfile
+import time
+import unittest
+
+from models.student import Student, StudentManager
+from models.department import Department, DepartmentManager
+from utils.persistence import JsonFileWriter, atomic_write_json
+
+
+def _make_student(i):
+    return Student(f"学生{i}", "心内科", "2023级", "住院医师", "专科培训")
+
+
+class TestAtomicWrite(unittest.TestCase):
+    """测试原子写入"""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.path = os.path.join(temp_dir.name, "data", "students.json")
+
+    def test_write_and_replace(self):
+        atomic_write_json(self.path, [1])
+        atomic_write_json(self.path, [1, 2])
+        with open(self.path, encoding="utf-8") as f:
+            self.assertEqual(json.load(f), [1, 2])
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ["students.json"])
+
+    def test_failed_write_keeps_file(self):
+        """序列化失败时原文件不变，不留下临时文件"""
+        atomic_write_json(self.path, ["原数据"])
+        with self.assertRaises(TypeError):
+            atomic_write_json(self.path, [object()])
+        with open(self.path, encoding="utf-8") as f:
+            self.assertEqual(json.load(f), ["原数据"])
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ["students.json"])
+
+
+class TestJsonFileWriter(unittest.TestCase):
+    """测试延迟写入合并多次提交"""
+
+    def test_debounce(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        path = os.path.join(temp_dir.name, "data.json")
+        writer = JsonFileWriter("测试数据", delay=0.05)
+        for i in range(10):
+            writer.submit(path, list(range(i + 1)))
+        self.assertFalse(os.path.exists(path))
+        deadline = time.time() + 5
+        while writer.has_pending() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(writer.flush())
+        self.assertEqual(writer.write_count, 1)
+        with open(path, encoding="utf-8") as f:
+            self.assertEqual(json.load(f), list(range(10)))
+
+
+class TestManagerBatch(unittest.TestCase):
+    """测试管理器批量修改只保存一次"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_default_departments_single_write(self):
+        manager = DepartmentManager(os.path.join(self.directory, "departments.json"))
+        self.assertEqual(manager._writer.write_count, 1)
+        self.assertEqual(len(DepartmentManager(manager.data_file).get_departments()), len(manager.get_departments()))
+
+    def test_student_batch(self):
+        manager = StudentManager(os.path.join(self.directory, "students.json"))
+        with manager.batch():
+            for i in range(50):
+                manager.add_student(_make_student(i))
+            manager.remove_student(0)
+            self.assertFalse(os.path.exists(manager.data_file))
+        self.assertEqual(manager._writer.write_count, 1)
+        self.assertEqual(len(StudentManager(manager.data_file).get_students()), 49)
+
+    def test_batch_rollback(self):
+        """批量修改出错时恢复数据，不保存"""
+        manager = DepartmentManager(os.path.join(self.directory, "departments.json"))
+        names = [dept.name for dept in manager.get_departments()]
+        version = manager.version
+        with self.assertRaises(ValueError):
+            with manager.batch():
+                manager.add_department(Department("心内三科", "心内科", 1, 1.0))
+                manager.remove_department(0)
+                raise ValueError("导入失败")
+        self.assertEqual([dept.name for dept in manager.get_departments()], names)
+        self.assertIsNone(manager.get_department("心内三科"))
+        self.assertGreater(manager.version, version)
+        self.assertEqual(manager._writer.write_count, 1)
+
+    def test_pickle(self):
+        manager = StudentManager(os.path.join(self.directory, "students.json"), save_delay=10)
+        manager.add_student(_make_student(0))
+        copied = pickle.loads(pickle.dumps(manager))
+        self.assertEqual([s.name for s in copied.get_students()], ["学生0"])
+        self.assertTrue(manager.flush())
+        self.assertEqual(len(StudentManager(manager.data_file).get_students()), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+#-*- coding: utf-8 -*-
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime
+
+from models.student import Student, StudentManager
+from models.department import DepartmentManager
+from models.rotation import RotationScheduler
+from utils.result_cache import ResultCache
+
+
+class TestResultCache(unittest.TestCase):
+    """测试磁盘缓存的读写和按最近使用时间淘汰"""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.directory = os.path.join(temp_dir.name, "cache")
+
+    def test_get_and_put(self):
+        cache = ResultCache(self.directory)
+        self.assertIsNone(cache.get("abc"))
+        cache.put("abc", b"123")
+        self.assertEqual(cache.get("abc"), b"123")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        with self.assertRaises(ValueError):
+            cache.get("../abc")
+
+    def test_evict_least_recently_used(self):
+        """超过大小上限时删除最久未使用的结果，读取过的结果保留"""
+        cache = ResultCache(self.directory, max_bytes=250)
+        for key in ("a", "b"):
+            cache.put(key, bytes(100))
+            time.sleep(0.01)
+        cache.get("a")
+        time.sleep(0.01)
+        cache.put("c", bytes(100))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertEqual((len(cache), cache.size()), (2, 200))
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+class TestScheduleResultCache(unittest.TestCase):
+    """测试排期结果缓存：输入相同时直接返回逐字节相同的排期，输入变化时重新排期"""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        directory = temp_dir.name
+        self.student_manager = StudentManager(os.path.join(directory, "students.json"))
+        self.student_manager.students = [
+            Student(f"学生{i}", ["心内科", "消化科", "呼吸内科"][i % 3], "2023级", "住院医师", "专科培训")
+            for i in range(12)
+        ]
+        self.department_manager = DepartmentManager(os.path.join(directory, "departments.json"))
+        self.cache = ResultCache(os.path.join(directory, "cache"))
+
+    def _generate(self, **kwargs):
+        scheduler = RotationScheduler(self.student_manager, self.department_manager)
+        scheduler.result_cache = self.cache
+        scheduler.generate_schedule(datetime(2023, 9, 1), "2023级", seed=3, optimize_iterations=2000, **kwargs)
+        return scheduler
+
+    def test_cache_hit(self):
+        first = self._generate()
+        self.assertFalse(first.cache_hit)
+        second = self._generate(workers=2)
+        self.assertTrue(second.cache_hit)
+        self.assertEqual(second.last_cache_key, first.last_cache_key)
+        self.assertEqual(second.store.to_bytes(), first.store.to_bytes())
+        self.assertEqual(second.unfinished_rotations, first.unfinished_rotations)
+        self.assertEqual(second.grade, "2023级")
+        self.assertEqual(second.schedule, first.schedule)
+
+    def test_reproducible_without_cache(self):
+        """按尝试次数局部搜索时，不使用缓存也得到相同的排期"""
+        first = self._generate()
+        self.cache.clear()
+        second = self._generate()
+        self.assertFalse(second.cache_hit)
+        self.assertEqual(second.store.to_bytes(), first.store.to_bytes())
+
+    def test_changed_inputs_miss(self):
+        first = self._generate()
+        self.student_manager.students[0].specialty = "消化科"
+        changed = self._generate()
+        self.assertFalse(changed.cache_hit)
+        self.assertNotEqual(changed.last_cache_key, first.last_cache_key)
+        self.assertNotEqual(self._generate(restarts=2, workers=1).last_cache_key, first.last_cache_key)
+
+
+if __name__ == "__main__":
+    unittest.main()
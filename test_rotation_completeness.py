@@ -1,235 +1,141 @@
 ﻿#-*- coding: utf-8 -*-
+import os
+import tempfile
 import unittest
-import pandas as pd
 from datetime import datetime
-from models.student import StudentManager
-from models.department import DepartmentManager
+
+from benchmarks.bench_scheduler import GRADE, START_DATE, build_managers
+from models.student import Student, StudentManager
+from models.department import Department, DepartmentManager
 from models.rotation import RotationScheduler
+from models.schedule_store import ScheduleStore, FLAG_OUTPATIENT
+from models.schedule_validator import (RULE_CONSECUTIVE, RULE_EXCESS, RULE_HALF_MONTH, RULE_INCOMPLETE,
+                                       RULE_LATER, RULE_MISSING, RULE_SPREAD, validate_schedule)
+from utils.month_calendar import MonthCalendar
 
 
-class TestRotationCompleteness(unittest.TestCase):
-    """测试每个学生的轮转排期是否包含所有必要的科室轮转"""
+class TestScheduleValidator(unittest.TestCase):
+    """测试排期检查的各项规则，要求全部由科室配置和学生信息得出"""
 
     def setUp(self):
-        """准备测试环境"""
-        self.student_manager = StudentManager()
-        self.department_manager = DepartmentManager()
-        self.scheduler = RotationScheduler(self.student_manager, self.department_manager)
-        
-        # 设置开始日期和年级
-        self.start_date = datetime.now()
-        self.grade = "2023级"
-        self.months = 35  # 足够覆盖所有轮转的月数
-        
-        # 生成排期
-        self.scheduler.generate_schedule(self.start_date, self.grade, self.months)
-        
-        # 获取该年级的所有学生
-        self.students = [s for s in self.student_manager.get_students() if s.grade == self.grade]
-        
-        # 定义必须轮转的科室及其月数
-        self.required_rotations = {
-            "心内科": 3.5,  # 心内一科或心内二科 2.0+1.5
-            "呼吸内科": 3.0,  # 呼吸一科或呼吸二科 1.0+2.0
-            "消化科": 1.0,
-            "中西医肝病科": 2.0,
-            "急诊科": 3.0,
-            "感染科": 2.0,
-            "风湿科": 2.0,
-            "肾内科": 2.0,
-            "血液科": 2.0,
-            "内分泌科": 2.0,
-            "神经内科": 2.0,
-            "重症医学科": 2.0,
-            "肿瘤科": 2.0,
-            "老年病科": 2.0,
-            "心电图室": 0.5,
-        }
-        
-        # 定义科室到专业的映射
-        self.dept_to_specialty = {
-            "心内一科": "心内科",
-            "心内二科": "心内科",
-            "心电图室": "心电图室",
-            "呼吸一科": "呼吸内科",
-            "呼吸二科": "呼吸内科",
-            "消化科": "消化科",
-            "中西医肝病科": "中西医肝病科",
-            "急诊科": "急诊科",
-            "感染科": "感染科",
-            "风湿科": "风湿科",
-            "肾内科": "肾内科",
-            "血液科": "血液科",
-            "内分泌科": "内分泌科",
-            "神经内科": "神经内科",
-            "重症医学科": "重症医学科",
-            "肿瘤科": "肿瘤科",
-            "老年病科": "老年病科",
-        }
-
-    def count_specialty_months(self, student_name):
-        """统计学生各专业的轮转月数"""
-        if student_name not in self.scheduler.schedule:
-            return {}
-            
-        # 初始化专业月数统计
-        specialty_months = {spec: 0.0 for spec in self.required_rotations.keys()}
-        
-        # 统计各科室的月数
-        for month, dept_name in self.scheduler.schedule[student_name].items():
-            # 处理半月标记
-            is_half_month = False
-            if ":half" in dept_name:
-                dept_name = dept_name.split(":half")[0]
-                is_half_month = True
-                
-            # 处理包含"/"的情况，表示两个科室各算半个月
-            if "/" in dept_name:
-                dept_names = dept_name.split("/")
-                for dept in dept_names:
-                    if dept in self.dept_to_specialty:
-                        specialty = self.dept_to_specialty[dept]
-                        specialty_months[specialty] += 0.5
-            else:
-                if dept_name in self.dept_to_specialty:
-                    specialty = self.dept_to_specialty[dept_name]
-                    specialty_months[specialty] += 0.5 if is_half_month else 1.0
-        
-        return specialty_months
+        self.departments = [Department("甲科", "甲", 1, 1.0), Department("乙科", "乙", 1, 0.5),
+                            Department("丙科", "丙", 1, 1.5), Department("丁科", "丁", 1, 1.0, True)]
+        self.store = ScheduleStore(["张三", "李四", "王五"], [d.name for d in self.departments],
+                                   MonthCalendar(datetime(2024, 9, 1), 6))
+        self.students = [Student("张三", "甲", "2024级", "住院医师", "专科培训"),
+                         Student("李四", "乙", "2024级", "住院医师", "社会培训", ["丙"]),
+                         Student("王五", "丙", "2024级", "住院医师", "专科培训"),
+                         Student("赵六", "甲", "2024级", "住院医师", "专科培训")]
+        # 张三：所有规则都满足，本专业门诊2个月在开始2个月后
+        store = self.store
+        store.assign_month(0, 0, 0)
+        store.assign_half(0, 1, 0, 1)
+        store.assign_half(0, 1, 1, 2)
+        store.assign_month(0, 2, 2)
+        store.assign_month(0, 3, 3)
+        store.assign_month(0, 4, 0, FLAG_OUTPATIENT)
+        store.assign_month(0, 5, 0, FLAG_OUTPATIENT)
+        # 李四：后期轮转过早，半月轮转未拼接，甲专业未轮转，丙专业少自选的半个月
+        store.assign_month(1, 0, 3)
+        store.assign_half(1, 1, 0, 1)
+        store.assign_month(1, 2, 1, FLAG_OUTPATIENT)
+        store.assign_month(1, 3, 1, FLAG_OUTPATIENT)
+        store.assign_month(1, 4, 2)
+        store.assign_month(1, 5, 2)
+        # 王五：门诊紧接同专业科室且过早，甲专业月数超出
+        store.assign_month(2, 0, 0)
+        store.assign_month(2, 1, 0, FLAG_OUTPATIENT)
+
+    def _validate(self, max_spread=10):
+        return validate_schedule(self.store, self.departments, self.students, 2, max_spread)
+
+    def test_rules(self):
+        report = self._validate()
+        self.assertNotIn("张三", report.students())
+        self.assertEqual([(v.student, v.detail) for v in report.by_rule(RULE_INCOMPLETE)][:2],
+                         [("李四", "甲需要1个月，实际0个月"), ("李四", "丙需要2.5个月，实际2个月")])
+        self.assertEqual([v.student for v in report.by_rule(RULE_EXCESS)], ["王五"])
+        self.assertEqual([(v.student, v.month) for v in report.by_rule(RULE_LATER)],
+                         [("李四", "2024-09"), ("王五", "2024-10")])
+        self.assertEqual([(v.student, v.month) for v in report.by_rule(RULE_HALF_MONTH)], [("李四", "2024-10")])
+        self.assertEqual([(v.student, v.detail) for v in report.by_rule(RULE_CONSECUTIVE)],
+                         [("王五", "甲科之后紧接甲科(门诊)，同属甲")])
+        self.assertEqual([v.student for v in report.by_rule(RULE_MISSING)], ["赵六"])
+        self.assertEqual(report.by_rule(RULE_SPREAD), [])
+
+    def test_spread(self):
+        """只统计所有学生都在轮转的月份，后期轮转科室只统计开始轮转一年后"""
+        report = self._validate(max_spread=1)
+        self.assertEqual([v.detail for v in report.by_rule(RULE_SPREAD)],
+                         ["乙科在2024-09至2024-10期间每月人数相差2人，超过1人"])
+        self.assertEqual(report.counts()[RULE_SPREAD], 1)
+
+    def test_spread_staggered_start(self):
+        """学生开始轮转的月份不同时，后期轮转科室与排期一样从排期表第一个月起算"""
+        store = ScheduleStore(["张三", "李四"], [d.name for d in self.departments],
+                              MonthCalendar(datetime(2024, 9, 1), 8))
+        for month in range(8):
+            store.assign_month(0, month, 3 if month in (4, 5) else 0)
+            if month >= 2:
+                store.assign_month(1, month, 0)
+        report = validate_schedule(store, self.departments, self.students[:2], 4, 0)
+        # 统计窗口从李四开始轮转的2024-11起，丁科统计2025-01及之后的月份
+        self.assertEqual([v.detail for v in report.by_rule(RULE_SPREAD) if v.detail.startswith("丁科")],
+                         ["丁科在2024-11至2025-04期间每月人数相差1人，超过0人"])
+
+
+class TestRotationCompleteness(unittest.TestCase):
+    """测试生成的排期：检查结果与排期时记录的未完成轮转一致，后期轮转和半月拼接规则都满足"""
+
+    @classmethod
+    def setUpClass(cls):
+        temp_dir = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(temp_dir.cleanup)
+        student_manager = StudentManager(os.path.join(temp_dir.name, "students.json"))
+        student_manager.students = [
+            Student(f"学生{i}", ["心内科", "消化科", "呼吸内科", "急诊科"][i % 4], "2023级", "住院医师",
+                    "社会培训" if i % 3 == 0 else "专科培训", ["感染科", "风湿科"] if i % 3 == 0 else [])
+            for i in range(40)
+        ]
+        cls.scheduler = RotationScheduler(student_manager, DepartmentManager())
+        cls.scheduler.generate_schedule(datetime(2023, 9, 1), "2023级")
+        cls.report = cls.scheduler.validate()
 
     def test_all_students_have_schedule(self):
-        """测试所有学生都有排期"""
-        for student in self.students:
-            self.assertIn(student.name, self.scheduler.schedule,
-                         f"学生 {student.name} 没有排期")
-            self.assertGreater(len(self.scheduler.schedule[student.name]), 0,
-                              f"学生 {student.name} 的排期为空")
-
-    def test_all_rotations_completed(self):
-        """测试所有学生都完成了所有必要的轮转"""
-        for student in self.students:
-            print(f"\n检查学生 {student.name} 的轮转情况:")
-            
-            specialty_months = self.count_specialty_months(student.name)
-            
-            # 打印学生各专业轮转月数
-            for specialty, months in specialty_months.items():
-                print(f"  {specialty}: {months:.1f}个月")
-            
-            # 检查是否满足所有必要的轮转
-            for specialty, required_months in self.required_rotations.items():
-                actual_months = specialty_months.get(specialty, 0.0)
-                self.assertGreaterEqual(
-                    actual_months,
-                    required_months,
-                    f"学生 {student.name} 的 {specialty} 轮转不足: 需要 {required_months} 个月, 实际 {actual_months} 个月"
-                )
-
-    def test_student_specialty_extra_rotation(self):
-        """测试学生自己专业额外轮转2个月"""
-        for student in self.students:
-            specialty_months = self.count_specialty_months(student.name)
-            student_specialty = student.specialty
-            
-            # 找出学生本专业在必要轮转中的基础月数
-            base_months = 0
-            for dept_name, specialty in self.dept_to_specialty.items():
-                if specialty == student_specialty:
-                    if dept_name in self.scheduler.schedule[student.name].values():
-                        base_months = self.required_rotations.get(specialty, 0.0)
-                        break
-            
-            # 学生本专业的实际轮转月数
-            actual_months = specialty_months.get(student_specialty, 0.0)
-            
-            # 检查是否额外轮转了至少2个月
-            self.assertGreaterEqual(
-                actual_months,
-                base_months + 2.0,
-                f"学生 {student.name} 的本专业 {student_specialty} 额外轮转不足: 需要额外 2 个月, 实际额外 {actual_months - base_months} 个月"
-            )
-
-    def test_social_training_extra_rotation(self):
-        """测试社会培训学生的自选专业额外轮转"""
-        for student in self.students:
-            if student.training_type == "社会培训" and student.self_selected_specialties:
-                specialty_months = self.count_specialty_months(student.name)
-                
-                for selected_specialty in student.self_selected_specialties:
-                    # 找出自选专业在必要轮转中的基础月数
-                    base_months = self.required_rotations.get(selected_specialty, 0.0)
-                    # 自选专业的实际轮转月数
-                    actual_months = specialty_months.get(selected_specialty, 0.0)
-                    
-                    # 检查是否额外轮转了至少1个月
-                    extra_months = actual_months - base_months
-                    # 如果是本专业，已经额外加了2个月，不需要再额外加1个月
-                    if selected_specialty == student.specialty:
-                        self.assertGreaterEqual(
-                            extra_months,
-                            2.0,
-                            f"学生 {student.name} 的自选本专业 {selected_specialty} 额外轮转不足: 需要额外 2 个月, 实际额外 {extra_months} 个月"
-                        )
-                    else:
-                        self.assertGreaterEqual(
-                            extra_months,
-                            1.0,
-                            f"学生 {student.name} 的自选专业 {selected_specialty} 额外轮转不足: 需要额外 1 个月, 实际额外 {extra_months} 个月"
-                        )
-
-    def test_specialty_not_continuous(self):
-        """测试同一专业下的不同科室不会连续排期"""
-        for student in self.students:
-            schedule = self.scheduler.schedule[student.name]
-            sorted_months = sorted(schedule.keys())
-            
-            previous_specialty = None
-            continuous_specialty_count = 1
-            
-            for month in sorted_months:
-                dept_name = schedule[month]
-                # 处理半月标记和分割科室
-                if ":half" in dept_name:
-                    dept_name = dept_name.split(":half")[0]
-                if "/" in dept_name:
-                    dept_name = dept_name.split("/")[0]  # 只检查第一个科室
-                
-                current_specialty = self.dept_to_specialty.get(dept_name)
-                
-                if current_specialty == previous_specialty:
-                    continuous_specialty_count += 1
-                    # 同一专业连续轮转不应超过两个月（除非是两次轮转）
-                    # 这里不太容易判断是否是两次轮转，简单判断连续不超过3个月
-                    self.assertLessEqual(
-                        continuous_specialty_count,
-                        3,
-                        f"学生 {student.name} 的专业 {current_specialty} 连续轮转超过3个月"
-                    )
-                else:
-                    continuous_specialty_count = 1
-                
-                previous_specialty = current_specialty
-
-    def test_total_rotation_months(self):
-        """测试学生的总轮转月数是否正确"""
-        for student in self.students:
-            # 计算学生应该轮转的总月数
-            if student.training_type == "专科培训":
-                # 专科培训：所有必须轮转的专业月数总和 + 本专业额外2个月
-                expected_months = sum(self.required_rotations.values()) + 2.0
-            else:  # 社会培训
-                # 社会培训：所有必须轮转的专业月数总和 + 本专业额外2个月 + 自选专业各1个月
-                expected_months = sum(self.required_rotations.values()) + 2.0 + len(student.self_selected_specialties)
-            
-            # 学生实际排期的月数
-            actual_months = len(self.scheduler.schedule[student.name])
-            
-            # 总轮转月数可能有误差，这里允许±2个月的误差
-            self.assertLessEqual(
-                abs(actual_months - expected_months),
-                2,
-                f"学生 {student.name} 的总轮转月数不正确: 预期 {expected_months} 个月, 实际 {actual_months} 个月"
-            )
+        self.assertEqual(self.report.by_rule(RULE_MISSING), [])
+
+    def test_unfinished_rotations_reported(self):
+        """轮转月数不足的学生正是排期时记录未完成轮转的学生，没有学生轮转月数超出"""
+        self.assertEqual(sorted({v.student for v in self.report.by_rule(RULE_INCOMPLETE)}),
+                         sorted(self.scheduler.unfinished_rotations))
+        self.assertEqual(self.report.by_rule(RULE_EXCESS), [])
+
+    def test_later_rotations(self):
+        """后期轮转科室和门诊轮转都在开始一年后"""
+        self.assertEqual(self.report.by_rule(RULE_LATER), [])
+
+    def test_half_months_paired(self):
+        """完成所有轮转的学生半月轮转都已拼接"""
+        unfinished = set(self.scheduler.unfinished_rotations)
+        self.assertEqual([v for v in self.report.by_rule(RULE_HALF_MONTH) if v.student not in unfinished], [])
+
+    def test_no_consecutive_specialty(self):
+        """贪心排期只剩同专业轮转时连续安排，之后交换轮转段消除，生成的排期中没有同专业连续轮转"""
+        self.assertEqual(self.report.by_rule(RULE_CONSECUTIVE), [])
+
+
+class TestGeneratedCohort(unittest.TestCase):
+    """测试合成数据生成的排期：门诊与本专业科室长度不同时也没有同专业连续轮转"""
+
+    def test_no_consecutive_specialty(self):
+        for seed in range(3):
+            with self.subTest(seed=seed):
+                temp_dir = tempfile.TemporaryDirectory()
+                self.addCleanup(temp_dir.cleanup)
+                student_manager, department_manager = build_managers(300, 10, 0.3, seed, temp_dir.name)
+                scheduler = RotationScheduler(student_manager, department_manager)
+                scheduler.generate_schedule(START_DATE, GRADE)
+                self.assertEqual(scheduler.validate().by_rule(RULE_CONSECUTIVE), [])
 
 
 if __name__ == "__main__":
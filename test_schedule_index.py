@@ -0,0 +1,130 @@
+#-*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+from datetime import date, datetime
+
+import numpy as np
+from openpyxl import load_workbook
+
+from models.student import Student, StudentManager
+from models.department import DepartmentManager
+from models.rotation import RotationScheduler
+from models.schedule_index import Placement, ScheduleIndex, FIRST_HALF, SECOND_HALF, WHOLE_MONTH
+from models.schedule_store import ScheduleStore, FLAG_OUTPATIENT
+from utils.month_calendar import MonthCalendar
+
+
+class TestScheduleIndex(unittest.TestCase):
+    """测试 (科室, 月份) -> 学生 倒排索引"""
+
+    def test_halves_and_flags(self):
+        store = ScheduleStore(["甲", "乙", "丙"], ["心内科", "心电图室"], MonthCalendar(datetime(2024, 9, 1), 2))
+        store.assign_month(0, 0, 0)
+        store.assign_half(1, 0, 0, 0)
+        store.assign_half(1, 0, 1, 1)
+        store.assign_month(2, 0, 0, FLAG_OUTPATIENT)
+        store.assign_month(2, 1, 1)
+        index = ScheduleIndex(store)
+
+        np.testing.assert_array_equal(index.counts, store.occupancy(split_flags=True).T)
+        rows, halves = index.students(0, 0)
+        self.assertEqual((rows.tolist(), halves.tolist()), ([0, 1], [WHOLE_MONTH, FIRST_HALF]))
+        self.assertEqual(index.student_names(1, 0), ["乙(下半月)"])
+        self.assertEqual(index.student_names(index.unit_index["心内科(门诊)"], 0), ["丙"])
+        self.assertEqual(index.student_names(1, 1), ["丙"])
+        self.assertEqual(index.student_names(0, 1), [])
+        self.assertEqual([index.unit_names[unit] for unit in index.used_units()],
+                         ["心内科", "心内科(门诊)", "心电图室"])
+        self.assertEqual(ScheduleIndex(store, [1]).student_names(0, 0, mark_halves=False), ["乙"])
+
+    def test_queries(self):
+        """测试按科室、专业、学生和日期查询，半月和门诊轮转分别记录"""
+        store = ScheduleStore(["甲", "乙", "丙"], ["心内科", "心电图室", "消化科"], MonthCalendar(datetime(2024, 9, 1), 2))
+        store.assign_month(0, 0, 0)
+        store.assign_half(1, 0, 0, 1)
+        store.assign_half(1, 0, 1, 0)
+        store.assign_month(2, 0, 0, FLAG_OUTPATIENT)
+        store.assign_month(2, 1, 2)
+        index = ScheduleIndex(store, specialties=["心内科", "心内科", "消化科"])
+
+        self.assertEqual(index.find_by_department("心内科", "2024-09"), [
+            Placement("甲", "心内科", 0, WHOLE_MONTH), Placement("乙", "心内科", 0, SECOND_HALF),
+            Placement("丙", "心内科(门诊)", 0, WHOLE_MONTH)])
+        self.assertEqual(index.find_by_department("心内科(门诊)", 0), [Placement("丙", "心内科(门诊)", 0, WHOLE_MONTH)])
+        self.assertEqual(index.find_by_department("心内科", "2024-11"), [])
+        self.assertEqual(index.find_by_department("不存在", 0), [])
+        self.assertEqual([p.student for p in index.find_by_specialty("心内科", date(2024, 9, 20))], ["甲", "乙", "乙", "丙"])
+        self.assertEqual(index.find_by_specialty("消化科", 1), [Placement("丙", "消化科", 1, WHOLE_MONTH)])
+
+        self.assertEqual(index.find_by_student("乙", date(2024, 9, 15)), [Placement("乙", "心电图室", 0, FIRST_HALF)])
+        self.assertEqual(index.find_by_student("乙", date(2024, 9, 16)), [Placement("乙", "心内科", 0, SECOND_HALF)])
+        self.assertEqual(len(index.find_by_student("乙", "2024-09")), 2)
+        self.assertEqual(index.find_by_student("甲", date(2024, 9, 30)), [Placement("甲", "心内科", 0, WHOLE_MONTH)])
+        self.assertEqual(index.find_by_student("甲", 1), [])
+        self.assertEqual(index.find_by_student("丁", 0), [])
+
+    def test_scheduler_cache(self):
+        """排期未变化时复用索引，修改排期后重建"""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        student_manager = StudentManager(os.path.join(temp_dir.name, "students.json"))
+        student_manager.students = [Student(f"学生{i}", "心内科", "2023级", "住院医师", "专科培训") for i in range(4)]
+        scheduler = RotationScheduler(student_manager, DepartmentManager())
+        scheduler.generate_schedule(datetime(2023, 9, 1), "2023级")
+        index = scheduler.get_schedule_index()
+        self.assertIs(scheduler.get_schedule_index("2023级"), index)
+
+        department = scheduler.schedule["学生0"]["2023-09"].split("/")[0]
+        self.assertIn("学生0", [p.student for p in scheduler.find_students_in_department(department, "2023-09")])
+        self.assertEqual(scheduler.find_student_departments("学生0", date(2023, 9, 1))[0].department, department)
+        specialty = scheduler.department_manager.get_department(department.split("(")[0]).specialty
+        self.assertIn("学生0", [p.student for p in scheduler.find_students_in_specialty(specialty, "2023-09")])
+
+        scheduler.store.clear(0)
+        self.assertIsNot(scheduler.get_schedule_index(), index)
+        self.assertEqual(scheduler.find_student_departments("学生0", "2023-09"), [])
+
+
+class TestDepartmentExport(unittest.TestCase):
+    """测试导出的科室人数表和科室名单与倒排索引、人数统计一致"""
+
+    @classmethod
+    def setUpClass(cls):
+        temp_dir = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(temp_dir.cleanup)
+        student_manager = StudentManager(os.path.join(temp_dir.name, "students.json"))
+        student_manager.students = [
+            Student(f"学生{i}", ["心内科", "消化科", "呼吸内科"][i % 3], "2023级", "住院医师", "专科培训")
+            for i in range(12)
+        ]
+        cls.scheduler = RotationScheduler(student_manager, DepartmentManager())
+        cls.scheduler.generate_schedule(datetime(2023, 9, 1), "2023级")
+        cls.path = os.path.join(temp_dir.name, "schedule.xlsx")
+        cls.scheduler.export_to_excel(cls.path, "2023级")
+        cls.workbook = load_workbook(cls.path)
+
+    def test_count_sheet(self):
+        statistics = self.scheduler.get_occupancy_statistics("2023级")
+        rows = list(self.workbook["科室人数"].iter_rows(values_only=True))
+        self.assertEqual(list(rows[0]), ["科室"] + statistics.months + ["合计"])
+        self.assertEqual([row[0] for row in rows[1:-1]], statistics.names)
+        self.assertEqual([list(row[1:-1]) for row in rows[1:-1]], statistics.counts.tolist())
+        self.assertEqual(list(rows[-1][1:-1]), statistics.month_totals.tolist())
+
+    def test_roster_sheets(self):
+        """每个科室的名单与排期表中该科室的学生一致"""
+        df = self.scheduler.get_schedule_for_display("2023级")
+        statistics = self.scheduler.get_occupancy_statistics("2023级")
+        self.assertEqual(self.workbook.sheetnames, ["轮转排期", "科室人数"] + statistics.names)
+        for name in statistics.names:
+            rows = list(self.workbook[name].iter_rows(values_only=True))
+            self.assertEqual(list(rows[0]), statistics.months)
+            for col, month in enumerate(statistics.months):
+                roster = [row[col].split("(上半月)")[0].split("(下半月)")[0] for row in rows[1:] if row[col]]
+                expected = [student for student, label in zip(df["姓名"], df[month]) if name in label.split("/")]
+                self.assertEqual(roster, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+#-*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from models.student import Student, StudentManager
+from models.department import DepartmentManager
+from models.rotation import RotationScheduler, ScheduleCancelled
+
+
+class TestScheduleProgress(unittest.TestCase):
+    """测试排期进度回调与取消"""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.student_manager = StudentManager(os.path.join(temp_dir.name, "students.json"))
+        self.student_manager.students = [
+            Student(f"学生{i}", "心内科" if i % 2 else "消化科", "2023级", "住院医师", "专科培训")
+            for i in range(8)
+        ]
+        self.scheduler = RotationScheduler(self.student_manager, DepartmentManager())
+
+    def test_progress_per_student(self):
+        """测试每个学生排期前后报告进度"""
+        events = []
+        self.scheduler.progress_callback = lambda stage, done, total: events.append((stage, done, total))
+        self.scheduler.generate_schedule(datetime(2023, 9, 1), "2023级")
+        generate_events = [event for event in events if event[0] == "生成排期"]
+        self.assertEqual([done for _, done, _ in generate_events], list(range(9)))
+        self.assertTrue(all(total == 8 for _, _, total in generate_events))
+
+    def test_cancel(self):
+        """测试取消后抛出ScheduleCancelled"""
+        events = []
+        self.scheduler.progress_callback = lambda stage, done, total: events.append(done)
+        self.scheduler.should_cancel = lambda: len(events) >= 3
+        with self.assertRaises(ScheduleCancelled):
+            self.scheduler.generate_schedule(datetime(2023, 9, 1), "2023级")
+        self.assertEqual(len(events), 3)
+
+    def test_cancel_restarts(self):
+        """测试随机重启过程中取消"""
+        self.scheduler.should_cancel = lambda: True
+        with self.assertRaises(ScheduleCancelled):
+            self.scheduler.generate_schedule(datetime(2023, 9, 1), "2023级", restarts=3, workers=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
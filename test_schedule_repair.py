@@ -0,0 +1,96 @@
+#-*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from models.student import Student, StudentManager
+from models.department import DepartmentManager
+from models.rotation import RotationScheduler
+from models.schedule_validator import RULE_LATER
+
+
+class TestScheduleRepair(unittest.TestCase):
+    """测试学生名单变化后局部调整排期"""
+
+    def setUp(self):
+        self.student_manager = StudentManager()
+        # 只在内存中修改学生名单，不写入数据文件
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.student_manager.data_file = os.path.join(temp_dir.name, "students.json")
+        self.student_manager.students = [
+            Student(f"学生{i}", "心内科" if i % 2 else "消化科", "2023级", "住院医师", "专科培训")
+            for i in range(12)
+        ]
+        self.scheduler = RotationScheduler(self.student_manager, DepartmentManager())
+        self.scheduler.generate_schedule(datetime(2023, 9, 1), "2023级")
+        self.before = {name: dict(months) for name, months in self.scheduler.schedule.items()}
+        self.frozen_before = datetime(2024, 3, 1)
+
+    def test_repair_copy(self):
+        """在调度器副本上调整排期，原调度器的排期和人数统计不变"""
+        self.student_manager.students.append(Student("新学生", "心内科", "2023级", "住院医师", "专科培训"))
+        added, removed, changed = self.scheduler.diff_students()
+        counts = self.scheduler.department_counts.copy()
+        copied = self.scheduler.copy()
+        self.assertIs(copied.student_manager, self.student_manager)
+        copied.repair_schedule(added, removed, changed, frozen_before=self.frozen_before, optimize_seconds=0)
+        self.assertIn("新学生", copied.schedule)
+        self.assertEqual(self.scheduler.schedule, self.before)
+        self.assertTrue((self.scheduler.department_counts == counts).all())
+        self.assertEqual(copied.diff_students(), ([], [], []))
+
+    def _frozen_unchanged(self, after):
+        for name, months in self.before.items():
+            if name not in after:
+                continue
+            for month, label in months.items():
+                if month < "2024-03":
+                    self.assertEqual(after[name].get(month), label, f"{name} {month} 的冻结排期被修改")
+
+    def test_diff_and_repair(self):
+        """测试新增、删除、修改学生后只调整受影响学生，冻结月份不变"""
+        students = self.student_manager.students
+        del students[0]
+        students[2] = Student(students[2].name, "呼吸内科", "2023级", "住院医师", "专科培训")
+        students.append(Student("新学生", "肾内科", "2023级", "研究生", "社会培训", ["感染科", "风湿科"]))
+
+        added, removed, changed = self.scheduler.diff_students()
+        self.assertEqual([s.name for s in added], ["新学生"])
+        self.assertEqual(removed, ["学生0"])
+        self.assertEqual([s.name for s in changed], [students[2].name])
+
+        after = self.scheduler.repair_schedule(added, removed, changed, frozen_before=self.frozen_before,
+                                               optimize_seconds=0.2, seed=1)
+        self.assertNotIn("学生0", after)
+        self._frozen_unchanged(after)
+        # 新学生从冻结月份开始轮转，且没有未完成的轮转
+        self.assertEqual(min(after["新学生"]), "2024-03")
+        self.assertNotIn("新学生", self.scheduler.unfinished_rotations)
+        # 修改后的学生按新专业安排门诊
+        self.assertTrue(any(label.startswith("呼吸") and label.endswith("(门诊)")
+                            for label in after[students[2].name].values()))
+        self.assertEqual(self.scheduler.diff_students(), ([], [], []))
+
+    def test_added_students_later_rotations(self):
+        """局部搜索按每个新增学生自己开始轮转的月份检查后期轮转，不会提前到开始一年内"""
+        for seed in range(5):
+            with self.subTest(seed=seed):
+                self.setUp()
+                self.student_manager.students.extend(
+                    Student(f"新生{i}", ["心内科", "消化科", "呼吸内科"][i % 3], "2023级", "住院医师", "专科培训")
+                    for i in range(6))
+                self.scheduler.repair_schedule(*self.scheduler.diff_students(), frozen_before=self.frozen_before,
+                                               optimize_seconds=0.3, seed=seed)
+                self.assertEqual(self.scheduler.validate().by_rule(RULE_LATER), [])
+
+    def test_occupancy_consistent(self):
+        """测试调整后月度人数矩阵与排期一致"""
+        self.student_manager.students.pop()
+        self.scheduler.repair_schedule(*self.scheduler.diff_students(), frozen_before=self.frozen_before)
+        self.assertTrue((self.scheduler.department_counts == self.scheduler.store.occupancy()).all())
+
+
+if __name__ == "__main__":
+    unittest.main()
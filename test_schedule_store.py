@@ -0,0 +1,59 @@
+#-*- coding: utf-8 -*-
+import unittest
+from datetime import datetime
+
+from models.schedule_store import ScheduleStore, FLAG_OUTPATIENT
+from utils.month_calendar import MonthCalendar
+
+
+class TestScheduleStore(unittest.TestCase):
+    """测试排期矩阵存储与字典视图、人数统计的一致性"""
+
+    def setUp(self):
+        self.calendar = MonthCalendar(datetime(2024, 11, 1), 3)
+        self.store = ScheduleStore(["学生甲", "学生乙"], ["心内一科", "心电图室", "消化科"], self.calendar)
+        # 学生甲：心内一科 -> 心电图室/心内一科 -> 消化科(门诊)
+        self.store.assign_month(0, 0, 0)
+        self.store.assign_half(0, 1, 0, 1)
+        self.store.assign_half(0, 1, 1, 0)
+        self.store.assign_month(0, 2, 2, FLAG_OUTPATIENT)
+        # 学生乙：只安排第一个月
+        self.store.assign_month(1, 0, 2)
+
+    def test_month_keys(self):
+        """测试月份键跨年计算"""
+        self.assertEqual(self.calendar.keys, ["2024-11", "2024-12", "2025-01"])
+        self.assertEqual(self.calendar.offset("2025-01"), 2)
+
+    def test_to_dict(self):
+        """测试由矩阵生成的排期字典"""
+        schedule = self.store.to_dict()
+        self.assertEqual(schedule["学生甲"], {
+            "2024-11": "心内一科",
+            "2024-12": "心电图室/心内一科",
+            "2025-01": "消化科(门诊)",
+        })
+        self.assertEqual(schedule["学生乙"], {"2024-11": "消化科"})
+
+    def test_cache_refreshed_after_change(self):
+        """测试修改矩阵后字典视图重新生成"""
+        self.store.to_dict()
+        self.store.assign_month(1, 1, 0)
+        self.assertEqual(self.store.to_dict()["学生乙"]["2024-12"], "心内一科")
+
+    def test_occupancy(self):
+        """测试月份 × 科室人数统计，半月轮转两个科室各计1人"""
+        counts = self.store.occupancy()
+        self.assertEqual(counts.tolist(), [[1, 0, 1], [1, 1, 0], [0, 0, 1]])
+        self.assertEqual(self.store.used_months([1]).tolist(), [0])
+
+    def test_occupancy_split_flags(self):
+        """测试门诊轮转单独统计"""
+        counts = self.store.occupancy(split_flags=True)
+        names = self.store.occupancy_names(split_flags=True)
+        self.assertEqual(counts[2, names.index("消化科(门诊)")], 1)
+        self.assertEqual(counts[2, names.index("消化科")], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
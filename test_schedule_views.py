@@ -0,0 +1,98 @@
+#-*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from openpyxl import load_workbook
+
+from models.student import Student, StudentManager
+from models.department import DepartmentManager
+from models.rotation import RotationScheduler
+
+
+class TestScheduleViews(unittest.TestCase):
+    """测试调度器提供给界面的排期数据与排期表一致"""
+
+    @classmethod
+    def setUpClass(cls):
+        temp_dir = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(temp_dir.cleanup)
+        student_manager = StudentManager(os.path.join(temp_dir.name, "students.json"))
+        student_manager.students = [
+            Student(f"学生{i}", ["心内科", "消化科", "呼吸内科"][i % 3], "2023级", "住院医师",
+                    "社会培训" if i % 4 == 0 else "专科培训", ["感染科", "风湿科"] if i % 4 == 0 else [])
+            for i in range(10)
+        ]
+        cls.department_manager = DepartmentManager()
+        cls.scheduler = RotationScheduler(student_manager, cls.department_manager)
+        cls.scheduler.generate_schedule(datetime(2023, 9, 1), "2023级")
+
+    def test_schedule_grid(self):
+        """测试表格数据与DataFrame一致，颜色专业取半月轮转前半月的科室"""
+        students, months, labels, specialties, specialty_names = self.scheduler.get_schedule_grid("2023级")
+        df = self.scheduler.get_schedule_for_display("2023级")
+        self.assertEqual([s.name for s in students], df["姓名"].tolist())
+        self.assertEqual(months, df.columns[4:].tolist())
+        self.assertEqual(labels.tolist(), df.iloc[:, 4:].values.tolist())
+        for row in range(len(students)):
+            for col in range(len(months)):
+                label = labels[row, col]
+                if not label:
+                    self.assertEqual(specialties[row, col], -1)
+                    continue
+                first_department = label.split("/")[0].replace("(门诊)", "")
+                expected = self.department_manager.get_department(first_department).specialty
+                self.assertEqual(specialty_names[specialties[row, col]], expected)
+
+    def test_occupancy_statistics(self):
+        """测试人数统计与排期矩阵一致，合计与人数差由同一矩阵计算"""
+        statistics = self.scheduler.get_occupancy_statistics("2023级")
+        self.assertIs(statistics, self.scheduler.get_occupancy_statistics("2023级"))
+        self.assertEqual(statistics.names, sorted(statistics.names))
+        self.assertEqual(statistics.counts.shape, (len(statistics.names), len(statistics.months)))
+        self.assertEqual(statistics.month_totals.tolist(), statistics.counts.sum(axis=0).tolist())
+        self.assertEqual(statistics.max_count, statistics.counts.max())
+
+        store = self.scheduler.store
+        total = store.occupancy().sum(axis=1)
+        month_index = [self.scheduler.calendar.key(month) for month in range(store.months)]
+        for month, month_total in zip(statistics.months, statistics.month_totals.tolist()):
+            self.assertEqual(month_total, total[month_index.index(month)])
+        # 没有门诊轮转的科室人数差与调度器的均衡统计一致
+        department_spread = dict(zip(store.department_names, self.scheduler.department_spread().tolist()))
+        for name, spread in zip(statistics.names, statistics.spread.tolist()):
+            if "(" not in name and not any(other.startswith(name + "(") for other in statistics.names):
+                self.assertEqual(spread, department_spread[name])
+
+    def test_export_to_excel(self):
+        """测试导出的Excel与显示数据一致，同一专业填充颜色相同，冻结表头和学生信息列"""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        path = os.path.join(temp_dir.name, "schedule.xlsx")
+        self.assertTrue(self.scheduler.export_to_excel(path, "2023级"))
+        self.assertFalse(self.scheduler.export_to_excel(path + ".x", "不存在的年级"))
+        df = self.scheduler.get_schedule_for_display("2023级")
+        sheet = load_workbook(path).active
+        self.assertEqual(sheet.freeze_panes, "E2")
+        rows = list(sheet.iter_rows(values_only=True))
+        self.assertEqual(list(rows[0]), df.columns.tolist())
+        self.assertEqual([[value or "" for value in row] for row in rows[1:]], df.values.tolist())
+
+        _, _, _, specialties, _ = self.scheduler.get_schedule_grid("2023级")
+        colors = {}
+        for row, cells in enumerate(sheet.iter_rows(min_row=2, min_col=5)):
+            for col, cell in enumerate(cells):
+                code = int(specialties[row, col])
+                color = cell.fill.fgColor.rgb if cell.fill.fill_type else None
+                self.assertEqual(color is None, code < 0)
+                self.assertEqual(colors.setdefault(code, color), color)
+        self.assertEqual(len(set(colors.values()) - {None}), len(colors) - (-1 in colors))
+
+    def test_unknown_grade(self):
+        students, months, labels, _, _ = self.scheduler.get_schedule_grid("不存在的年级")
+        self.assertEqual((students, months, labels.size), ([], [], 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
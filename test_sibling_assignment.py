@@ -0,0 +1,132 @@
+#-*- coding: utf-8 -*-
+import itertools
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+import numpy as np
+
+from models.department import DepartmentManager
+from models.rotation import RotationScheduler
+from models.schedule_store import ScheduleStore
+from models.schedule_validator import RULE_CONSECUTIVE, RULE_HALF_MONTH, RULE_LATER
+from models.student import Student, StudentManager
+from models.sibling_assignment import SiblingAssigner, solve_transportation
+from utils.month_calendar import MonthCalendar
+
+
+class TestSolveTransportation(unittest.TestCase):
+    """测试运输问题求解结果与穷举结果一致"""
+
+    def test_matches_brute_force(self):
+        rng = np.random.default_rng(0)
+        for _ in range(50):
+            students, width = int(rng.integers(1, 7)), int(rng.integers(2, 4))
+            capacities = [-(-students // width) + int(rng.integers(0, 2)) for _ in range(width)]
+            costs = rng.integers(-5, 10, (students, width)).astype(float)
+            assigned = solve_transportation(costs, capacities)
+            self.assertTrue((np.bincount(assigned, minlength=width) <= capacities).all())
+            best = min(sum(costs[i, choice[i]] for i in range(students))
+                       for choice in itertools.product(range(width), repeat=students)
+                       if all(choice.count(j) <= capacities[j] for j in range(width)))
+            self.assertAlmostEqual(costs[np.arange(students), assigned].sum(), best)
+
+    def test_insufficient_capacity(self):
+        with self.assertRaises(ValueError):
+            solve_transportation(np.zeros((3, 2)), [1, 1])
+
+
+class TestSiblingAssigner(unittest.TestCase):
+    """测试同专业科室整体分配"""
+
+    def test_split_overloaded_months(self):
+        """总人数均衡但同一时段集中在一个科室时，重新分配后各时段人数均衡"""
+        store = ScheduleStore([f"学生{i}" for i in range(4)], ["呼吸一科", "呼吸二科", "消化科"],
+                              MonthCalendar(datetime(2024, 9, 1), 2))
+        for row in range(4):
+            month = 0 if row < 2 else 1
+            store.assign_month(row, month, 0 if row < 2 else 1)
+            store.assign_month(row, 1 - month, 2)
+        before = store.codes.copy()
+
+        moves = SiblingAssigner(store, [[0, 1]]).assign()
+        self.assertTrue(moves)
+        counts = store.occupancy()
+        self.assertEqual(counts[:, :2].tolist(), [[1, 1], [1, 1]])
+        # 轮转时段和其他科室不变
+        np.testing.assert_array_equal(store.codes == 2, before == 2)
+        np.testing.assert_array_equal(store.codes >= 0, before >= 0)
+
+    def test_different_structures(self):
+        """轮转结构不同的科室之间调整：缩短空出的半月由未完成的半月轮转补上，人数更均衡才调整"""
+        store = ScheduleStore(["甲", "乙", "丙"], ["心内一科", "心内二科", "心电图室", "消化科"],
+                              MonthCalendar(datetime(2024, 9, 1), 5))
+        for row in (0, 1):
+            for month in (0, 1, 3, 4):
+                store.assign_month(row, month, 1)
+            store.assign_month(row, 2, 3)
+        for month in (0, 1, 3):
+            store.assign_month(2, month, 0)
+        store.assign_month(2, 2, 3)
+        store.assign_half(2, 4, 0, 0)
+        store.assign_half(2, 4, 1, 2)
+
+        moves, fills = SiblingAssigner(store, []).assign_structures(
+            [[0, 1]], {0: [4, 3], 1: [4, 4], 2: [1], 3: [2]}, [0, 0, 1, 2], [False] * 4, [0, 0, 0], {0: [2], 1: [2]})
+        self.assertEqual((moves, fills), ([(0, 1, 0)], [(0, 2)]))
+        self.assertEqual((np.count_nonzero(store.codes[0] == 0), np.count_nonzero(store.codes[0] == 2)), (7, 1))
+        # 轮转时段不变，缩短空出的半月与心内一科拼成一个月
+        self.assertTrue((store.codes[0] >= 0).all())
+        self.assertEqual(store.codes[1].tolist(), [1] * 4 + [3] * 2 + [1] * 4)
+
+
+class TestSiblingScheduling(unittest.TestCase):
+    """测试排期时的同专业科室分配"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.student_manager = StudentManager(os.path.join(self.directory, "students.json"))
+        self.student_manager.students = [
+            Student(f"学生{i}", ["心内科", "消化科", "呼吸内科", "急诊科"][i % 4], "2023级", "住院医师",
+                    "社会培训" if i % 3 == 0 else "专科培训", ["感染科", "风湿科"] if i % 3 == 0 else [])
+            for i in range(40)
+        ]
+
+    def _compare(self, department_manager, siblings):
+        """同专业科室重新分配前后各组科室的半月人数平方和，以及排期检查的违规数"""
+        scheduler = RotationScheduler(self.student_manager, department_manager)
+        scheduler.generate_schedule(datetime(2023, 9, 1), "2023级", balance_siblings=False)
+        columns = [[scheduler.department_index[name] for name in names] for names in siblings]
+        before = [int((scheduler.store.slot_occupancy()[:, group] ** 2).sum()) for group in columns]
+        violations = scheduler.validate().counts()
+        unfinished = len(scheduler.unfinished_rotations)
+        self.assertGreater(scheduler.assign_sibling_departments(), 0)
+        after = [int((scheduler.store.slot_occupancy()[:, group] ** 2).sum()) for group in columns]
+        np.testing.assert_array_equal(scheduler.department_counts, scheduler.store.occupancy())
+        counts = scheduler.validate().counts()
+        for rule in (RULE_CONSECUTIVE, RULE_HALF_MONTH, RULE_LATER):
+            self.assertLessEqual(counts.get(rule, 0), violations.get(rule, 0))
+        self.assertLessEqual(len(scheduler.unfinished_rotations), unfinished)
+        return before, after
+
+    def test_shipped_departments(self):
+        """data/departments.json中的同专业科室轮转结构相同，整体分配后各组人数都不变差"""
+        path = os.path.join(self.directory, "departments.json")
+        shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "departments.json"), path)
+        before, after = self._compare(DepartmentManager(path), [("心内一科", "心内二科"), ("呼吸一科", "呼吸二科")])
+        self.assertLessEqual(after, before)
+        self.assertLess(sum(after), sum(before))
+
+    def test_default_departments_with_different_structures(self):
+        """默认科室中心内一科[2, 1.5]与心内二科[2, 2]轮转结构不同，也参与调整"""
+        department_manager = DepartmentManager(os.path.join(self.directory, "departments.json"))
+        before, after = self._compare(department_manager, [("心内一科", "心内二科")])
+        self.assertLess(after, before)
+
+
+if __name__ == "__main__":
+    unittest.main()
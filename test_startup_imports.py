@@ -0,0 +1,34 @@
+#-*- coding: utf-8 -*-
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _imported_modules(statement, modules=("numpy", "pandas", "openpyxl")):
+    """在新的解释器中执行导入语句，返回其中已导入的模块"""
+    code = f"import sys\n{statement}\nprint(','.join(m for m in {modules!r} if m in sys.modules))"
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True,
+                            capture_output=True, text=True).stdout.strip()
+    return output.split(",") if output else []
+
+
+class TestStartupImports(unittest.TestCase):
+    """测试启动时不导入numpy、pandas等较大的模块"""
+
+    def test_main_window_imports(self):
+        self.assertEqual(_imported_modules("import main"), [])
+
+    def test_student_import_module(self):
+        self.assertEqual(_imported_modules("import models.student"), [])
+
+    def test_rotation_without_pandas(self):
+        """排期模块需要numpy，pandas只在生成DataFrame时导入"""
+        self.assertEqual(_imported_modules("import models.rotation"), ["numpy"])
+
+
+if __name__ == "__main__":
+    unittest.main()
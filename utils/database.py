@@ -0,0 +1,217 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# 设置该环境变量为数据库文件路径时，学生、科室数据和排期结果保存在SQLite数据库中
+DATABASE_ENV = "LUNZHAN_DATABASE"
+
+# 表名 -> (列名, JSON编码的列, 布尔列)，列名与to_dict的键一致
+_TABLES = {
+    "students": (["name", "specialty", "grade", "position", "training_type", "self_selected_specialties"],
+                 {"self_selected_specialties"}, set()),
+    "departments": (["name", "specialty", "rotation_times", "months_per_rotation", "is_later_rotation",
+                     "min_capacity", "max_capacity", "monthly_capacity"],
+                    {"months_per_rotation", "monthly_capacity"}, {"is_later_rotation"}),
+}
+
+# 之后版本新增的列：表名 -> [(列名, 列定义)]，打开旧数据库时自动添加
+_ADDED_COLUMNS = {
+    "departments": [("min_capacity", "INTEGER"), ("max_capacity", "INTEGER"),
+                    ("monthly_capacity", "TEXT NOT NULL DEFAULT '{}'")],
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    seq INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    specialty TEXT NOT NULL,
+    grade TEXT NOT NULL,
+    position TEXT NOT NULL,
+    training_type TEXT NOT NULL,
+    self_selected_specialties TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_students_grade ON students(grade);
+CREATE INDEX IF NOT EXISTS idx_students_specialty ON students(specialty);
+CREATE TABLE IF NOT EXISTS departments (
+    seq INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    specialty TEXT NOT NULL,
+    rotation_times INTEGER NOT NULL,
+    months_per_rotation TEXT NOT NULL,
+    is_later_rotation INTEGER NOT NULL,
+    min_capacity INTEGER,
+    max_capacity INTEGER,
+    monthly_capacity TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_departments_specialty ON departments(specialty);
+CREATE TABLE IF NOT EXISTS schedules (
+    grade TEXT PRIMARY KEY,
+    saved_at TEXT NOT NULL,
+    state TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+"""
+
+
+def default_database_file() -> Optional[str]:
+    """环境变量指定的数据库文件，未设置时返回None，使用JSON文件保存数据"""
+    return os.environ.get(DATABASE_ENV) or None
+
+
+def open_default_database() -> Optional['Database']:
+    """打开环境变量指定的数据库，未设置时返回None"""
+    database_file = default_database_file()
+    return Database(database_file) if database_file else None
+
+
+class Database:
+    """SQLite数据存储
+
+    学生和科室每条记录一行，seq为在列表中的顺序，与管理器中的列表下标一致，
+    增删改只写入变化的行。排期结果按年级保存，排期矩阵压缩为一个二进制字段。
+    """
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 自动提交模式，需要原子性的操作显式使用transaction；排期线程也会读取，用锁串行访问连接
+        self.connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(_SCHEMA)
+        self._add_missing_columns()
+        self._lock = threading.RLock()
+        self._transaction_depth = 0
+
+    def _add_missing_columns(self):
+        """旧版本创建的数据库缺少之后新增的列时添加这些列"""
+        for table, added in _ADDED_COLUMNS.items():
+            existing = {row[1] for row in self.connection.execute(f"PRAGMA table_info({table})")}
+            for column, definition in added:
+                if column not in existing:
+                    self.connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def close(self):
+        self.connection.close()
+
+    @contextmanager
+    def transaction(self):
+        """事务，可以嵌套，最外层结束时提交，出现异常时回滚"""
+        with self._lock:
+            if self._transaction_depth == 0:
+                self.connection.execute("BEGIN IMMEDIATE")
+            self._transaction_depth += 1
+            try:
+                yield self.connection
+            except BaseException:
+                self._transaction_depth -= 1
+                if self._transaction_depth == 0:
+                    self.connection.execute("ROLLBACK")
+                raise
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                self.connection.execute("COMMIT")
+
+    @staticmethod
+    def _encode(table: str, record: Dict[str, Any]) -> List[Any]:
+        columns, json_columns, _ = _TABLES[table]
+        return [json.dumps(record[column], ensure_ascii=False) if column in json_columns else record[column]
+                for column in columns]
+
+    @staticmethod
+    def _decode(table: str, row: Tuple) -> Dict[str, Any]:
+        columns, json_columns, bool_columns = _TABLES[table]
+        record = {}
+        for column, value in zip(columns, row):
+            if column in json_columns:
+                value = json.loads(value)
+            elif column in bool_columns:
+                value = bool(value)
+            record[column] = value
+        return record
+
+    def count(self, table: str) -> int:
+        with self._lock:
+            return self.connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def load(self, table: str) -> List[Dict[str, Any]]:
+        """按顺序读取所有记录"""
+        columns = ", ".join(_TABLES[table][0])
+        with self._lock:
+            rows = self.connection.execute(f"SELECT {columns} FROM {table} ORDER BY seq").fetchall()
+        return [self._decode(table, row) for row in rows]
+
+    def find(self, table: str, column: str, value: Any) -> List[int]:
+        """查询某列等于value的记录顺序号，按顺序排列"""
+        if column not in _TABLES[table][0]:
+            raise ValueError(f"未知的列: {column}")
+        with self._lock:
+            rows = self.connection.execute(f"SELECT seq FROM {table} WHERE {column} = ? ORDER BY seq",
+                                           (value,)).fetchall()
+        return [row[0] for row in rows]
+
+    def replace_all(self, table: str, records: List[Dict[str, Any]]):
+        """在一个事务中替换表中的所有记录"""
+        columns = _TABLES[table][0]
+        placeholders = ", ".join("?" * (len(columns) + 1))
+        with self.transaction() as connection:
+            connection.execute(f"DELETE FROM {table}")
+            connection.executemany(f"INSERT INTO {table} (seq, {', '.join(columns)}) VALUES ({placeholders})",
+                                   ([seq] + self._encode(table, record) for seq, record in enumerate(records)))
+
+    def insert(self, table: str, seq: int, record: Dict[str, Any]):
+        """在末尾添加记录，seq为添加后的列表下标"""
+        self.insert_many(table, seq, [record])
+
+    def insert_many(self, table: str, first_seq: int, records: List[Dict[str, Any]]):
+        """在一个事务中在末尾添加多条记录，first_seq为第一条记录添加后的列表下标"""
+        columns = _TABLES[table][0]
+        placeholders = ", ".join("?" * (len(columns) + 1))
+        with self.transaction() as connection:
+            connection.executemany(f"INSERT INTO {table} (seq, {', '.join(columns)}) VALUES ({placeholders})",
+                                   ([first_seq + i] + self._encode(table, record)
+                                    for i, record in enumerate(records)))
+
+    def update(self, table: str, seq: int, record: Dict[str, Any]):
+        """更新列表下标为seq的记录"""
+        columns = _TABLES[table][0]
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        with self.transaction() as connection:
+            connection.execute(f"UPDATE {table} SET {assignments} WHERE seq = ?",
+                               self._encode(table, record) + [seq])
+
+    def delete(self, table: str, seq: int):
+        """删除列表下标为seq的记录，之后的记录顺序号依次减1"""
+        with self.transaction() as connection:
+            connection.execute(f"DELETE FROM {table} WHERE seq = ?", (seq,))
+            # 主键不能在更新过程中重复，先改为负数再取反
+            connection.execute(f"UPDATE {table} SET seq = -(seq - 1) WHERE seq > ?", (seq,))
+            connection.execute(f"UPDATE {table} SET seq = -seq WHERE seq < 0")
+
+    def save_schedule(self, grade: str, state: Dict[str, Any], data: bytes):
+        """保存年级的排期结果，覆盖之前的结果
+
+        Args:
+            state: 可JSON编码的排期信息
+            data: 压缩的排期矩阵
+        """
+        with self.transaction() as connection:
+            connection.execute("INSERT OR REPLACE INTO schedules (grade, saved_at, state, data) VALUES (?, ?, ?, ?)",
+                               (grade, datetime.now().isoformat(timespec="seconds"),
+                                json.dumps(state, ensure_ascii=False), sqlite3.Binary(data)))
+
+    def load_schedule(self, grade: str) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        """读取年级的排期结果，没有时返回None"""
+        with self._lock:
+            row = self.connection.execute("SELECT state, data FROM schedules WHERE grade = ?", (grade,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), bytes(row[1])
+
+    def delete_schedule(self, grade: str):
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM schedules WHERE grade = ?", (grade,))
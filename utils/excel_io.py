@@ -0,0 +1,242 @@
+import os
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# 导入学生只读取单元格，numpy、openpyxl、pandas等较大的模块都在用到时才导入，
+# 避免学生页面导入本模块时拖慢程序启动
+
+# 学生信息字段 -> Excel中可能使用的表头，按顺序匹配第一个出现的表头
+STUDENT_COLUMNS = {
+    "name": ("姓名",),
+    "specialty": ("科室", "专业"),
+    "grade": ("年级",),
+    "position": ("职位",),
+    "training_type": ("培训方式", "培训类型"),
+    "self_selected_specialties": ("自选专业",),
+}
+
+# 导入学生时必须存在的字段
+REQUIRED_STUDENT_FIELDS = ("name", "specialty", "grade")
+
+# 导出表头的背景颜色
+HEADER_COLOR = "F0F0F0"
+
+
+def cell_text(value: Any) -> str:
+    """单元格的值转换为去掉首尾空白的字符串，整数值的浮点数不带小数部分"""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def iter_sheet_rows(file_path: str) -> Iterator[Tuple]:
+    """逐行读取第一个工作表的单元格值
+
+    xlsx文件使用openpyxl只读模式流式读取，不将整个工作表载入内存；
+    其他格式（如xls）由pandas读取。
+    """
+    if os.path.splitext(file_path)[1].lower() in (".xlsx", ".xlsm"):
+        from openpyxl import load_workbook
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            yield from workbook.worksheets[0].iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    else:
+        import pandas as pd
+        df = pd.read_excel(file_path, header=None, dtype=object)
+        for row in df.itertuples(index=False, name=None):
+            yield tuple(None if pd.isna(value) else value for value in row)
+
+
+def read_columns(file_path: str, columns: Optional[Mapping[str, Sequence[str]]] = None,
+                 required: Sequence[str] = ()) -> Tuple[Dict[str, List[str]], List[int]]:
+    """按表头读取需要的列
+
+    第一行为表头，其余非空行为数据。
+
+    Args:
+        columns: 字段 -> 可能的表头，默认为学生信息的表头
+        required: 必须存在的字段
+    Returns:
+        ({字段: 各行的字符串值}, 各行在Excel中的行号)，表中没有的字段不在结果中
+    Raises:
+        ValueError: 缺少必要的列
+    """
+    columns = STUDENT_COLUMNS if columns is None else columns
+    rows = iter_sheet_rows(file_path)
+    header = [cell_text(value) for value in next(rows, ())]
+    positions = {}
+    for field, aliases in columns.items():
+        for alias in aliases:
+            if alias in header:
+                positions[field] = header.index(alias)
+                break
+    missing = [columns[field][0] for field in required if field not in positions]
+    if missing:
+        raise ValueError(f"缺少必要的列: {', '.join(missing)}")
+
+    values = {field: [] for field in positions}
+    row_numbers = []
+    for row_number, row in enumerate(rows, start=2):
+        texts = {field: cell_text(row[position]) if position < len(row) else ""
+                 for field, position in positions.items()}
+        if not any(texts.values()):
+            continue
+        for field, text in texts.items():
+            values[field].append(text)
+        row_numbers.append(row_number)
+    return values, row_numbers
+
+
+def new_workbook():
+    """创建只写模式的工作簿，行数据直接写入临时文件，内存占用与行数无关"""
+    from openpyxl import Workbook
+    return Workbook(write_only=True)
+
+
+def _column_letter(index: int) -> str:
+    from openpyxl.utils import get_column_letter
+    return get_column_letter(index + 1)
+
+
+def _text_width(length: int) -> float:
+    """按中文字符估算列宽"""
+    return min(max(8.0, 2.2 * length + 2), 60.0)
+
+
+def append_header(sheet, headers: Sequence[str]):
+    """写入加粗、灰色背景的表头行"""
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill
+    font = Font(bold=True)
+    fill = PatternFill("solid", fgColor=HEADER_COLOR)
+    cells = []
+    for header in headers:
+        cell = WriteOnlyCell(sheet, header)
+        cell.font = font
+        cell.fill = fill
+        cells.append(cell)
+    sheet.append(cells)
+
+
+def append_schedule_sheet(workbook, title: str, info_headers: Sequence[str], info_rows: Sequence[Sequence[Any]],
+                          months: Sequence[str], labels: "np.ndarray", specialties: "np.ndarray",
+                          specialty_names: Sequence[str]):
+    """在工作簿中添加 学生 × 月份 的排期表
+
+    单元格按专业填充背景颜色，颜色与界面相同，按专业在表中首次出现的顺序分配，
+    每个专业只创建一个填充样式。冻结表头行和学生信息列。行直接写入文件，内存占用与学生数无关。
+
+    Args:
+        info_headers: 学生信息列的表头
+        info_rows: 每个学生的信息列
+        months: 月份表头
+        labels: 学生 × 月份 的科室名称矩阵，未安排为空字符串
+        specialties: 学生 × 月份 的专业编号矩阵，未安排为-1
+        specialty_names: 专业编号对应的专业名称
+    """
+    import numpy as np
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import PatternFill
+    from utils.palette import SPECIALTY_PALETTE, first_appearance_order
+
+    sheet = workbook.create_sheet(title)
+    info_count = len(info_headers)
+    # 只写模式需要在写入行之前设置冻结和列宽
+    sheet.freeze_panes = f"{_column_letter(info_count)}2"
+    for col in range(info_count):
+        sheet.column_dimensions[_column_letter(col)].width = _text_width(
+            max([len(str(info_headers[col]))] + [len(str(row[col])) for row in info_rows]))
+    if labels.size:
+        lengths = np.vectorize(len, otypes=[np.int64])(labels).max(axis=0)
+        for col, length in enumerate(lengths.tolist()):
+            sheet.column_dimensions[_column_letter(info_count + col)].width = _text_width(max(length, 7))
+
+    fills = [None] * len(specialty_names)
+    for index, code in enumerate(first_appearance_order(specialties)):
+        color = SPECIALTY_PALETTE[index % len(SPECIALTY_PALETTE)].lstrip("#")
+        fills[code] = PatternFill("solid", fgColor=color)
+
+    # 只写模式追加行时逐个设置单元格的行列号并立即写出，内容和样式相同的单元格可以共用一个对象，
+    # 不同的 (科室名称, 专业) 组合很少，避免为每个单元格创建对象和查找样式
+    styled_cells = {}
+    append_header(sheet, list(info_headers) + list(months))
+    for info, row_labels, row_codes in zip(info_rows, labels.tolist(), specialties.tolist()):
+        cells = list(info)
+        for label, code in zip(row_labels, row_codes):
+            if not label:
+                cells.append(None)
+                continue
+            cell = styled_cells.get((label, code))
+            if cell is None:
+                cell = WriteOnlyCell(sheet, label)
+                if code >= 0:
+                    cell.fill = fills[code]
+                styled_cells[(label, code)] = cell
+            cells.append(cell)
+        sheet.append(cells)
+    return sheet
+
+
+# 工作表名称中不能使用的字符
+_INVALID_TITLE_CHARS = str.maketrans({char: "_" for char in "[]:*?/\\"})
+
+
+def sheet_title(name: str, used: set) -> str:
+    """生成合法且不重复的工作表名称（最多31个字符），并加入used"""
+    base = name.translate(_INVALID_TITLE_CHARS)[:31] or "Sheet"
+    title, number = base, 2
+    while title in used:
+        suffix = f"_{number}"
+        title = base[:31 - len(suffix)] + suffix
+        number += 1
+    used.add(title)
+    return title
+
+
+def append_table_sheet(workbook, title: str, headers: Sequence[str], rows: Iterator[Sequence[Any]],
+                       frozen_columns: int = 1, widths: Optional[Sequence[float]] = None):
+    """在工作簿中添加普通表格，冻结表头行和前frozen_columns列"""
+    sheet = workbook.create_sheet(title)
+    sheet.freeze_panes = f"{_column_letter(frozen_columns)}2"
+    for col, width in enumerate(widths or []):
+        sheet.column_dimensions[_column_letter(col)].width = width
+    append_header(sheet, headers)
+    for row in rows:
+        sheet.append(list(row))
+    return sheet
+
+
+def append_department_sheets(workbook, index, months: Sequence[int], month_keys: Sequence[str],
+                             used_titles: set):
+    """由 (科室, 月份) -> 学生 的倒排索引添加科室人数表和每个科室的月度名单
+
+    Args:
+        index: ScheduleIndex
+        months: 导出的月份序号
+        month_keys: 月份对应的表头
+        used_titles: 已使用的工作表名称
+    """
+    import numpy as np
+    units = index.used_units()
+    counts = index.counts[np.ix_(units, months)] if units else np.zeros((0, len(months)), dtype=np.int32)
+    name_width = _text_width(max([len(index.unit_names[unit]) for unit in units] + [4]))
+
+    count_rows = [[index.unit_names[unit]] + row + [sum(row)] for unit, row in zip(units, counts.tolist())]
+    totals = counts.sum(axis=0).tolist()
+    count_rows.append(["合计"] + totals + [sum(totals)])
+    append_table_sheet(workbook, sheet_title("科室人数", used_titles), ["科室"] + list(month_keys) + ["合计"],
+                       count_rows, widths=[name_width] + [10.0] * (len(months) + 1))
+
+    # 每个科室一个工作表，每列为一个月份在该科室轮转的学生
+    for unit, unit_counts in zip(units, counts.tolist()):
+        columns = [index.student_names(unit, month) for month in months]
+        rows = ([column[i] if i < len(column) else None for column in columns]
+                for i in range(max(unit_counts)))
+        append_table_sheet(workbook, sheet_title(index.unit_names[unit], used_titles), list(month_keys), rows,
+                           frozen_columns=0, widths=[14.0] * len(months))
@@ -0,0 +1,42 @@
+from datetime import date
+from typing import Union
+
+
+class MonthCalendar:
+    """排期月份日历
+
+    以开始日期所在月份为第0个月，预先计算每个月份序号对应的"YYYY-MM"键。
+    排期计算只使用整数月份序号，字符串键只在输出结果时使用。
+    """
+    def __init__(self, start_date: date, months: int):
+        self.start_date = start_date
+        self.months = months
+        # 开始月份的绝对月份序号（公元0年1月为0）
+        self.start_ordinal = start_date.year * 12 + start_date.month - 1
+        self.keys = [self._format_ordinal(self.start_ordinal + i) for i in range(months)]
+        self._key_offsets = {key: i for i, key in enumerate(self.keys)}
+
+    def __len__(self) -> int:
+        return self.months
+
+    @staticmethod
+    def _format_ordinal(ordinal: int) -> str:
+        """绝对月份序号转换为"YYYY-MM"键"""
+        year, month = divmod(ordinal, 12)
+        return f"{year:04d}-{month + 1:02d}"
+
+    def key(self, offset: int) -> str:
+        """获取第offset个月的"YYYY-MM"键"""
+        if 0 <= offset < self.months:
+            return self.keys[offset]
+        return self._format_ordinal(self.start_ordinal + offset)
+
+    def offset(self, value: Union[str, date]) -> int:
+        """获取月份键或日期相对开始月份的月份序号（可能为负数或超出范围）"""
+        if isinstance(value, str):
+            if value in self._key_offsets:
+                return self._key_offsets[value]
+            year, month = value.split("-")[:2]
+            return int(year) * 12 + int(month) - 1 - self.start_ordinal
+        return value.year * 12 + value.month - 1 - self.start_ordinal
+
@@ -0,0 +1,17 @@
+import numpy as np
+from typing import List
+
+# 排期表中区分专业的背景颜色，按专业首次出现的顺序循环使用
+SPECIALTY_PALETTE = [
+    "#FF9AA2", "#FFB7B2", "#FFDAC1", "#E2F0CB", "#B5EAD7",
+    "#C7CEEA", "#B5D8EB", "#D0B8EA", "#FFC6FF", "#BDB2FF",
+    "#A0C4FF", "#9BF6FF", "#CAFFBF", "#FDFFB6", "#FFD6A5"
+]
+
+
+def first_appearance_order(codes: np.ndarray) -> List[int]:
+    """按在矩阵中首次出现（按行展开）的顺序返回出现过的非负编号"""
+    flat = codes.ravel()
+    present, first_index = np.unique(flat[flat >= 0], return_index=True)
+    # np.unique的下标基于过滤后的数组，顺序与原数组一致
+    return present[np.argsort(first_index)].tolist()
@@ -0,0 +1,119 @@
+import atexit
+import json
+import os
+import tempfile
+import threading
+import weakref
+from typing import Any, Callable, Optional, Tuple
+
+# 界面编辑数据时的延迟保存秒数，连续修改合并为一次写入
+INTERACTIVE_SAVE_DELAY = 0.5
+
+# 所有写入器，程序退出时写入尚未保存的数据
+_writers = weakref.WeakSet()
+
+
+def atomic_write_json(path: str, data: Any):
+    """原子写入JSON文件
+
+    先写入同目录下的临时文件并刷新到磁盘，再替换原文件，
+    写入过程中程序退出或出错时原文件保持完整。
+    """
+    _atomic_write(path, 'w', lambda f: json.dump(data, f, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+def atomic_write_bytes(path: str, data: bytes):
+    """原子写入二进制文件，方式与atomic_write_json相同"""
+    _atomic_write(path, 'wb', lambda f: f.write(data))
+
+
+def _atomic_write(path: str, mode: str, write: Callable[[Any], Any], encoding: Optional[str] = None):
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, mode, encoding=encoding) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        # 临时文件默认只有所有者可读写，保持原文件的权限
+        if os.path.exists(path):
+            os.chmod(temp_path, os.stat(path).st_mode & 0o777)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class JsonFileWriter:
+    """JSON数据文件写入器
+
+    delay大于0时延迟写入：提交的数据先保存在内存中，delay秒内没有新的提交才在后台线程写入，
+    连续多次修改只写入最后一次的数据。delay为0时立即写入。
+    数据由调用方在提交时生成快照，后台线程只负责序列化和写文件，不访问管理器的数据。
+    """
+    def __init__(self, description: str, delay: float = 0.0):
+        """
+        Args:
+            description: 数据说明，用于错误提示，如"学生数据"
+            delay: 延迟写入的秒数
+        """
+        self.description = description
+        self.delay = delay
+        self.write_count = 0  # 实际写入文件的次数
+        self._lock = threading.Lock()  # 保护待写入数据和定时器
+        self._write_lock = threading.Lock()  # 保证按提交顺序写入
+        self._pending: Optional[Tuple[str, Any]] = None  # (文件路径, 数据)
+        self._timer: Optional[threading.Timer] = None
+        _writers.add(self)
+
+    def submit(self, path: str, data: Any):
+        """提交需要写入的数据，覆盖之前尚未写入的数据"""
+        with self._lock:
+            self._pending = (path, data)
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self.delay > 0:
+                self._timer = threading.Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if self.delay <= 0:
+            self.flush()
+
+    def has_pending(self) -> bool:
+        """是否有尚未写入的数据"""
+        with self._lock:
+            return self._pending is not None
+
+    def flush(self) -> bool:
+        """立即写入尚未写入的数据
+
+        Returns:
+            bool - 是否写入成功，没有待写入数据时返回True
+        """
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, None
+                if self._timer is not None and self._timer is not threading.current_thread():
+                    self._timer.cancel()
+                self._timer = None
+            if pending is None:
+                return True
+            try:
+                atomic_write_json(*pending)
+                self.write_count += 1
+                return True
+            except Exception as e:
+                print(f"保存{self.description}失败: {e}")
+                return False
+
+
+@atexit.register
+def flush_all():
+    """写入所有写入器尚未保存的数据"""
+    for writer in list(_writers):
+        writer.flush()
@@ -0,0 +1,103 @@
+import os
+import time
+from typing import List, Optional, Tuple
+
+from utils.persistence import atomic_write_bytes
+
+# 默认的排期结果缓存目录和大小上限
+DEFAULT_CACHE_DIR = "data/schedule_cache"
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+# 缓存文件的扩展名
+_SUFFIX = ".bin"
+
+
+class ResultCache:
+    """按内容哈希保存计算结果的磁盘缓存
+
+    每条结果保存为目录中以键命名的一个文件，写入是原子的，多个进程同时使用时不会读到不完整的文件。
+    文件修改时间作为最近使用时间，命中时更新；写入后目录总大小超过上限时删除最久未使用的文件。
+    读写失败只影响缓存本身，get返回None，put忽略错误。
+    """
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_CACHE_BYTES):
+        """
+        Args:
+            directory: 缓存目录，不存在时在第一次写入时创建
+            max_bytes: 缓存文件的总大小上限
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> str:
+        if not key or not all(char.isalnum() for char in key):
+            raise ValueError(f"缓存键只能包含字母和数字: {key}")
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """读取缓存的结果并标记为最近使用，没有时返回None"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path, ns=(time.time_ns(), time.time_ns()))
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes):
+        """保存结果，之后按大小上限删除最久未使用的结果"""
+        try:
+            atomic_write_bytes(self._path(key), data)
+            self.evict()
+        except OSError as e:
+            print(f"写入排期缓存失败: {e}")
+
+    def _entries(self) -> List[Tuple[int, int, str]]:
+        """所有缓存文件 [(最近使用时间, 大小, 路径)]，按最近使用时间从早到晚排序"""
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return entries
+        for name in names:
+            if not name.endswith(_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        entries.sort()
+        return entries
+
+    def size(self) -> int:
+        """缓存文件的总大小"""
+        return sum(size for _, size, _ in self._entries())
+
+    def __len__(self) -> int:
+        return len(self._entries())
+
+    def evict(self):
+        """删除最久未使用的结果，直到总大小不超过上限"""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        """删除所有缓存的结果"""
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass